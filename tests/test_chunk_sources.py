@@ -0,0 +1,65 @@
+"""Copies of a chunk found on several pages: filters, cited sources and clean-up."""
+
+import sqlite3
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from watgpt.db.numpy_vector_db import NumpyVectorDB
+from watgpt.db.sql_db import SqlDB
+from watgpt.retriever import Retriever
+
+SHARED = 'Zimowa sesja egzaminacyjna trwa od 27 stycznia do 9 lutego.'
+
+
+def page(url: str, title: str, chunks: list[str]) -> dict:
+    return {'source_url': url, 'file_url': None, 'title': title, 'chunks': chunks}
+
+
+@pytest.fixture
+def chunk_db(tmp_path) -> SqlDB:
+    db = SqlDB(str(tmp_path / 'chunks.db'))
+    db.write_batch(
+        documents=[
+            page('https://a', 'A', [SHARED, 'Rekrutacja trwa do końca lipca.']),
+            page('https://b', 'B', [SHARED]),
+        ]
+    )
+    return db
+
+
+@pytest.fixture
+def retriever(chunk_db, tmp_path) -> Retriever:
+    embeddings = DeterministicFakeEmbedding(size=8)
+    vector_db = NumpyVectorDB(str(tmp_path / 'vectors'), embedding_function=embeddings)
+    chunks = list(chunk_db.fetch_all_chunks())
+    vectors = np.array(embeddings.embed_documents([chunk.content for chunk in chunks]))
+    vector_db.add_embeddings(chunks, vectors)
+    return Retriever(vector_db, chunk_db)
+
+
+@pytest.mark.parametrize('mode', ['vector', 'lexical', 'hybrid'])
+def test_filter_matches_copy_of_chunk(retriever, mode):
+    results = retriever.retrieve('sesja', top_k=3, filters={'source_url': 'https://b'}, mode=mode)
+    assert [document.page_content for document in results] == [SHARED]
+    # The chunk is stored under page A, its first source, and cites both pages
+    assert results[0].metadata['source_url'] == 'https://a'
+    assert [source['source_url'] for source in results[0].metadata['sources']] == [
+        'https://a',
+        'https://b',
+    ]
+
+
+def test_filter_without_matching_source(retriever):
+    filters = {'source_url': 'https://missing'}
+    assert retriever.retrieve('sesja', filters=filters, mode='vector') == []
+
+
+def test_removed_pages_leave_no_sources(chunk_db, tmp_path):
+    chunk_db.write_batch(documents=[page('https://a', 'A', [])])
+    assert [chunk.source_url for chunk in chunk_db.fetch_all_chunks()] == ['https://b']
+    chunk_db.write_batch(documents=[page('https://b', 'B', [])])
+    with sqlite3.connect(tmp_path / 'chunks.db') as connection:
+        assert connection.execute('SELECT COUNT(*) FROM chunk_sources').fetchone() == (0,)
+        assert connection.execute('SELECT COUNT(*) FROM chunks').fetchone() == (0,)
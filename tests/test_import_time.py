@@ -0,0 +1,31 @@
+"""
+Import-time regression checks: the lightweight entry points must not load model weights,
+native backends or the vector store at import (see scripts/benchmark_imports.py).
+"""
+
+import pytest
+
+from watgpt.scripts.benchmark_imports import (
+    ENTRY_POINT_ENVIRONMENT,
+    ENTRY_POINTS,
+    HEAVY_MODULES,
+    import_once,
+)
+
+LIGHTWEIGHT_ENTRY_POINTS = ('create_sql_db', 'scrape', 'scraper_pipelines', 'query_vector_db')
+
+
+@pytest.mark.parametrize('name', LIGHTWEIGHT_ENTRY_POINTS)
+def test_entry_point_loads_no_heavy_module(name):
+    module, _ = ENTRY_POINTS[name]
+    result = import_once(module, HEAVY_MODULES, ENTRY_POINT_ENVIRONMENT.get(name))
+    assert result['error'] is None
+    assert result['loaded_forbidden'] == []
+
+
+def test_api_imports_with_fake_llm():
+    # Creating the LLMEngine loads the embedding model
+    pytest.importorskip('sentence_transformers')
+    module, forbidden = ENTRY_POINTS['api']
+    result = import_once(module, forbidden, ENTRY_POINT_ENVIRONMENT['api'])
+    assert result['error'] is None
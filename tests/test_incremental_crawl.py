@@ -0,0 +1,197 @@
+"""
+Incremental crawling against a local HTTP stand-in of the university site.
+
+The server answers with ETag and Last-Modified and honours If-None-Match/If-Modified-Since.
+Each crawl runs in its own process (a Twisted reactor cannot be restarted), with the
+databases in a temporary WATGPT_DATABASE_DIR. Text is chunked with a small WordPiece tokenizer
+trained here (WATGPT_CHUNK_TOKENIZER_MODEL), so the crawl needs no network access.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+PAGE = """<html><body><div class="post-content">
+<h3>Sesja zimowa</h3>
+<p>Harmonogram sesji egzaminacyjnej dla studentów studiów stacjonarnych.</p>
+<a href="harmonogram.txt">Harmonogram</a>
+</div></body></html>
+"""
+FILE_TEXT = 'Egzamin z analizy matematycznej odbędzie się 3 lutego w sali 308.\n'
+CHANGED_FILE_TEXT = 'Egzamin z fizyki odbędzie się 5 lutego w sali 112.\n'
+
+# Runs one crawl of the stand-in site and dumps the crawler's stats as JSON
+CRAWL_SCRIPT = """
+import json, sys
+from watgpt.scripts.scrape import crawler_process
+
+if __name__ == '__main__':
+    # Puts the scrapy project on sys.path, so watscraper is importable
+    process = crawler_process()
+    from watscraper.spiders.all_files_spider import AllFilesSpider
+
+    class LocalSpider(AllFilesSpider):
+        name = 'local_files'
+        allowed_domains = ['127.0.0.1']
+        start_urls = [sys.argv[1]]
+        rules = ()
+
+        def parse_start_url(self, response):
+            yield from self.parse_page(response)
+
+    process.settings.set('FILES_STORE', sys.argv[2])
+    process.settings.set('EXTRACTION_POOL_SIZE', 1)
+    process.settings.set('LOG_LEVEL', 'WARNING')
+    crawler = process.create_crawler(LocalSpider)
+    process.crawl(crawler)
+    process.start()
+    with open(sys.argv[3], 'w', encoding='utf-8') as f:
+        json.dump(crawler.stats.get_stats(), f, default=str)
+"""
+
+
+@pytest.fixture(scope='module')
+def tokenizer_dir(tmp_path_factory) -> Path:
+    """A word-piece tokenizer trained on the test texts, saved like a hub model."""
+    tokenizers = pytest.importorskip('tokenizers')
+    transformers = pytest.importorskip('transformers')
+    tokenizer = tokenizers.Tokenizer(tokenizers.models.WordPiece(unk_token='[UNK]'))
+    tokenizer.normalizer = tokenizers.normalizers.BertNormalizer()
+    tokenizer.pre_tokenizer = tokenizers.pre_tokenizers.BertPreTokenizer()
+    trainer = tokenizers.trainers.WordPieceTrainer(vocab_size=500, special_tokens=['[UNK]'])
+    tokenizer.train_from_iterator([PAGE, FILE_TEXT, CHANGED_FILE_TEXT], trainer)
+    path = tmp_path_factory.mktemp('tokenizer')
+    transformers.PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer, unk_token='[UNK]', model_max_length=128
+    ).save_pretrained(path)
+    return path
+
+
+class ConditionalRequestHandler(SimpleHTTPRequestHandler):
+    """
+    Static file handler adding an ETag (MD5 of the body) and answering 304 to a matching
+    If-None-Match; If-Modified-Since is handled by SimpleHTTPRequestHandler.
+    """
+
+    def send_head(self):
+        path = Path(self.translate_path(self.path))
+        self.etag = None  # pylint: disable=attribute-defined-outside-init
+        if path.is_file():
+            self.etag = f'"{hashlib.md5(path.read_bytes()).hexdigest()}"'
+            if self.headers.get('If-None-Match') == self.etag:
+                self.send_response(304)
+                self.end_headers()
+                return None
+        return super().send_head()
+
+    def end_headers(self):
+        if getattr(self, 'etag', None):
+            self.send_header('ETag', self.etag)
+        super().end_headers()
+
+    def log_request(self, code='-', size='-'):
+        self.server.requests.append((self.path, int(code)))
+
+
+@pytest.fixture
+def site(tmp_path):
+    root = tmp_path / 'site'
+    root.mkdir()
+    (root / 'index.html').write_text(PAGE, encoding='utf-8')
+    (root / 'harmonogram.txt').write_text(FILE_TEXT, encoding='utf-8')
+    server = ThreadingHTTPServer(
+        ('127.0.0.1', 0), partial(ConditionalRequestHandler, directory=str(root))
+    )
+    server.root = root
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def crawl(server, tmp_path: Path, run: int, tokenizer: Path) -> dict:
+    """Crawl the stand-in site once and return the crawler's stats."""
+    database_dir = tmp_path / 'databases'
+    database_dir.mkdir(exist_ok=True)
+    stats_file = tmp_path / f'stats_{run}.json'
+    url = f'http://127.0.0.1:{server.server_address[1]}/index.html'
+    env = {
+        **os.environ,
+        'WATGPT_DATABASE_DIR': str(database_dir),
+        'WATGPT_CHUNK_TOKENIZER_MODEL': str(tokenizer),
+        'HF_HUB_OFFLINE': '1',
+    }
+    subprocess.run(
+        [sys.executable, '-c', CRAWL_SCRIPT, url, str(tmp_path / 'files'), str(stats_file)],
+        cwd=PROJECT_ROOT,
+        env=env,
+        check=True,
+        timeout=300,
+    )
+    return json.loads(stats_file.read_text(encoding='utf-8'))
+
+
+def responses(server, path: str) -> list[int]:
+    return [code for request_path, code in server.requests if request_path == path]
+
+
+def test_second_crawl_skips_unchanged_file(site, tmp_path, tokenizer_dir):
+    first = crawl(site, tmp_path, 1, tokenizer_dir)
+    assert responses(site, '/harmonogram.txt') == [200]
+    assert first.get('manifest/changed_pages') == 1
+    assert first.get('manifest/changed_files') == 1
+
+    with sqlite3.connect(tmp_path / 'databases' / 'chunks.db') as connection:
+        chunks = connection.execute('SELECT chunk_id, content FROM chunks').fetchall()
+        manifest = dict(connection.execute('SELECT url, etag FROM fetch_manifest').fetchall())
+    file_url = f'http://127.0.0.1:{site.server_address[1]}/harmonogram.txt'
+    assert any('analizy matematycznej' in content for _, content in chunks)
+    assert manifest[file_url]
+
+    site.requests.clear()
+    second = crawl(site, tmp_path, 2, tokenizer_dir)
+    assert responses(site, '/harmonogram.txt') == [304]
+    assert second.get('file_status_count/uptodate') == 1
+    assert second.get('manifest/unchanged_files') == 1
+    assert second.get('manifest/unchanged_pages') == 1
+    assert 'manifest/changed_files' not in second
+    assert 'manifest/changed_pages' not in second
+
+    # Unchanged documents keep their chunks: nothing is rechunked or appended
+    with sqlite3.connect(tmp_path / 'databases' / 'chunks.db') as connection:
+        assert connection.execute('SELECT chunk_id, content FROM chunks').fetchall() == chunks
+
+
+def test_changed_file_replaces_its_chunks(site, tmp_path, tokenizer_dir):
+    crawl(site, tmp_path, 1, tokenizer_dir)
+    (site.root / 'harmonogram.txt').write_text(CHANGED_FILE_TEXT, encoding='utf-8')
+
+    site.requests.clear()
+    second = crawl(site, tmp_path, 2, tokenizer_dir)
+    assert responses(site, '/harmonogram.txt') == [200]
+    assert second.get('manifest/changed_files') == 1
+    assert second.get('manifest/unchanged_pages') == 1
+
+    with sqlite3.connect(tmp_path / 'databases' / 'chunks.db') as connection:
+        contents = [
+            content
+            for (content,) in connection.execute(
+                'SELECT content FROM chunks WHERE file_url IS NOT NULL'
+            )
+        ]
+    assert any('fizyki' in content for content in contents)
+    assert not any('analizy matematycznej' in content for content in contents)
@@ -0,0 +1,29 @@
+"""An open NumpyVectorDB sees vectors appended to its index by another instance."""
+
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from watgpt.db.numpy_vector_db import NumpyVectorDB
+from watgpt.db.sql_db import SqlDB
+
+
+def test_reader_sees_appended_vectors(tmp_path):
+    chunk_db = SqlDB(str(tmp_path / 'chunks.db'))
+    texts = ['Rekrutacja trwa do końca lipca.', 'Sesja trwa od 27 stycznia.']
+    chunk_db.write_batch(
+        documents=[{'source_url': 'https://a', 'file_url': None, 'title': 'A', 'chunks': texts}]
+    )
+    first, second = sorted(chunk_db.fetch_all_chunks(), key=lambda chunk: chunk.chunk_id)
+    embeddings = DeterministicFakeEmbedding(size=8)
+    writer = NumpyVectorDB(str(tmp_path / 'vectors'), embedding_function=embeddings)
+    reader = NumpyVectorDB(str(tmp_path / 'vectors'), embedding_function=embeddings)
+    assert reader.query_by_vector(embeddings.embed_query(texts[0])) == []
+
+    writer.add_embeddings([first], np.array([embeddings.embed_query(first.content)]))
+    results = reader.query_by_vector(embeddings.embed_query(texts[0]), top_k=2)
+    assert [document.page_content for document, _ in results] == [first.content]
+
+    writer.add_embeddings([second], np.array([embeddings.embed_query(second.content)]))
+    results = reader.query_by_vector(embeddings.embed_query(texts[1]), top_k=2)
+    assert [document.page_content for document, _ in results][0] == second.content
+    assert len(results) == 2
@@ -1,9 +1,23 @@
+import os
 from pathlib import Path
 
 PROJECT_ROOT = Path(__file__).parent.parent
-DATABASE_DIR = PROJECT_ROOT / 'databases'
+# Directory of all databases, caches and reports (e.g. a temporary one in tests)
+DATABASE_DIR = Path(os.environ.get('WATGPT_DATABASE_DIR', PROJECT_ROOT / 'databases'))
 CHUNKS_DATABASE_FILE: str = str(DATABASE_DIR / 'chunks.db')
 VECTOR_DATABASE_FILE: str = str(DATABASE_DIR / 'vectors.db')
+NUMPY_VECTOR_DATABASE_DIR: str = str(DATABASE_DIR / 'numpy_vectors')
+# Extracted texts of crawled files and pages, gzip-compressed and keyed by content SHA-256
+EXTRACTION_CACHE_DIR: str = str(DATABASE_DIR / 'extraction_cache')
+# Stages completed by the last run of watgpt.scripts.ingest, so a failed run can resume
+INGEST_CHECKPOINT_FILE: str = str(DATABASE_DIR / 'ingest_checkpoint.json')
+# JSON telemetry report of every crawl (see watscraper/telemetry.py), next to the healthcheck dir
+INGESTION_REPORTS_DIR: str = str(DATABASE_DIR / 'ingestion_reports')
+# Level of the log file (logs/debug.log), e.g. INFO to leave debug messages out
+LOG_LEVEL = os.environ.get('WATGPT_LOG_LEVEL', 'DEBUG')
+# Fraction of is_debug_enabled() checks that pass, so costly debug messages (prompts, parsed
+# calendar rows) can stay on in production for a sample of requests
+DEBUG_SAMPLE_RATE = float(os.environ.get('WATGPT_DEBUG_SAMPLE_RATE', '1.0'))
 DATA_DIR_PATH = PROJECT_ROOT / 'wat_data'
 CONFIG_DIR_PATH = PROJECT_ROOT / 'config'
 TIMETABLE_URL = 'https://planzajec.wcy.wat.edu.pl/pl/rozklad?grupa_id={group}'
@@ -12,13 +26,79 @@ CALENDAR_PDF_FP = (
     / 'zal._nr_1_organizacja_zajec_w_roku_akademickim_2024_2025_na_studiach_stacjonarnych.pdf'
 )
 STRUCTURED_PDF_FP = DATA_DIR_PATH / 'informator_dla_studentow_1_roku_2024.pdf'
+# Calendar PDFs with at least 2 * CALENDAR_PAGES_PER_WORKER pages are parsed by up to
+# CALENDAR_PARSE_WORKERS processes (at most one per CPU), each taking a contiguous range of
+# pages; a page takes ~5 ms and starting a worker ~1 s, so shorter PDFs are parsed in-process
+CALENDAR_PARSE_WORKERS = 4
+CALENDAR_PAGES_PER_WORKER = 250
 EMBEDDINGS_MODEL_NAME = 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'
+# ---- Chunking: 'sentence' packs sentences into chunks that fit the embedding model's
+# sequence limit (128 word-pieces for MiniLM), 'token' uses 1024-token GPT-2 windows
+CHUNKING_STRATEGIES = ('sentence', 'token')
+CHUNKING_STRATEGY = 'sentence'
+# Overridden by WATGPT_CHUNK_TOKENIZER_MODEL, e.g. a local tokenizer directory in tests
+CHUNK_TOKENIZER_MODEL = os.environ.get('WATGPT_CHUNK_TOKENIZER_MODEL', EMBEDDINGS_MODEL_NAME)
+CHUNK_MAX_TOKENS = 120
+CHUNK_OVERLAP_TOKENS = 20
+# ---- Near-duplicate chunks (MinHash over word shingles, LSH banding): chunks whose estimated
+# Jaccard similarity reaches the threshold keep one representative in the vector index
+NEAR_DUPLICATE_THRESHOLD = 0.8
+MINHASH_NUM_PERM = 128
+MINHASH_SHINGLE_WORDS = 3
 UNIVERSITY_DOCS_COLLECTION = 'university_docs'
+VECTOR_DB_BACKENDS = ('chroma', 'numpy')
+VECTOR_DB_BACKEND = 'chroma'
+NUMPY_VECTOR_DTYPE = 'float16'
+CHUNK_EMBEDDING_DTYPE = '<f2'
 PROMPTS_FILE = CONFIG_DIR_PATH / 'prompts.yaml'
 LLM_RAG_SYSTEM_PROMPT = 'llm_rag_system_prompt'
 LLM_QUERY_EXTRACTION_PROMPT = 'llm_query_extraction_prompt'
-LLM_PROVIDER = 'groq'
+# Keyword patterns (matched case-insensitively) that restrict retrieval to one document title
+QUERY_TITLE_FILTERS = (
+    (r'kalendarz|harmonogram|organizacj\w* (zaj[eę][cć]|roku)', CALENDAR_PDF_FP.name),
+    (r'informator|pierwsz\w* rok', STRUCTURED_PDF_FP.name),
+)
+# ---- Questions about the academic calendar (matched case-insensitively) are answered from the
+# calendar_events table: up to CALENDAR_ANSWER_MAX_EVENTS best matching events directly,
+# more as the only context of the LLM (at most CALENDAR_CONTEXT_EVENTS of them). Events have
+# to match every query keyword that is not an intent word, or CALENDAR_MIN_MATCHED_KEYWORDS of
+# them; questions matching only weakly go to RAG
+CALENDAR_INTENT_PATTERN = (
+    r'\bkiedy\b|\btermin|\bsesj|\bsemestr|\bprzerw|\bferi|\bwakacj|\bwoln\w* od zaj|'
+    r'\bdzie\w* woln|\bdni\w* woln|\brektorsk|\binauguracj|kalendarz|harmonogram'
+)
+# Query words are cut to this many letters, so they match inflected forms ("sesji", "sesja")
+CALENDAR_KEYWORD_LETTERS = 4
+CALENDAR_QUERY_STOPWORDS = frozenset(
+    'kiedy jest będzie będą czy jaki jaka jakie jakim który która które dla oraz się mam mamy '
+    'ile trwa roku studentów studiów akademickiego'.split()
+)
+CALENDAR_MIN_MATCHED_KEYWORDS = 2
+CALENDAR_ANSWER_MAX_EVENTS = 3
+CALENDAR_CONTEXT_EVENTS = 8
+RETRIEVAL_MODES = ('vector', 'lexical', 'hybrid', 'auto')
+RETRIEVAL_MODE = 'auto'
+# Reciprocal rank fusion constant and how many candidates each retriever contributes per result
+RRF_K = 60
+HYBRID_CANDIDATES_FACTOR = 4
+# Overridden by the LLM_PROVIDER environment variable; 'fake' selects the offline FakeChatModel
+LLM_PROVIDER = os.environ.get('LLM_PROVIDER', 'groq')
 LLM_MODEL_NAME = 'llama3-8b-8192'
+# ---- Prompt token budget (counted with the chat model's tokenizer)
+LLM_TOKENIZER_NAME = 'NousResearch/Meta-Llama-3-8B-Instruct'
+LLM_CONTEXT_WINDOW = 8192
+LLM_RESPONSE_TOKENS = 1024
+PROMPT_HISTORY_TOKENS = 1536
+PROMPT_CONTEXT_TOKENS = 4096
+MIN_CONTEXT_SPAN_TOKENS = 64
+RAG_TOP_K = 8
+# ---- Offline fake chat model (LLM_PROVIDER=fake, see fake_llm.py), overridable like LLM_PROVIDER:
+# seconds before the first token and per generated token, answer length in tokens and whether
+# the answer is generated as a stream of tokens
+FAKE_LLM_FIRST_TOKEN_LATENCY = float(os.environ.get('FAKE_LLM_FIRST_TOKEN_LATENCY', '0.2'))
+FAKE_LLM_TOKEN_LATENCY = float(os.environ.get('FAKE_LLM_TOKEN_LATENCY', '0.01'))
+FAKE_LLM_RESPONSE_TOKENS = int(os.environ.get('FAKE_LLM_RESPONSE_TOKENS', '64'))
+FAKE_LLM_STREAMING = os.environ.get('FAKE_LLM_STREAMING', 'false').lower() == 'true'
 # ---- Values for Scrapy
 ALLOWED_DOMAINS = ['wcy.wat.edu.pl']
 START_URLS = ['https://www.wcy.wat.edu.pl/wydzial/ksztalcenie/informacje-studenci']
@@ -55,3 +135,13 @@ ALLOWED_EXTENSIONS = {
     'tar',
     'gz',
 }
+# ---- Extraction limits for downloaded files: files and archive members above the size limit
+# are skipped; extraction stops, keeping the text so far, at the text or time limit. The time
+# limit is checked between text blocks (paragraphs, rows, PDF pages, archive members) and is set
+# below the pipeline's EXTRACTION_TIMEOUT, so workers stop on their own unless a single block
+# (e.g. a calendar PDF, parsed as a whole) runs past the timeout
+EXTRACTION_MAX_FILE_BYTES = 50 * 1024 * 1024
+EXTRACTION_MAX_TEXT_CHARS = 5_000_000
+EXTRACTION_MAX_SECONDS = 240
+ARCHIVE_MAX_MEMBERS = 1000
+ARCHIVE_MAX_DEPTH = 2
@@ -1,4 +1,22 @@
-from .sql_db import SqlDB
-from .vector_db import VectorDB
+"""
+The database classes are imported on first access, so importing watgpt.db.sql_db (e.g. in
+create_sql_db or the scraper pipelines) does not load the vector store modules.
+"""
 
-__all__ = ['SqlDB', 'VectorDB']
+import importlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .numpy_vector_db import NumpyVectorDB
+    from .sql_db import SqlDB
+    from .vector_db import VectorDB
+
+_MODULES = {'NumpyVectorDB': '.numpy_vector_db', 'SqlDB': '.sql_db', 'VectorDB': '.vector_db'}
+
+__all__ = ['NumpyVectorDB', 'SqlDB', 'VectorDB']
+
+
+def __getattr__(name: str):
+    if name in _MODULES:
+        return getattr(importlib.import_module(_MODULES[name], __name__), name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
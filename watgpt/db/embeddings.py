@@ -0,0 +1,74 @@
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from ..constants import CHUNK_EMBEDDING_DTYPE
+from ..utils import log_info
+from .sql_db import SqlDB
+
+
+def encode_embedding(vector: list[float] | np.ndarray) -> bytes:
+    """
+    Encode an embedding as a compact little-endian blob for the chunks table.
+    """
+    return np.asarray(vector, dtype=CHUNK_EMBEDDING_DTYPE).tobytes()
+
+
+def decode_embedding(blob: bytes, dim: int) -> np.ndarray:
+    """
+    Decode a blob produced by encode_embedding into a float32 vector.
+    """
+    vector = np.frombuffer(blob, dtype=CHUNK_EMBEDDING_DTYPE)
+    if vector.shape[0] != dim:
+        raise ValueError(f'Embedding blob holds {vector.shape[0]} values, expected {dim}')
+    return vector.astype(np.float32)
+
+
+def embed_chunk_batch(
+    sql_db: SqlDB, embedding_function: Embeddings, model_name: str, chunks: list
+) -> np.ndarray:
+    """
+    Encode a batch of chunks and store the vectors in chunks.db.
+
+    :return: The stored vectors as a float32 matrix, one row per chunk (rounded to
+        CHUNK_EMBEDDING_DTYPE like vectors loaded with load_chunk_embeddings).
+    """
+    vectors = np.asarray(
+        embedding_function.embed_documents([chunk.content for chunk in chunks]),
+        dtype=CHUNK_EMBEDDING_DTYPE,
+    )
+    sql_db.update_chunk_embeddings(
+        {chunk.chunk_id: v.tobytes() for chunk, v in zip(chunks, vectors, strict=True)},
+        model_name=model_name,
+        dim=vectors.shape[1],
+    )
+    return vectors.astype(np.float32)
+
+
+def embed_chunks(
+    sql_db: SqlDB, embedding_function: Embeddings, model_name: str, batch_size: int = 64
+) -> int:
+    """
+    Encode chunks with a missing or stale embedding and store the vectors in chunks.db.
+
+    :return: Number of chunks that were (re-)encoded.
+    """
+    chunks = sql_db.fetch_chunks_to_embed(model_name)
+    log_info(f'{len(chunks)} chunks need embeddings for {model_name}.')
+    for start in range(0, len(chunks), batch_size):
+        batch = chunks[start : start + batch_size]
+        embed_chunk_batch(sql_db, embedding_function, model_name, batch)
+        log_info(f'Embedded {start + len(batch)}/{len(chunks)} chunks.')
+    return len(chunks)
+
+
+def load_chunk_embeddings(sql_db: SqlDB, model_name: str):
+    """
+    Load chunks with up-to-date embeddings and their vectors stacked in a float32 matrix.
+
+    :return: Tuple of (list of Chunk, array of shape (len(chunks), dim)).
+    """
+    chunks = list(sql_db.fetch_embedded_chunks(model_name))
+    if not chunks:
+        return [], np.empty((0, 0), dtype=np.float32)
+    vectors = np.stack([decode_embedding(c.embedding or b'', c.embedding_dim or 0) for c in chunks])
+    return chunks, vectors
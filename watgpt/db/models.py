@@ -1,7 +1,18 @@
 # pylint: disable=unsubscriptable-object,too-few-public-methods, not-callable
+import datetime
 from typing import Optional
 
-from sqlalchemy import DateTime, ForeignKey, Integer, String, Text, func
+from sqlalchemy import (
+    Date,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+    Text,
+    func,
+)
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
@@ -18,6 +29,100 @@ class Chunk(Base):
     title: Mapped[str | None] = mapped_column(String, nullable=True)
     content: Mapped[str] = mapped_column(Text, nullable=False)
     date: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    embedding: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
+    embedding_model: Mapped[str | None] = mapped_column(String, nullable=True)
+    embedding_dim: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    # Hash of the normalized content; copies of a chunk are stored once (see chunk_sources)
+    content_hash: Mapped[str | None] = mapped_column(String, nullable=True, unique=True, index=True)
+    # Representative chunk of this chunk's near-duplicate cluster; such chunks are not indexed
+    near_duplicate_of: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
+
+class ChunkSource(Base):
+    """
+    Every page or file a chunk was found on (the chunk's own URLs included). SQLite does not
+    enforce the foreign key, so SqlDB deletes a chunk's sources with the chunk.
+    """
+
+    __tablename__ = 'chunk_sources'
+
+    source_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    chunk_id: Mapped[int] = mapped_column(
+        ForeignKey('chunks.chunk_id', ondelete='CASCADE'), nullable=False, index=True
+    )
+    source_url: Mapped[str | None] = mapped_column(String, nullable=True)
+    file_url: Mapped[str | None] = mapped_column(String, nullable=True)
+    title: Mapped[str | None] = mapped_column(String, nullable=True)
+
+
+# One row per (chunk, page, file); NULL URLs compare equal here, unlike in a UNIQUE constraint
+Index(
+    'ix_chunk_sources_unique',
+    ChunkSource.chunk_id,
+    func.coalesce(ChunkSource.source_url, ''),
+    func.coalesce(ChunkSource.file_url, ''),
+    unique=True,
+)
+
+
+class FetchManifestEntry(Base):
+    """Validators and content hash of the last fetch of a crawled page or file."""
+
+    __tablename__ = 'fetch_manifest'
+
+    url: Mapped[str] = mapped_column(String, primary_key=True)
+    etag: Mapped[str | None] = mapped_column(String, nullable=True)
+    last_modified: Mapped[str | None] = mapped_column(String, nullable=True)
+    content_hash: Mapped[str] = mapped_column(String, nullable=False)
+    fetched_at: Mapped[DateTime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+
+class DocumentText(Base):
+    """Key of the cached extracted text of a page or file, used to rechunk without crawling."""
+
+    __tablename__ = 'document_texts'
+
+    # file_url for files, source_url for pages
+    url: Mapped[str] = mapped_column(String, primary_key=True)
+    source_url: Mapped[str | None] = mapped_column(String, nullable=True)
+    file_url: Mapped[str | None] = mapped_column(String, nullable=True)
+    title: Mapped[str | None] = mapped_column(String, nullable=True)
+    # SHA-256 of the file (or page text) and the extractor version that produced the text
+    text_hash: Mapped[str] = mapped_column(String, nullable=False)
+    extractor_version: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
+
+class CalendarEvent(Base):
+    """An event of the academic calendar PDF and the dates it spans."""
+
+    __tablename__ = 'calendar_events'
+
+    event_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    event: Mapped[str] = mapped_column(Text, nullable=False)
+    start_date: Mapped[datetime.date] = mapped_column(Date, nullable=False)
+    # Equal to start_date for single-day events
+    end_date: Mapped[datetime.date] = mapped_column(Date, nullable=False)
+    # 1-based page of the PDF the event's row starts on
+    page: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    # File URL (or path) of the calendar PDF; a new version replaces all its events
+    source: Mapped[str] = mapped_column(String, nullable=False, index=True)
+
+
+Index('ix_calendar_events_dates', CalendarEvent.start_date, CalendarEvent.end_date)
+
+
+class DataVersion(Base):
+    """Counter bumped whenever a dataset (e.g. the timetable) changes."""
+
+    __tablename__ = 'data_versions'
+
+    name: Mapped[str] = mapped_column(String, primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    updated_at: Mapped[DateTime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
 
 
 class BlockHours(Base):
@@ -34,6 +139,8 @@ class Group(Base):
 
     group_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     group_code: Mapped[str] = mapped_column(String, nullable=False, unique=True)
+    # Hash of the lessons stored by the last timetable refresh
+    timetable_hash: Mapped[str | None] = mapped_column(String, nullable=True)
     lessons: Mapped[list['Lesson']] = relationship('Lesson', back_populates='group')
 
 
@@ -77,3 +184,27 @@ class Lesson(Base):
     course: Mapped['Course'] = relationship('Course', back_populates='lessons')
     teacher: Mapped[Optional['Teacher']] = relationship('Teacher', back_populates='lessons')
     block: Mapped['BlockHours'] = relationship('BlockHours', back_populates='lessons')
+
+
+class IndexBase(DeclarativeBase):
+    """Metadata schema of the numpy vector index (kept apart from chunks.db)."""
+
+
+class IndexEntry(IndexBase):
+    __tablename__ = 'index_entries'
+
+    row: Mapped[int] = mapped_column(Integer, primary_key=True)
+    chunk_id: Mapped[int] = mapped_column(Integer, nullable=False, unique=True)
+    source_url: Mapped[str | None] = mapped_column(String, nullable=True)
+    file_url: Mapped[str | None] = mapped_column(String, nullable=True)
+    title: Mapped[str | None] = mapped_column(String, nullable=True)
+    content: Mapped[str] = mapped_column(Text, nullable=False)
+    date: Mapped[str | None] = mapped_column(String, nullable=True)
+    timestamp: Mapped[int | None] = mapped_column(Integer, nullable=True, index=True)
+
+
+class IndexInfo(IndexBase):
+    __tablename__ = 'index_info'
+
+    key: Mapped[str] = mapped_column(String, primary_key=True)
+    value: Mapped[str] = mapped_column(String, nullable=False)
@@ -0,0 +1,150 @@
+import hashlib
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from ..constants import MINHASH_NUM_PERM, MINHASH_SHINGLE_WORDS, NEAR_DUPLICATE_THRESHOLD
+from ..utils import log_info
+from .sql_db import SqlDB, normalize_chunk_text
+
+# Universal hashing (a * x + b) mod p, as in common MinHash implementations
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def shingle_hashes(text: str, shingle_words: int = MINHASH_SHINGLE_WORDS) -> np.ndarray:
+    """
+    32-bit hashes of the distinct word shingles of the normalized text.
+    """
+    words = normalize_chunk_text(text).split()
+    shingles = {
+        ' '.join(words[start : start + shingle_words])
+        for start in range(max(1, len(words) - shingle_words + 1))
+    }
+    return np.fromiter(
+        (
+            int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=4).digest(), 'little')
+            for s in shingles
+        ),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+
+
+class MinHasher:
+    def __init__(
+        self,
+        num_perm: int = MINHASH_NUM_PERM,
+        shingle_words: int = MINHASH_SHINGLE_WORDS,
+        seed: int = 1,
+    ):
+        """
+        MinHash signatures of word shingles; the share of equal signature values of two texts
+        estimates the Jaccard similarity of their shingle sets.
+        """
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle_words = shingle_words
+        self.a = rng.integers(1, int(MERSENNE_PRIME), num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, int(MERSENNE_PRIME), num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = shingle_hashes(text, self.shingle_words)
+        # uint64 products wrap around, which keeps the hash family usable and fast
+        with np.errstate(over='ignore'):
+            permuted = (hashes[:, None] * self.a + self.b) % MERSENNE_PRIME & MAX_HASH
+        return permuted.min(axis=0)
+
+    def signatures(self, texts: list[str]) -> np.ndarray:
+        """Signatures stacked in an array of shape (len(texts), num_perm)."""
+        if not texts:
+            return np.empty((0, self.num_perm), dtype=np.uint64)
+        return np.stack([self.signature(text) for text in texts])
+
+
+def lsh_params(threshold: float, num_perm: int) -> tuple[int, int]:
+    """
+    Split num_perm signature values into (bands, rows) with the highest LSH collision threshold
+    (1 / bands) ** (1 / rows) not above the Jaccard threshold. Erring low favours recall;
+    candidate pairs are verified on the full signature anyway.
+    """
+    splits = [(num_perm // rows, rows) for rows in range(1, num_perm + 1) if num_perm % rows == 0]
+    below = [split for split in splits if (1 / split[0]) ** (1 / split[1]) <= threshold]
+    return max(below or splits[:1], key=lambda split: (1 / split[0]) ** (1 / split[1]))
+
+
+def cluster_near_duplicates(
+    chunk_ids: list[int], signatures: np.ndarray, threshold: float = NEAR_DUPLICATE_THRESHOLD
+) -> dict[int, int]:
+    """
+    Cluster chunks whose estimated Jaccard similarity reaches the threshold.
+
+    Chunks sharing an LSH bucket with the bucket's first chunk are compared with it on the full
+    signature and merged when similar enough; clusters are the transitive closure of merges.
+
+    :return: Dict mapping every non-representative chunk_id to the smallest chunk_id of its
+        cluster, which represents it.
+    """
+    bands, rows = lsh_params(threshold, signatures.shape[1])
+    parent = list(range(len(chunk_ids)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for band in range(bands):
+        buckets: dict[bytes, list[int]] = defaultdict(list)
+        band_values = signatures[:, band * rows : (band + 1) * rows]
+        for i, values in enumerate(band_values):
+            buckets[values.tobytes()].append(i)
+        for members in buckets.values():
+            first = members[0]
+            for i in members[1:]:
+                root_first, root_i = find(first), find(i)
+                if root_first == root_i:
+                    continue
+                if np.mean(signatures[first] == signatures[i]) >= threshold:
+                    parent[max(root_first, root_i)] = min(root_first, root_i)
+
+    # Indices follow chunk_ids order, so the root (smallest index) is the smallest chunk_id
+    return {chunk_ids[i]: chunk_ids[find(i)] for i in range(len(chunk_ids)) if find(i) != i}
+
+
+def mark_near_duplicates(
+    sql_db: SqlDB,
+    threshold: float = NEAR_DUPLICATE_THRESHOLD,
+    num_perm: int = MINHASH_NUM_PERM,
+    shingle_words: int = MINHASH_SHINGLE_WORDS,
+) -> dict:
+    """
+    Find near-duplicate chunks and mark them in chunks.db, so that only one representative per
+    cluster is embedded, indexed and found by lexical search.
+
+    :return: Report with the number of chunks, near-duplicates, clusters and the time taken.
+    """
+    start = time.perf_counter()
+    chunks = sorted(sql_db.fetch_all_chunks(), key=lambda chunk: chunk.chunk_id)
+    minhasher = MinHasher(num_perm=num_perm, shingle_words=shingle_words)
+    signatures = minhasher.signatures([chunk.content for chunk in chunks])
+    representatives = cluster_near_duplicates(
+        [chunk.chunk_id for chunk in chunks], signatures, threshold
+    )
+    sql_db.set_near_duplicates(representatives)
+
+    duplicate_ids = set(representatives)
+    report = {
+        'chunks': len(chunks),
+        'near_duplicates': len(duplicate_ids),
+        'clusters': len(set(representatives.values())),
+        'near_duplicate_content_bytes': sum(
+            len(chunk.content.encode('utf-8'))
+            for chunk in chunks
+            if chunk.chunk_id in duplicate_ids
+        ),
+        'seconds': time.perf_counter() - start,
+    }
+    log_info(f'Near-duplicate detection (threshold {threshold}): {report}')
+    return report
@@ -0,0 +1,340 @@
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from ..constants import (
+    EMBEDDINGS_MODEL_NAME,
+    NUMPY_VECTOR_DATABASE_DIR,
+    NUMPY_VECTOR_DTYPE,
+)
+from ..utils import log_info
+from .models import Chunk, IndexBase, IndexEntry, IndexInfo
+from .sql_db import SQL_IN_BATCH
+from .vector_db import chunk_metadata, to_timestamp
+
+VECTORS_FILE_NAME = 'embeddings.bin'
+METADATA_FILE_NAME = 'metadata.db'
+SEARCH_BLOCK_ROWS = 65536
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """
+    L2-normalize each row so that a dot product equals cosine similarity.
+    """
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class NumpyVectorDB:
+    def __init__(
+        self,
+        db_dir: str = NUMPY_VECTOR_DATABASE_DIR,
+        embeddings_model_name: str = EMBEDDINGS_MODEL_NAME,
+        dtype: str = NUMPY_VECTOR_DTYPE,
+        embedding_function: Embeddings | None = None,
+    ):
+        """
+        Exact dot-product vector index backed by a memory-mapped embeddings file.
+
+        Normalized embeddings are stored row by row in `embeddings.bin` and chunk metadata
+        in `metadata.db` (SQLite). The file is opened read-only with `np.memmap`, so several
+        API workers reading the same index share its pages through the OS page cache.
+
+        :param db_dir: Directory holding the embeddings file and the metadata database.
+        :param embeddings_model_name: Hugging Face model for embedding generation.
+        :param dtype: Storage dtype of the embeddings (float16 or float32). An existing
+            index keeps the dtype it was created with.
+        :param embedding_function: Embeddings used instead of loading embeddings_model_name.
+        """
+        self.db_dir = Path(db_dir)
+        self.db_dir.mkdir(parents=True, exist_ok=True)
+        self.vectors_file = self.db_dir / VECTORS_FILE_NAME
+        if embedding_function is None:
+            # Loaded on first use, like in VectorDB
+            from langchain_huggingface import (  # pylint: disable=import-outside-toplevel
+                HuggingFaceEmbeddings,
+            )
+
+            embedding_function = HuggingFaceEmbeddings(model_name=embeddings_model_name)
+        self.embedding_function = embedding_function
+
+        self.engine = create_engine(
+            f'sqlite:///{self.db_dir / METADATA_FILE_NAME}',
+            echo=False,
+            connect_args={'check_same_thread': False},
+        )
+        self.session_local = sessionmaker(bind=self.engine)
+        IndexBase.metadata.create_all(bind=self.engine)
+
+        info = self._load_info()
+        self.dtype = np.dtype(info.get('dtype', dtype))
+        self.dim: int | None = int(info['dim']) if 'dim' in info else None
+        self._vectors: np.memmap | None = None
+        # Row count and file size the embeddings file was mapped with
+        self._mapped: tuple[int, int] | None = None
+
+    def _load_info(self) -> dict[str, str]:
+        with self.session_local() as session:
+            rows = session.execute(select(IndexInfo)).scalars().all()
+            return {row.key: row.value for row in rows}
+
+    def _save_info(self, **values):
+        with self.session_local() as session, session.begin():
+            for key, value in values.items():
+                session.merge(IndexInfo(key=key, value=str(value)))
+
+    def count(self) -> int:
+        """
+        Return the number of vectors in the index.
+        """
+        with self.session_local() as session:
+            return session.execute(select(func.count()).select_from(IndexEntry)).scalar_one()
+
+    def _load_vectors(self) -> np.ndarray:
+        """
+        Map the embeddings file, again whenever the row count in IndexInfo or the file size
+        has changed since, e.g. after another process appended to the index; rows past the
+        count are ignored.
+        """
+        info = self._load_info()
+        # Indexes written before the count was stored in IndexInfo
+        num_rows = int(info['count']) if 'count' in info else self.count()
+        if self.dim is None and 'dim' in info:
+            self.dim = int(info['dim'])
+        file_size = self.vectors_file.stat().st_size if self.vectors_file.exists() else 0
+        if self._vectors is None or self._mapped != (num_rows, file_size):
+            self._vectors = None
+            self._mapped = (num_rows, file_size)
+            if num_rows == 0 or self.dim is None:
+                return np.empty((0, self.dim or 0), dtype=self.dtype)
+            self._vectors = np.memmap(
+                self.vectors_file, dtype=self.dtype, mode='r', shape=(num_rows, self.dim)
+            )
+        return self._vectors
+
+    def add_chunk(self, chunk: Chunk):
+        """
+        Add a Chunk model instance to the index if it doesn't already exist.
+        """
+        self.add_chunks([chunk])
+
+    def _existing_chunk_ids(self) -> set[int]:
+        with self.session_local() as session:
+            return set(session.execute(select(IndexEntry.chunk_id)).scalars().all())
+
+    def indexed_chunk_ids(self) -> set[int]:
+        """Return the chunk_ids stored in the index."""
+        return self._existing_chunk_ids()
+
+    def add_chunks(self, chunks: list[Chunk], batch_size: int = 64):
+        """
+        Embed and append chunks to the index, skipping chunk_ids that are already stored.
+        """
+        existing = self._existing_chunk_ids()
+        new_chunks = [chunk for chunk in chunks if chunk.chunk_id not in existing]
+        for start in range(0, len(new_chunks), batch_size):
+            batch = new_chunks[start : start + batch_size]
+            embeddings = self.embedding_function.embed_documents([c.content for c in batch])
+            self.add_embeddings(batch, np.asarray(embeddings, dtype=np.float32))
+            log_info(f'Added {start + len(batch)}/{len(new_chunks)} chunks to numpy index.')
+
+    def add_embeddings(self, chunks: list[Chunk], embeddings: np.ndarray):
+        """
+        Append chunks with precomputed embeddings (one row per chunk), skipping stored ones.
+        """
+        existing = self._existing_chunk_ids()
+        keep = [i for i, chunk in enumerate(chunks) if chunk.chunk_id not in existing]
+        if not keep:
+            return
+        chunks = [chunks[i] for i in keep]
+        embeddings = np.asarray(embeddings, dtype=np.float32)[keep]
+
+        if self.dim is None:
+            self.dim = int(embeddings.shape[1])
+            self._save_info(dim=self.dim, dtype=self.dtype.name)
+        if embeddings.shape[1] != self.dim:
+            raise ValueError(f'Embedding dimension {embeddings.shape[1]} != index dim {self.dim}')
+
+        vectors = normalize_rows(embeddings).astype(self.dtype)
+        first_row = self.count()
+        # Write at the offset implied by the metadata, dropping bytes of any interrupted append
+        mode = 'r+b' if self.vectors_file.exists() else 'wb'
+        with open(self.vectors_file, mode) as f:
+            f.seek(first_row * self.dim * self.dtype.itemsize)
+            f.write(vectors.tobytes())
+            f.truncate()
+
+        with self.session_local() as session, session.begin():
+            for offset, chunk in enumerate(chunks):
+                metadata = chunk_metadata(chunk)
+                session.add(
+                    IndexEntry(
+                        row=first_row + offset,
+                        chunk_id=chunk.chunk_id,
+                        source_url=metadata['source_url'],
+                        file_url=metadata['file_url'],
+                        title=metadata['title'],
+                        content=chunk.content,
+                        date=metadata['date'],
+                        timestamp=metadata['timestamp'],
+                    )
+                )
+            session.merge(IndexInfo(key='count', value=str(first_row + len(chunks))))
+        self._vectors = None
+
+    def _candidate_rows(
+        self,
+        source_url: str | None = None,
+        file_url: str | None = None,
+        title: str | None = None,
+        date_from: datetime | None = None,
+        date_to: datetime | None = None,
+        chunk_ids: list[int] | None = None,
+    ) -> np.ndarray | None:
+        """
+        Resolve metadata filters to the index rows that match them; None when unfiltered.
+        """
+        conditions = [
+            column == value
+            for column, value in (
+                (IndexEntry.source_url, source_url),
+                (IndexEntry.file_url, file_url),
+                (IndexEntry.title, title),
+            )
+            if value
+        ]
+        if date_from is not None:
+            conditions.append(IndexEntry.timestamp >= to_timestamp(date_from))
+        if date_to is not None:
+            conditions.append(IndexEntry.timestamp <= to_timestamp(date_to))
+        if not conditions and chunk_ids is None:
+            return None
+
+        with self.session_local() as session:
+            if chunk_ids is None:
+                statement = select(IndexEntry.row).where(*conditions)
+                rows = list(session.execute(statement).scalars())
+            else:
+                rows = []
+                for start in range(0, len(chunk_ids), SQL_IN_BATCH):
+                    batch = chunk_ids[start : start + SQL_IN_BATCH]
+                    statement = select(IndexEntry.row).where(
+                        IndexEntry.chunk_id.in_(batch), *conditions
+                    )
+                    rows.extend(session.execute(statement).scalars())
+        return np.asarray(sorted(rows), dtype=np.int64)
+
+    def query_by_vector(
+        self,
+        embedding: list[float] | np.ndarray,
+        top_k: int = 3,
+        source_url: str | None = None,
+        file_url: str | None = None,
+        title: str | None = None,
+        date_from: datetime | None = None,
+        date_to: datetime | None = None,
+        chunk_ids: list[int] | None = None,
+    ):
+        """
+        Retrieve top-k chunks for an embedding using exact dot-product search.
+
+        With metadata filters only the matching rows are read from the embeddings file
+        and scored.
+
+        :return: List of (Document, score) tuples ordered by descending score.
+        """
+        vectors = self._load_vectors()
+        if vectors.shape[0] == 0 or top_k <= 0:
+            return []
+
+        query_vector = np.asarray(embedding, dtype=np.float32)
+        query_vector = query_vector / (np.linalg.norm(query_vector) or 1.0)
+
+        rows = self._candidate_rows(source_url, file_url, title, date_from, date_to, chunk_ids)
+        if rows is None:
+            rows = np.arange(vectors.shape[0])
+        num_rows = len(rows)
+        if num_rows == 0:
+            return []
+
+        # Upcast block by block so float16 storage never materializes as a full float32 copy
+        scores = np.empty(num_rows, dtype=np.float32)
+        for start in range(0, num_rows, SEARCH_BLOCK_ROWS):
+            block_rows = rows[start : start + SEARCH_BLOCK_ROWS]
+            block = vectors[block_rows[0] : block_rows[-1] + 1]
+            if len(block) != len(block_rows):
+                block = vectors[block_rows]
+            scores[start : start + len(block_rows)] = block.astype(np.float32) @ query_vector
+
+        k = min(top_k, num_rows)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        top_rows = [int(rows[i]) for i in top]
+
+        with self.session_local() as session:
+            entries = session.execute(
+                select(IndexEntry).where(IndexEntry.row.in_(top_rows))
+            ).scalars()
+            by_row = {entry.row: entry for entry in entries}
+
+        results = []
+        for i, row in zip(top, top_rows, strict=True):
+            entry = by_row[row]
+            document = Document(
+                page_content=entry.content,
+                metadata={
+                    'chunk_id': entry.chunk_id,
+                    'source_url': entry.source_url or '',
+                    'file_url': entry.file_url or '',
+                    'title': entry.title or '',
+                    'date': entry.date or '',
+                },
+            )
+            results.append((document, float(scores[i])))
+        return results
+
+    def query(
+        self,
+        query: str,
+        top_k: int = 3,
+        source_url: str | None = None,
+        file_url: str | None = None,
+        title: str | None = None,
+        date_from: datetime | None = None,
+        date_to: datetime | None = None,
+        chunk_ids: list[int] | None = None,
+    ):
+        """
+        Retrieve top-k relevant chunks using exact similarity search.
+
+        :param query: User query string.
+        :param top_k: Number of top matches to retrieve.
+        :param source_url: Only chunks scraped from this page.
+        :param file_url: Only chunks extracted from this file.
+        :param title: Only chunks with this title (page heading or file name).
+        :param date_from: Only chunks stored at or after this date (naive datetimes are UTC).
+        :param date_to: Only chunks stored at or before this date (naive datetimes are UTC).
+        :param chunk_ids: Only these chunks (e.g. every chunk found on a page, see
+            SqlDB.fetch_chunk_ids_by_source).
+        :return: List of Document objects (LangChain).
+        """
+        if chunk_ids is not None and not chunk_ids:
+            return []
+        embedding = self.embedding_function.embed_query(query)
+        results = self.query_by_vector(
+            embedding,
+            top_k=top_k,
+            source_url=source_url,
+            file_url=file_url,
+            title=title,
+            date_from=date_from,
+            date_to=date_to,
+            chunk_ids=chunk_ids,
+        )
+        return [document for document, _ in results]
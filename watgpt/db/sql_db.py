@@ -1,11 +1,97 @@
+import hashlib
+import json
+import re
+import unicodedata
 from collections import namedtuple
+from datetime import date, datetime
+from pathlib import PurePosixPath
+from urllib.parse import urlparse
 
-from sqlalchemy import create_engine, select
+from sqlalchemy import (
+    create_engine,
+    delete,
+    event,
+    func,
+    insert,
+    inspect,
+    or_,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import sessionmaker
 
 from ..constants import CHUNKS_DATABASE_FILE, DEFAULT_BLOCK_HOURS
-from ..utils import log_info
-from .models import Base, BlockHours, Chunk, Course, Group, Lesson, Teacher
+from ..utils import log_info, to_utc
+from .models import (
+    Base,
+    BlockHours,
+    CalendarEvent,
+    Chunk,
+    ChunkSource,
+    Course,
+    DataVersion,
+    DocumentText,
+    FetchManifestEntry,
+    Group,
+    Lesson,
+    Teacher,
+)
+
+# Milliseconds a connection waits for another connection's write lock before failing with
+# 'database is locked' (e.g. the streaming indexer storing embeddings while the writer commits)
+SQLITE_BUSY_TIMEOUT_MS = 30000
+
+# External-content FTS5 index over chunks, kept in sync with the chunks table by triggers,
+# so every write path (create_chunk included) updates it in the same transaction.
+CHUNKS_FTS_DDL = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+        title, content, content='chunks', content_rowid='chunk_id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS chunks_fts_insert AFTER INSERT ON chunks BEGIN
+        INSERT INTO chunks_fts(rowid, title, content)
+        VALUES (new.chunk_id, new.title, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS chunks_fts_delete AFTER DELETE ON chunks BEGIN
+        INSERT INTO chunks_fts(chunks_fts, rowid, title, content)
+        VALUES ('delete', old.chunk_id, old.title, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS chunks_fts_update AFTER UPDATE OF title, content ON chunks
+    BEGIN
+        INSERT INTO chunks_fts(chunks_fts, rowid, title, content)
+        VALUES ('delete', old.chunk_id, old.title, old.content);
+        INSERT INTO chunks_fts(rowid, title, content)
+        VALUES (new.chunk_id, new.title, new.content);
+    END
+    """,
+)
+# BM25 column weights for (title, content)
+FTS_TITLE_WEIGHT = 2.0
+FTS_CONTENT_WEIGHT = 1.0
+# Keep IN (...) lists well below SQLite's bound parameter limit
+SQL_IN_BATCH = 500
+
+
+def normalize_chunk_text(content: str) -> str:
+    """
+    Unicode (NFKC) and case normalized text with whitespace collapsed, so copies of a text
+    that differ only in spacing or letter case compare equal.
+    """
+    return ' '.join(unicodedata.normalize('NFKC', content).casefold().split())
+
+
+def chunk_content_hash(content: str) -> str:
+    """SHA-256 hex digest of the normalized chunk text."""
+    return hashlib.sha256(normalize_chunk_text(content).encode('utf-8')).hexdigest()
 
 
 class SqlDB:
@@ -19,32 +105,248 @@ class SqlDB:
             echo=False,
             connect_args={'check_same_thread': False},
         )
+        event.listen(self.engine, 'connect', self.configure_connection)
         self.session_local = sessionmaker(bind=self.engine)
         self.init_db()
         self.fill_block_hours()
 
+    @staticmethod
+    def configure_connection(dbapi_connection, _connection_record):
+        """
+        Use write-ahead logging, so readers (the API, the streaming indexer) do not block the
+        writer and vice versa, and wait SQLITE_BUSY_TIMEOUT_MS for a concurrent write lock.
+        """
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')
+        cursor.close()
+
     def init_db(self):
         """
         Create all tables defined in Base.metadata.
         """
         Base.metadata.create_all(bind=self.engine)
+        self.add_missing_columns()
+        self.deduplicate_chunks()
+        self.init_fts()
         log_info(f'Created tables in {self.db_url}')
 
+    def init_fts(self):
+        """
+        Create the chunks_fts full-text index and its sync triggers; index existing rows
+        when the index is added to a database that already holds chunks.
+        """
+        with self.engine.begin() as connection:
+            exists = connection.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chunks_fts'")
+            ).first()
+            for statement in CHUNKS_FTS_DDL:
+                connection.execute(text(statement))
+            if not exists:
+                connection.execute(text("INSERT INTO chunks_fts(chunks_fts) VALUES ('rebuild')"))
+
+    def add_missing_columns(self):
+        """
+        Add columns introduced after a database file was created (create_all skips
+        existing tables). New columns are nullable, so ALTER TABLE ADD COLUMN is enough.
+        """
+        inspector = inspect(self.engine)
+        with self.engine.begin() as connection:
+            for table in Base.metadata.sorted_tables:
+                existing = {column['name'] for column in inspector.get_columns(table.name)}
+                for column in table.columns:
+                    if column.name in existing:
+                        continue
+                    column_type = column.type.compile(dialect=self.engine.dialect)
+                    connection.execute(
+                        text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}')
+                    )
+                    log_info(f'Added column {table.name}.{column.name}')
+
+    def deduplicate_chunks(self):
+        """
+        Hash chunks stored before content hashes were introduced, merge copies into the
+        oldest chunk (recording every copy's URLs in chunk_sources) and create the unique
+        content_hash index.
+        """
+        with self.session_local() as session, session.begin():
+            unhashed = session.execute(
+                select(Chunk.chunk_id, Chunk.source_url, Chunk.file_url, Chunk.title, Chunk.content)
+                .where(Chunk.content_hash.is_(None))
+                .order_by(Chunk.chunk_id)
+            ).all()
+            if unhashed:
+                canonical = dict(
+                    session.execute(
+                        select(Chunk.content_hash, Chunk.chunk_id).where(
+                            Chunk.content_hash.is_not(None)
+                        )
+                    ).all()
+                )
+                sources, duplicates, hashes = [], [], []
+                for chunk_id, source_url, file_url, title, content in unhashed:
+                    digest = chunk_content_hash(content)
+                    if digest in canonical:
+                        duplicates.append(chunk_id)
+                    else:
+                        canonical[digest] = chunk_id
+                        hashes.append({'id': chunk_id, 'digest': digest})
+                    sources.append(
+                        {
+                            'chunk_id': canonical[digest],
+                            'source_url': source_url,
+                            'file_url': file_url,
+                            'title': title,
+                        }
+                    )
+                for start in range(0, len(duplicates), SQL_IN_BATCH):
+                    batch = duplicates[start : start + SQL_IN_BATCH]
+                    self._delete_chunks(session, batch)
+                if hashes:
+                    session.execute(
+                        text('UPDATE chunks SET content_hash = :digest WHERE chunk_id = :id'),
+                        hashes,
+                    )
+                session.execute(sqlite_insert(ChunkSource).on_conflict_do_nothing(), sources)
+                log_info(f'Hashed {len(unhashed)} chunks, merged {len(duplicates)} duplicates')
+        for index in Chunk.__table__.indexes:
+            index.create(self.engine, checkfirst=True)
+
+    @staticmethod
+    def _insert_chunks(session, rows: list[dict]) -> list[int]:
+        """
+        Idempotently store chunks: a chunk whose normalized content is already stored is not
+        inserted again, only its URLs are added to chunk_sources.
+
+        :param rows: Chunk dicts with source_url, file_url, title and content.
+        :return: Canonical chunk_id of every row.
+        """
+        if not rows:
+            return []
+        rows = [{**row, 'content_hash': chunk_content_hash(row['content'])} for row in rows]
+        session.execute(
+            sqlite_insert(Chunk).on_conflict_do_nothing(index_elements=[Chunk.content_hash]), rows
+        )
+        digests = list({row['content_hash'] for row in rows})
+        ids: dict[str, int] = {}
+        for start in range(0, len(digests), SQL_IN_BATCH):
+            batch = digests[start : start + SQL_IN_BATCH]
+            ids.update(
+                session.execute(
+                    select(Chunk.content_hash, Chunk.chunk_id).where(Chunk.content_hash.in_(batch))
+                ).all()
+            )
+        session.execute(
+            sqlite_insert(ChunkSource).on_conflict_do_nothing(),
+            [
+                {
+                    'chunk_id': ids[row['content_hash']],
+                    'source_url': row['source_url'],
+                    'file_url': row['file_url'],
+                    'title': row['title'],
+                }
+                for row in rows
+            ],
+        )
+        return [ids[row['content_hash']] for row in rows]
+
+    @staticmethod
+    def _delete_chunks(session, chunk_ids: list[int]):
+        """
+        Delete chunks with their sources; foreign keys are not enforced by SQLite here, so
+        the ON DELETE CASCADE of chunk_sources does not run.
+        """
+        session.execute(delete(ChunkSource).where(ChunkSource.chunk_id.in_(chunk_ids)))
+        session.execute(delete(Chunk).where(Chunk.chunk_id.in_(chunk_ids)))
+
+    @staticmethod
+    def _prune_chunks(session, chunk_ids: list[int]):
+        """
+        Delete chunks left without sources; a remaining chunk takes the URLs and title of its
+        oldest source, in case its own were removed.
+        """
+        for start in range(0, len(chunk_ids), SQL_IN_BATCH):
+            batch = chunk_ids[start : start + SQL_IN_BATCH]
+            # Descending order leaves each chunk's oldest source in the dict
+            first_sources = {
+                source.chunk_id: source
+                for source in session.execute(
+                    select(ChunkSource)
+                    .where(ChunkSource.chunk_id.in_(batch))
+                    .order_by(ChunkSource.source_id.desc())
+                ).scalars()
+            }
+            orphans = [chunk_id for chunk_id in batch if chunk_id not in first_sources]
+            if orphans:
+                SqlDB._delete_chunks(session, orphans)
+                # Near-duplicates of a deleted chunk are indexed again until the next marking
+                session.execute(
+                    update(Chunk)
+                    .where(Chunk.near_duplicate_of.in_(orphans))
+                    .values(near_duplicate_of=None)
+                )
+            for chunk_id, source in first_sources.items():
+                session.execute(
+                    update(Chunk)
+                    .where(Chunk.chunk_id == chunk_id)
+                    .values(
+                        source_url=source.source_url, file_url=source.file_url, title=source.title
+                    )
+                )
+
     def create_chunk(self, source_url: str, file_url: str, title: str, content: str) -> int:
         """
-        Insert a new row into the 'chunks' table and return its chunk_id.
+        Store a chunk and return its chunk_id; storing a copy of an existing chunk returns the
+        existing chunk_id and records the copy's URLs.
+        """
+        with self.session_local() as session, session.begin():
+            row = {'source_url': source_url, 'file_url': file_url, 'title': title}
+            return self._insert_chunks(session, [{**row, 'content': content}])[0]
+
+    def fetch_chunk_sources(self, chunk_ids: list[int]) -> dict[int, list[ChunkSource]]:
+        """
+        Return every page or file each of the chunks was found on.
         """
+        sources: dict[int, list[ChunkSource]] = {chunk_id: [] for chunk_id in chunk_ids}
         with self.session_local() as session:
-            with session.begin():
-                new_chunk = Chunk(
-                    source_url=source_url,
-                    file_url=file_url,
-                    title=title,
-                    content=content,
-                )
-                session.add(new_chunk)
-            session.refresh(new_chunk)
-            return new_chunk.chunk_id
+            for start in range(0, len(chunk_ids), SQL_IN_BATCH):
+                batch = chunk_ids[start : start + SQL_IN_BATCH]
+                for source in session.execute(
+                    select(ChunkSource)
+                    .where(ChunkSource.chunk_id.in_(batch))
+                    .order_by(ChunkSource.source_id)
+                ).scalars():
+                    sources[source.chunk_id].append(source)
+        return sources
+
+    def fetch_chunk_ids_by_source(
+        self,
+        source_url: str | None = None,
+        file_url: str | None = None,
+        title: str | None = None,
+    ) -> list[int]:
+        """
+        Return the chunks found on a page, in a file or under a title, copies included: a
+        chunk matches when one of its sources (see chunk_sources) matches every given filter.
+        """
+        conditions = [
+            column == value
+            for column, value in (
+                (ChunkSource.source_url, source_url),
+                (ChunkSource.file_url, file_url),
+                (ChunkSource.title, title),
+            )
+            if value
+        ]
+        with self.session_local() as session:
+            return list(
+                session.execute(
+                    select(ChunkSource.chunk_id)
+                    .where(*conditions)
+                    .distinct()
+                    .order_by(ChunkSource.chunk_id)
+                ).scalars()
+            )
 
     def fetch_all_chunks(self):
         """
@@ -55,6 +357,161 @@ class SqlDB:
             result = session.execute(statement).scalars().all()
             return result
 
+    def search_chunks(
+        self,
+        query: str,
+        top_k: int = 3,
+        source_url: str | None = None,
+        file_url: str | None = None,
+        title: str | None = None,
+        date_from: datetime | None = None,
+        date_to: datetime | None = None,
+    ) -> list[tuple[Chunk, float]]:
+        """
+        Full-text search over chunk titles and contents ranked with BM25.
+
+        Every word of the query is matched as a quoted term and terms are OR-ed, so
+        identifiers such as course codes or room numbers match exactly.
+
+        :return: List of (Chunk, score) tuples, best match first (higher score is better).
+        """
+        terms = re.findall(r'\w+', query)
+        if not terms or top_k <= 0:
+            return []
+        match = ' OR '.join(f'"{term}"' for term in terms)
+
+        conditions = ['chunks_fts MATCH :match', 'chunks.near_duplicate_of IS NULL']
+        params: dict = {'match': match, 'top_k': top_k}
+        # Copies count: a chunk matches when one of its sources matches every filter
+        source_filters = [
+            (column, value)
+            for column, value in (
+                ('source_url', source_url),
+                ('file_url', file_url),
+                ('title', title),
+            )
+            if value
+        ]
+        if source_filters:
+            matches = ' AND '.join(
+                f'chunk_sources.{column} = :{column}' for column, _ in source_filters
+            )
+            conditions.append(
+                'EXISTS (SELECT 1 FROM chunk_sources WHERE chunk_sources.chunk_id = chunks.chunk_id'
+                f' AND {matches})'
+            )
+            params.update(source_filters)
+        if date_from is not None:
+            conditions.append('chunks.date >= :date_from')
+            params['date_from'] = to_utc(date_from).strftime('%Y-%m-%d %H:%M:%S')
+        if date_to is not None:
+            conditions.append('chunks.date <= :date_to')
+            params['date_to'] = to_utc(date_to).strftime('%Y-%m-%d %H:%M:%S')
+
+        statement = text(
+            f"""
+            SELECT chunks_fts.rowid AS chunk_id,
+                   bm25(chunks_fts, {FTS_TITLE_WEIGHT}, {FTS_CONTENT_WEIGHT}) AS rank
+            FROM chunks_fts JOIN chunks ON chunks.chunk_id = chunks_fts.rowid
+            WHERE {' AND '.join(conditions)}
+            ORDER BY rank
+            LIMIT :top_k
+            """
+        )
+        with self.session_local() as session:
+            ranked = session.execute(statement, params).all()
+            if not ranked:
+                return []
+            chunks = session.execute(
+                select(Chunk).where(Chunk.chunk_id.in_([row.chunk_id for row in ranked]))
+            ).scalars()
+            by_id = {chunk.chunk_id: chunk for chunk in chunks}
+            # SQLite's bm25() is lower-is-better, negate it so higher scores rank first
+            return [(by_id[row.chunk_id], -row.rank) for row in ranked]
+
+    def fetch_chunks_to_embed(self, model_name: str, limit: int | None = None):
+        """
+        Returns chunks whose stored embedding is missing or was computed by another model,
+        near-duplicates excluded.
+
+        :param limit: Return at most this many chunks, oldest first.
+        """
+        with self.session_local() as session:
+            statement = (
+                select(Chunk)
+                .where(
+                    or_(
+                        Chunk.embedding.is_(None),
+                        Chunk.embedding_model.is_(None),
+                        Chunk.embedding_model != model_name,
+                    ),
+                    Chunk.near_duplicate_of.is_(None),
+                )
+                .order_by(Chunk.chunk_id)
+                .limit(limit)
+            )
+            return session.execute(statement).scalars().all()
+
+    def fetch_chunk_ids(self) -> set[int]:
+        """Return the ids of all stored chunks."""
+        with self.session_local() as session:
+            return set(session.execute(select(Chunk.chunk_id)).scalars())
+
+    def update_chunk_embeddings(self, embeddings: dict[int, bytes], model_name: str, dim: int):
+        """
+        Store encoded embeddings (chunk_id -> blob) tagged with the model name and dimension.
+        """
+        with self.session_local() as session, session.begin():
+            session.execute(
+                update(Chunk),
+                [
+                    {
+                        'chunk_id': chunk_id,
+                        'embedding': blob,
+                        'embedding_model': model_name,
+                        'embedding_dim': dim,
+                    }
+                    for chunk_id, blob in embeddings.items()
+                ],
+            )
+
+    def fetch_embedded_chunks(self, model_name: str):
+        """
+        Returns chunks that have an up-to-date embedding for the given model, near-duplicates
+        excluded.
+        """
+        with self.session_local() as session:
+            statement = (
+                select(Chunk)
+                .where(
+                    Chunk.embedding.is_not(None),
+                    Chunk.embedding_model == model_name,
+                    Chunk.near_duplicate_of.is_(None),
+                )
+                .order_by(Chunk.chunk_id)
+            )
+            return session.execute(statement).scalars().all()
+
+    def set_near_duplicates(self, representatives: dict[int, int]):
+        """
+        Replace the near-duplicate marks: each chunk_id in the dict points to the chunk that
+        represents its cluster, all other chunks are unmarked.
+        """
+        with self.session_local() as session, session.begin():
+            session.execute(
+                update(Chunk)
+                .where(Chunk.near_duplicate_of.is_not(None))
+                .values(near_duplicate_of=None)
+            )
+            if representatives:
+                session.execute(
+                    update(Chunk),
+                    [
+                        {'chunk_id': chunk_id, 'near_duplicate_of': representative}
+                        for chunk_id, representative in representatives.items()
+                    ],
+                )
+
     def fill_block_hours(self):
         """
         Insert default block hours if they are not present.
@@ -136,6 +593,379 @@ class SqlDB:
             session.refresh(new_lesson)
             return new_lesson.lesson_id
 
+    @staticmethod
+    def _get_or_create_ids(session, model, key: str, values: set[str]) -> dict[str, int]:
+        """
+        Map each value of the model's unique-by-convention key column to its primary key,
+        inserting rows for values that are missing.
+        """
+        if not values:
+            return {}
+        column = getattr(model, key)
+        primary_key = model.__mapper__.primary_key[0]
+        statement = select(column, primary_key).where(column.in_(sorted(values)))
+        ids = dict(session.execute(statement).all())
+        missing = [model(**{key: value}) for value in values if value not in ids]
+        if missing:
+            session.add_all(missing)
+            session.flush()
+            ids.update({getattr(row, key): getattr(row, primary_key.name) for row in missing})
+        return ids
+
+    def write_batch(
+        self,
+        groups: list[str] | None = None,
+        lessons: list[dict] | None = None,
+        chunks: list[dict] | None = None,
+        documents: list[dict] | None = None,
+        manifest: list[dict] | None = None,
+        timetables: list[dict] | None = None,
+        calendars: list[dict] | None = None,
+    ) -> int:
+        """
+        Write rows collected by the crawler in a single transaction.
+
+        :param groups: Group codes; existing groups are kept.
+        :param lessons: Lesson dicts with group_code, course_code and teacher_name instead of ids
+            plus the Lesson columns (lesson_date, block_id, room, building, info). Missing
+            groups, courses and teachers are created.
+        :param chunks: Chunk dicts with source_url, file_url, title and content.
+        :param documents: Dicts with source_url, file_url, title and the list of chunk texts
+            of a page or file; they replace the chunks previously stored for it. Optional
+            text_hash and extractor_version record the key of its cached extracted text.
+        :param manifest: Fetch manifest dicts with url, etag, last_modified and content_hash.
+        :param timetables: Complete timetables of groups, dicts with group_code and the list of
+            its lessons (lesson dicts without group_code); see _refresh_timetable.
+        :param calendars: Dicts with the source (file URL) of a calendar PDF and its list of
+            event dicts; they replace the events previously stored for that source.
+        :return: Number of rows written.
+        """
+        groups = groups or []
+        lessons = lessons or []
+        chunks = chunks or []
+        documents = documents or []
+        manifest = manifest or []
+        timetables = timetables or []
+        calendars = calendars or []
+        with self.session_local() as session, session.begin():
+            timetables = self._changed_timetables(session, timetables)
+            new_lessons = lessons + [
+                lesson for timetable in timetables for lesson in timetable['lessons']
+            ]
+            group_ids = self._get_or_create_ids(
+                session,
+                Group,
+                'group_code',
+                set(groups)
+                | {lesson['group_code'] for lesson in lessons}
+                | {timetable['group_code'] for timetable in timetables},
+            )
+            course_ids = self._get_or_create_ids(
+                session, Course, 'course_code', {lesson['course_code'] for lesson in new_lessons}
+            )
+            teacher_ids = self._get_or_create_ids(
+                session,
+                Teacher,
+                'full_name',
+                {lesson['teacher_name'] for lesson in new_lessons if lesson['teacher_name']},
+            )
+            if lessons:
+                session.execute(
+                    insert(Lesson),
+                    [
+                        {
+                            'group_id': group_ids[lesson['group_code']],
+                            'course_id': course_ids[lesson['course_code']],
+                            'teacher_id': teacher_ids.get(lesson['teacher_name']),
+                            'lesson_date': lesson['lesson_date'],
+                            'block_id': lesson['block_id'],
+                            'room': lesson['room'],
+                            'building': lesson['building'],
+                            'info': lesson['info'],
+                        }
+                        for lesson in lessons
+                    ],
+                )
+            timetable_changed = False
+            for timetable in timetables:
+                changes = self._refresh_timetable(
+                    session,
+                    group_ids[timetable['group_code']],
+                    timetable['lessons'],
+                    course_ids,
+                    teacher_ids,
+                )
+                session.execute(
+                    update(Group)
+                    .where(Group.group_id == group_ids[timetable['group_code']])
+                    .values(timetable_hash=timetable['hash'])
+                )
+                log_info(f"Timetable of group '{timetable['group_code']}': {changes}")
+                timetable_changed = timetable_changed or any(changes.values())
+            if timetable_changed:
+                self._bump_data_version(session, 'timetable')
+            self._insert_chunks(session, chunks)
+            for document in documents:
+                self._replace_document_chunks(session, **document)
+            for calendar in calendars:
+                self._replace_calendar_events(session, **calendar)
+            if manifest:
+                statement = sqlite_insert(FetchManifestEntry).values(manifest)
+                session.execute(
+                    statement.on_conflict_do_update(
+                        index_elements=[FetchManifestEntry.url],
+                        set_={
+                            'etag': statement.excluded.etag,
+                            'last_modified': statement.excluded.last_modified,
+                            'content_hash': statement.excluded.content_hash,
+                            'fetched_at': func.now(),
+                        },
+                    )
+                )
+        return (
+            len(groups)
+            + len(lessons)
+            + len(chunks)
+            + sum(len(document['chunks']) for document in documents)
+            + len(manifest)
+            + sum(len(timetable['lessons']) for timetable in timetables)
+            + sum(len(calendar['events']) for calendar in calendars)
+        )
+
+    @staticmethod
+    def timetable_hash(lessons: list[dict]) -> str:
+        """Order-independent hash of a group's scraped lessons."""
+        rows = sorted(json.dumps(lesson, sort_keys=True) for lesson in lessons)
+        return hashlib.md5('\n'.join(rows).encode('utf-8')).hexdigest()
+
+    def _changed_timetables(self, session, timetables: list[dict]) -> list[dict]:
+        """
+        Drop timetables identical to the last refresh of their group, comparing hashes only,
+        and store the hash of the others on their dicts.
+        """
+        if not timetables:
+            return []
+        stored = dict(
+            session.execute(
+                select(Group.group_code, Group.timetable_hash).where(
+                    Group.group_code.in_([timetable['group_code'] for timetable in timetables])
+                )
+            ).all()
+        )
+        changed = []
+        for timetable in timetables:
+            digest = self.timetable_hash(timetable['lessons'])
+            if stored.get(timetable['group_code']) != digest:
+                changed.append({**timetable, 'hash': digest})
+        return changed
+
+    @staticmethod
+    def _refresh_timetable(
+        session,
+        group_id: int,
+        lessons: list[dict],
+        course_ids: dict[str, int],
+        teacher_ids: dict[str, int],
+    ) -> dict[str, int]:
+        """
+        Make the stored lessons of a group equal to its scraped lessons.
+
+        Lessons are matched by their natural key (group, lesson_date, block_id); only new,
+        changed and removed lessons are written. Stored duplicates of a key are removed.
+
+        :param lessons: All scraped lessons of the group (lesson dicts without group_code).
+        :return: Dict with the numbers of inserted, updated and deleted lessons.
+        """
+        scraped: dict[tuple[str, str], dict] = {}
+        for lesson in lessons:
+            scraped.setdefault((lesson['lesson_date'], lesson['block_id']), lesson)
+
+        changes = {'inserted': 0, 'updated': 0, 'deleted': 0}
+        stored: dict[tuple[str, str], Lesson] = {}
+        for lesson in session.execute(select(Lesson).filter_by(group_id=group_id)).scalars():
+            key = (lesson.lesson_date, lesson.block_id)
+            if key in stored or key not in scraped:
+                session.delete(lesson)
+                changes['deleted'] += 1
+            else:
+                stored[key] = lesson
+
+        for key, lesson in scraped.items():
+            values = {
+                'course_id': course_ids[lesson['course_code']],
+                'teacher_id': teacher_ids.get(lesson['teacher_name']),
+                'room': lesson['room'],
+                'building': lesson['building'],
+                'info': lesson['info'],
+            }
+            current = stored.get(key)
+            if current is None:
+                session.add(
+                    Lesson(group_id=group_id, lesson_date=key[0], block_id=key[1], **values)
+                )
+                changes['inserted'] += 1
+            elif any(getattr(current, name) != value for name, value in values.items()):
+                for name, value in values.items():
+                    setattr(current, name, value)
+                changes['updated'] += 1
+        return changes
+
+    @staticmethod
+    def _bump_data_version(session, name: str):
+        version = session.get(DataVersion, name)
+        if version is None:
+            session.add(DataVersion(name=name, version=1))
+        else:
+            version.version += 1
+
+    def fetch_data_version(self, name: str) -> int:
+        """
+        Return the version of a dataset ('timetable'), 0 if it never changed.
+        """
+        with self.session_local() as session:
+            version = session.get(DataVersion, name)
+            return version.version if version else 0
+
+    def _replace_document_chunks(
+        self,
+        session,
+        source_url: str,
+        file_url: str | None,
+        title: str,
+        chunks: list[str],
+        text_hash: str | None = None,
+        extractor_version: int | None = None,
+    ):
+        """
+        Replace the chunks of a page (by source_url) or file (by file_url): its old sources are
+        removed, the new chunks stored, and chunks no longer found anywhere deleted. Chunks
+        whose text did not change keep their chunk_id (and embedding). With a text_hash, the
+        document's row in document_texts is updated too.
+        """
+        if text_hash:
+            statement = sqlite_insert(DocumentText).values(
+                url=file_url or source_url,
+                source_url=source_url,
+                file_url=file_url,
+                title=title,
+                text_hash=text_hash,
+                extractor_version=extractor_version,
+            )
+            session.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[DocumentText.url],
+                    set_={
+                        'source_url': statement.excluded.source_url,
+                        'title': statement.excluded.title,
+                        'text_hash': statement.excluded.text_hash,
+                        'extractor_version': statement.excluded.extractor_version,
+                    },
+                )
+            )
+        if file_url:
+            matches_document = ChunkSource.file_url == file_url
+        else:
+            matches_document = (ChunkSource.source_url == source_url) & ChunkSource.file_url.is_(
+                None
+            )
+        old_ids = list(
+            session.execute(select(ChunkSource.chunk_id).where(matches_document)).scalars()
+        )
+        session.execute(delete(ChunkSource).where(matches_document))
+        self._insert_chunks(
+            session,
+            [
+                {'source_url': source_url, 'file_url': file_url, 'title': title, 'content': c}
+                for c in chunks
+            ],
+        )
+        self._prune_chunks(session, old_ids)
+
+    @staticmethod
+    def _replace_calendar_events(session, source: str, events: list[dict]):
+        # The bundled calendar is stored under its file name and the crawled one under its
+        # URL; events of the same file name are replaced, so the calendar is stored once
+        name = PurePosixPath(urlparse(source).path).name or source
+        session.execute(
+            delete(CalendarEvent).where(
+                or_(
+                    CalendarEvent.source == source,
+                    CalendarEvent.source == name,
+                    CalendarEvent.source.endswith(f'/{name}', autoescape=True),
+                )
+            )
+        )
+        if events:
+            rows = [{**event, 'source': source} for event in events]
+            session.execute(insert(CalendarEvent), rows)
+
+    def replace_calendar_events(self, source: str, events: list[dict]) -> int:
+        """
+        Replace the stored events of a calendar PDF, including those stored for the same file
+        name under another URL or path.
+
+        :param source: File URL (or path) of the calendar PDF.
+        :param events: Dicts with event, start_date, end_date and page.
+        :return: Number of events stored.
+        """
+        with self.session_local() as session, session.begin():
+            self._replace_calendar_events(session, source, events)
+        return len(events)
+
+    def search_calendar_events(
+        self,
+        on_date: date | None = None,
+        keywords: list[str] | None = None,
+        limit: int = 10,
+    ) -> list[CalendarEvent]:
+        """
+        Find calendar events spanning a date and/or mentioning keywords.
+
+        :param on_date: Only events with start_date <= on_date <= end_date.
+        :param keywords: Only events whose text contains at least one keyword (case-insensitive
+            substring, so word stems match inflected forms); events matching more keywords
+            come first.
+        :param limit: Maximum number of events.
+        :return: Events ordered by number of matched keywords, then by start date.
+        """
+        statement = select(CalendarEvent)
+        if on_date is not None:
+            statement = statement.where(
+                CalendarEvent.start_date <= on_date, CalendarEvent.end_date >= on_date
+            )
+        keywords = [keyword.lower() for keyword in keywords or [] if keyword]
+        if keywords:
+            event_text = func.lower(CalendarEvent.event)
+            statement = statement.where(
+                or_(*(event_text.contains(keyword, autoescape=True) for keyword in keywords))
+            )
+        elif on_date is None:
+            return []
+        with self.session_local() as session:
+            events = list(
+                session.execute(statement.order_by(CalendarEvent.start_date)).scalars().all()
+            )
+        # SQLite's lower() only folds ASCII, so keyword matches are counted on the Python side
+        events.sort(key=lambda e: -sum(keyword in e.event.lower() for keyword in keywords))
+        return events[:limit]
+
+    def fetch_document_texts(self) -> list[DocumentText]:
+        """
+        Return the cached-text keys of every crawled page and file.
+        """
+        with self.session_local() as session:
+            return list(
+                session.execute(select(DocumentText).order_by(DocumentText.url)).scalars().all()
+            )
+
+    def fetch_manifest(self) -> dict[str, FetchManifestEntry]:
+        """
+        Return the fetch manifest keyed by URL.
+        """
+        with self.session_local() as session:
+            entries = session.execute(select(FetchManifestEntry)).scalars().all()
+            return {entry.url: entry for entry in entries}
+
     def fetch_lessons_by_group(self, group_code: str):
         """
         Return lessons (as a list) for a given group_code.
@@ -1,22 +1,86 @@
-from langchain.schema import Document
-from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
+from datetime import datetime, timezone
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 
 from ..constants import (
     EMBEDDINGS_MODEL_NAME,
     UNIVERSITY_DOCS_COLLECTION,
     VECTOR_DATABASE_FILE,
 )
-from ..utils import log_info
+from ..utils import log_info, to_utc
 from .models import Chunk
 
 
+def chunk_metadata(chunk: Chunk) -> dict:
+    """
+    Build vector store metadata for a chunk, converting None values to empty strings.
+    """
+    return {
+        'chunk_id': chunk.chunk_id,
+        'source_url': chunk.source_url if chunk.source_url is not None else '',
+        'file_url': chunk.file_url if chunk.file_url is not None else '',
+        'title': chunk.title if chunk.title is not None else '',
+        'date': str(chunk.date) if chunk.date is not None else '',
+        'timestamp': to_timestamp(chunk.date),
+    }
+
+
+def chunk_to_document(chunk: Chunk) -> Document:
+    """
+    Convert a Chunk row into a LangChain Document with the same metadata as the index.
+    """
+    return Document(page_content=chunk.content, metadata=chunk_metadata(chunk))
+
+
+def to_timestamp(value) -> int:
+    """
+    Convert a chunk date or date filter (datetime or its string form) to UTC epoch seconds,
+    0 when unknown; naive values are UTC (see to_utc). Chroma only supports range operators
+    on numbers, so dates are filtered on this value.
+    """
+    if value is None or value == '':
+        return 0
+    return int(to_utc(value).replace(tzinfo=timezone.utc).timestamp())
+
+
+def build_where_filter(
+    source_url: str | None = None,
+    file_url: str | None = None,
+    title: str | None = None,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    chunk_ids: list[int] | None = None,
+) -> dict | None:
+    """
+    Build a Chroma `where` clause from metadata filters; None when nothing is filtered.
+    """
+    conditions: list[dict] = [
+        {key: value}
+        for key, value in (('source_url', source_url), ('file_url', file_url), ('title', title))
+        if value
+    ]
+    if chunk_ids is not None:
+        conditions.append({'chunk_id': {'$in': chunk_ids}})
+    if date_from is not None:
+        conditions.append({'timestamp': {'$gte': to_timestamp(date_from)}})
+    if date_to is not None:
+        conditions.append({'timestamp': {'$lte': to_timestamp(date_to)}})
+
+    if not conditions:
+        return None
+    if len(conditions) == 1:
+        return conditions[0]
+    return {'$and': conditions}
+
+
 class VectorDB:
     def __init__(
         self,
         db_file: str = VECTOR_DATABASE_FILE,
         collection_name: str = UNIVERSITY_DOCS_COLLECTION,
         embeddings_model_name: str = EMBEDDINGS_MODEL_NAME,
+        embedding_function: Embeddings | None = None,
     ):
         """
         Initialize ChromaDB using LangChain's Chroma wrapper.
@@ -24,8 +88,18 @@ class VectorDB:
         :param db_file: Path to the ChromaDB database.
         :param collection_name: Name of the collection in ChromaDB.
         :param embeddings_model_name: Hugging Face model for embedding generation.
+        :param embedding_function: Embeddings used instead of loading embeddings_model_name,
+            e.g. offline fake embeddings in benchmarks.
         """
-        self.embedding_function = HuggingFaceEmbeddings(model_name=embeddings_model_name)
+        # Chroma and the embedding libraries load in seconds, so only when a store is opened
+        # pylint: disable=import-outside-toplevel
+        from langchain_chroma import Chroma
+
+        if embedding_function is None:
+            from langchain_huggingface import HuggingFaceEmbeddings
+
+            embedding_function = HuggingFaceEmbeddings(model_name=embeddings_model_name)
+        self.embedding_function = embedding_function
 
         # Initialize LangChain's Chroma vector store
         self.vector_store = Chroma(
@@ -44,32 +118,71 @@ class VectorDB:
             log_info(f'Chunk {chunk.chunk_id} already exists in vector DB. Skipping.')
             return
 
-        # Prepare metadata ensuring no None values exist (convert None to empty string)
-        metadata = {
-            'chunk_id': chunk.chunk_id,
-            'source_url': chunk.source_url if chunk.source_url is not None else '',
-            'file_url': chunk.file_url if chunk.file_url is not None else '',
-            'title': chunk.title if chunk.title is not None else '',
-            'date': str(chunk.date) if chunk.date is not None else '',
-        }
-
         # Convert to LangChain Document format
-        document = Document(
-            page_content=chunk.content,
-            metadata=metadata,
-        )
+        document = chunk_to_document(chunk)
 
-        # Add the document to Chroma
-        self.vector_store.add_documents([document])
+        # Add the document to Chroma, keyed by chunk_id so the existence check above works
+        self.vector_store.add_documents([document], ids=[str(chunk.chunk_id)])
         log_info(f'Chunk {chunk.chunk_id} added to ChromaDB.')
 
-    def query(self, query: str, top_k: int = 3):
+    def add_embeddings(self, chunks: list[Chunk], embeddings, batch_size: int = 512):
+        """
+        Upsert chunks with precomputed embeddings (e.g. loaded from chunks.db) into ChromaDB,
+        keyed by chunk_id, without running the embedding model.
+        """
+        # pylint: disable=protected-access
+        collection = self.vector_store._collection
+        for start in range(0, len(chunks), batch_size):
+            batch = chunks[start : start + batch_size]
+            collection.upsert(
+                ids=[str(chunk.chunk_id) for chunk in batch],
+                embeddings=[list(map(float, v)) for v in embeddings[start : start + batch_size]],
+                metadatas=[chunk_metadata(chunk) for chunk in batch],
+                documents=[chunk.content for chunk in batch],
+            )
+            log_info(f'Upserted {start + len(batch)}/{len(chunks)} chunks to ChromaDB.')
+
+    def indexed_chunk_ids(self) -> set[int]:
+        """Return the chunk_ids stored in the collection."""
+        # pylint: disable=protected-access
+        return {int(i) for i in self.vector_store._collection.get(include=[])['ids']}
+
+    def delete_chunks(self, chunk_ids: list[int]):
+        """Remove chunks (e.g. deleted from chunks.db) from the collection."""
+        if chunk_ids:
+            # pylint: disable=protected-access
+            self.vector_store._collection.delete(ids=[str(chunk_id) for chunk_id in chunk_ids])
+
+    def query(
+        self,
+        query: str,
+        top_k: int = 3,
+        source_url: str | None = None,
+        file_url: str | None = None,
+        title: str | None = None,
+        date_from: datetime | None = None,
+        date_to: datetime | None = None,
+        chunk_ids: list[int] | None = None,
+    ):
         """
         Retrieve top-k relevant chunks from ChromaDB using similarity search.
 
+        Metadata filters are passed to Chroma's `where` clause, so only matching chunks
+        are scored.
+
         :param query: User query string.
         :param top_k: Number of top matches to retrieve.
+        :param source_url: Only chunks scraped from this page.
+        :param file_url: Only chunks extracted from this file.
+        :param title: Only chunks with this title (page heading or file name).
+        :param date_from: Only chunks stored at or after this date (naive datetimes are UTC).
+        :param date_to: Only chunks stored at or before this date (naive datetimes are UTC).
+        :param chunk_ids: Only these chunks (e.g. every chunk found on a page, see
+            SqlDB.fetch_chunk_ids_by_source).
         :return: List of Document objects (LangChain).
         """
-        results = self.vector_store.similarity_search(query, k=top_k)
+        if chunk_ids is not None and not chunk_ids:
+            return []
+        where = build_where_filter(source_url, file_url, title, date_from, date_to, chunk_ids)
+        results = self.vector_store.similarity_search(query, k=top_k, filter=where)
         return results
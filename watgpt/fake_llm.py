@@ -0,0 +1,102 @@
+"""Deterministic offline stand-in for the chat model (LLM_PROVIDER=fake).
+
+Benchmarks and load tests of LLMEngine and the API run without a Groq key: the fake model
+answers the query extraction prompt with the group code and date found in the question by
+regular expressions, and any other prompt with FAKE_LLM_RESPONSE_TOKENS words picked from the
+prompt, seeded by its hash. It sleeps FAKE_LLM_FIRST_TOKEN_LATENCY seconds before the first
+token and FAKE_LLM_TOKEN_LATENCY seconds per token, so the same prompt always takes the same
+time and gets the same answer.
+"""
+
+import hashlib
+import json
+import random
+import re
+import time
+from collections.abc import Iterator
+from typing import Any
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel, generate_from_stream
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from .constants import (
+    FAKE_LLM_FIRST_TOKEN_LATENCY,
+    FAKE_LLM_RESPONSE_TOKENS,
+    FAKE_LLM_STREAMING,
+    FAKE_LLM_TOKEN_LATENCY,
+)
+
+GROUP_CODE_PATTERN = re.compile(r'\b[A-Z]{3}\d{2}[A-Z0-9]{2,8}\b')
+RAW_DATE_PATTERN = re.compile(
+    r'\b\d{4}-\d{2}-\d{2}\b|\b\d{1,2}\.\d{1,2}\.\d{4}\b|\b(?:dzisiaj|dziś|jutro|pojutrze)\b',
+    re.IGNORECASE,
+)
+# Marks the query extraction prompt, which asks for a JSON object
+EXTRACTION_PROMPT_MARKER = 'group_code'
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model returning deterministic answers after a simulated generation time."""
+
+    first_token_latency: float = FAKE_LLM_FIRST_TOKEN_LATENCY
+    token_latency: float = FAKE_LLM_TOKEN_LATENCY
+    response_tokens: int = FAKE_LLM_RESPONSE_TOKENS
+    streaming: bool = FAKE_LLM_STREAMING
+
+    @property
+    def _llm_type(self) -> str:
+        return 'fake'
+
+    def respond(self, messages: list[BaseMessage]) -> list[str]:
+        """
+        Tokens of the answer to a prompt.
+
+        :return: The JSON answer of the query extraction prompt as one token, otherwise
+            response_tokens words of the prompt followed by spaces.
+        """
+        prompt = '\n'.join(str(message.content) for message in messages)
+        if EXTRACTION_PROMPT_MARKER in str(messages[0].content):
+            query = next(
+                (str(m.content) for m in reversed(messages) if isinstance(m, HumanMessage)), ''
+            )
+            group_code = GROUP_CODE_PATTERN.search(query)
+            raw_date = RAW_DATE_PATTERN.search(query)
+            answer = {
+                'group_code': group_code.group() if group_code else None,
+                'raw_date': raw_date.group() if raw_date else None,
+            }
+            return [json.dumps(answer, ensure_ascii=False)]
+        words = re.findall(r'\w+', prompt) or ['odpowiedź']
+        rng = random.Random(hashlib.sha256(prompt.encode('utf-8')).digest())
+        return [f'{rng.choice(words)} ' for _ in range(self.response_tokens)]
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if self.streaming:
+            return generate_from_stream(self._stream(messages, stop, run_manager, **kwargs))
+        tokens = self.respond(messages)
+        time.sleep(self.first_token_latency + self.token_latency * len(tokens))
+        message = AIMessage(content=''.join(tokens).strip())
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.first_token_latency)
+        for token in self.respond(messages):
+            time.sleep(self.token_latency)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
@@ -1,39 +1,104 @@
 import json
 import re
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlparse
 
-from langchain.chat_models import init_chat_model
-from langchain.memory import ConversationBufferMemory
-from langchain.schema import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.documents import Document
+from langchain_core.messages import HumanMessage, SystemMessage
 from tabulate import tabulate
 
 from .constants import (
+    ALLOWED_EXTENSIONS,
+    CALENDAR_ANSWER_MAX_EVENTS,
+    CALENDAR_CONTEXT_EVENTS,
+    CALENDAR_INTENT_PATTERN,
+    CALENDAR_KEYWORD_LETTERS,
+    CALENDAR_MIN_MATCHED_KEYWORDS,
+    CALENDAR_QUERY_STOPWORDS,
     LLM_MODEL_NAME,
     LLM_PROVIDER,
     LLM_QUERY_EXTRACTION_PROMPT,
     LLM_RAG_SYSTEM_PROMPT,
     PROMPTS_FILE,
+    QUERY_TITLE_FILTERS,
+    RAG_TOP_K,
+    RETRIEVAL_MODE,
+    VECTOR_DB_BACKEND,
 )
-from .db import SqlDB, VectorDB
-from .utils import convert_natural_date_to_iso, load_prompt, log_debug
+from .db import NumpyVectorDB, SqlDB, VectorDB
+from .db.models import CalendarEvent
+from .prompt_builder import PromptBuilder
+from .retriever import Retriever
+from .utils import convert_natural_date_to_iso, is_debug_enabled, load_prompt, log_debug
+
+URL_PATTERN = re.compile(r'https?://[^\s\'"<>]+')
 
 
 class LLMEngine:
-    def __init__(self, provider: str = LLM_PROVIDER, model: str = LLM_MODEL_NAME):
+    def __init__(
+        self,
+        provider: str = LLM_PROVIDER,
+        model: str = LLM_MODEL_NAME,
+        vector_backend: str = VECTOR_DB_BACKEND,
+        retrieval_mode: str = RETRIEVAL_MODE,
+        vector_db: VectorDB | NumpyVectorDB | None = None,
+        chunk_db: SqlDB | None = None,
+    ):
         """
         Handles interaction with LLM, integrates RAG retrieval, and queries timetable data.
+
+        The provider 'fake' uses the offline FakeChatModel instead of a hosted model.
+        After each chat() call, last_route tells how the query was answered ('timetable',
+        'calendar', 'calendar_context' or 'rag') and last_timings the seconds spent per stage.
+
+        :param vector_db: Vector store to search instead of opening vector_backend's default.
+        :param chunk_db: Chunk database to use instead of the default chunks.db.
         """
         self.provider = provider.lower()
         self.model = model
-        self.vector_db = VectorDB()
-        self.chunk_db = SqlDB()
+        if vector_db is None:
+            vector_db = NumpyVectorDB() if vector_backend == 'numpy' else VectorDB()
+        self.vector_db: VectorDB | NumpyVectorDB = vector_db
+        self.chunk_db = chunk_db or SqlDB()
+        self.retriever = Retriever(self.vector_db, self.chunk_db)
+        self.retrieval_mode = retrieval_mode
+        # Imported here: the chat model integrations and langchain.memory (which loads
+        # transformers) take seconds to import
+        # pylint: disable=import-outside-toplevel
+        from langchain.chat_models import init_chat_model
+        from langchain.memory import ConversationBufferMemory
+
         self.memory = ConversationBufferMemory(memory_key='chat_history', return_messages=True)
 
-        self.llm = init_chat_model(self.model, model_provider=self.provider)
-        log_debug(f'Initialized LLM model: {self.model} ({self.provider})')
+        if self.provider == 'fake':
+            from .fake_llm import FakeChatModel
+
+            self.llm = FakeChatModel()
+        else:
+            self.llm = init_chat_model(self.model, model_provider=self.provider)
+        log_debug('Initialized LLM model: %s (%s)', self.model, self.provider)
 
         # Load system prompts
         self.system_prompt = load_prompt(PROMPTS_FILE, LLM_RAG_SYSTEM_PROMPT)
         self.query_extraction_prompt = load_prompt(PROMPTS_FILE, LLM_QUERY_EXTRACTION_PROMPT)
+        self.prompt_builder = PromptBuilder()
+        self.last_prompt_report: dict = {}
+        self.last_route: str | None = None
+        self.last_timings: dict[str, float] = {}
+
+    @contextmanager
+    def timed(self, stage: str):
+        """Add the time spent in a stage of the current chat() call to last_timings."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.last_timings[stage] = (
+                self.last_timings.get(stage, 0.0) + time.perf_counter() - start
+            )
 
     def extract_query_details(self, query: str) -> tuple[str | None, str | None]:
         """
@@ -58,17 +123,54 @@ class LLMEngine:
                 group_code = extracted_data.get('group_code', None)
                 raw_date = extracted_data.get('raw_date', None)
                 date = convert_natural_date_to_iso(raw_date)
-                log_debug(f'Extracted group code: {group_code}, date: {date}')
+                log_debug('Extracted group code: %s, date: %s', group_code, date)
 
                 return group_code, date
         except Exception as e:  # pylint: disable=broad-exception-caught
-            log_debug(f'Failed to parse LLM response: {response.content} - {e}')
+            log_debug('Failed to parse LLM response: %s - %s', response.content, e)
 
         return None, None
 
-    def retrieve_context(self, query: str, top_k: int = 3):
-        """Fetch relevant documents from VectorDB."""
-        return self.vector_db.query(query, top_k=top_k)
+    def extract_query_filters(self, query: str) -> dict[str, str]:
+        """
+        Derive vector store metadata filters from the query using pattern matching only.
+
+        A URL in the query restricts retrieval to that page (or file), otherwise keywords
+        from QUERY_TITLE_FILTERS restrict it to a known document.
+
+        :param query: User's question
+        :return: Keyword arguments for VectorDB.query (empty when nothing matched)
+        """
+        url_match = URL_PATTERN.search(query)
+        if url_match:
+            url = url_match.group().rstrip('.,;:!?)')
+            extension = Path(urlparse(url).path).suffix.lstrip('.').lower()
+            return {'file_url' if extension in ALLOWED_EXTENSIONS else 'source_url': url}
+
+        for pattern, title in QUERY_TITLE_FILTERS:
+            if re.search(pattern, query, re.IGNORECASE):
+                return {'title': title}
+        return {}
+
+    def retrieve_context(
+        self,
+        query: str,
+        top_k: int = 3,
+        filters: dict | None = None,
+        mode: str | None = None,
+    ):
+        """
+        Fetch relevant documents with vector, lexical or hybrid search (see Retriever),
+        searching only chunks matching the filters. Falls back to an unfiltered search when
+        the filters match nothing.
+        """
+        mode = mode or self.retrieval_mode
+        if filters:
+            results = self.retriever.retrieve(query, top_k=top_k, filters=filters, mode=mode)
+            if results:
+                return results
+            log_debug('No documents match filters %s, searching all documents.', filters)
+        return self.retriever.retrieve(query, top_k=top_k, mode=mode)
 
     def retrieve_timetable(self, date: str, group_code: str):
         """Fetch timetable data from ChunkDB."""
@@ -84,7 +186,7 @@ class LLMEngine:
                         if lesson.lesson_date == date  # Filter only for that day
                     ]
                 )
-                log_debug(f'Found timetable info: {timetable_info}')
+                log_debug('Found timetable info: %s', timetable_info)
                 headers = [
                     'Data',
                     'Blok',
@@ -111,57 +213,174 @@ class LLMEngine:
             return f'Nie znaleziono zajęć dla grupy {group_code} na {date}.'
         return None
 
+    @staticmethod
+    def calendar_keywords(query: str) -> list[str]:
+        """
+        Words of the query to look up in calendar events, cut to CALENDAR_KEYWORD_LETTERS
+        letters so that inflected forms match; question words and numbers are skipped.
+        """
+        keywords = []
+        for word in re.findall(r'\w+', query.lower()):
+            if (
+                len(word) >= CALENDAR_KEYWORD_LETTERS
+                and not word.isdigit()
+                and word not in CALENDAR_QUERY_STOPWORDS
+            ):
+                keyword = word[:CALENDAR_KEYWORD_LETTERS]
+                if keyword not in keywords:
+                    keywords.append(keyword)
+        return keywords
+
+    @classmethod
+    def calendar_topic_keywords(cls, query: str) -> list[str]:
+        """
+        Keywords of the query words that do not themselves match CALENDAR_INTENT_PATTERN,
+        i.e. what the question asks about ('zimo' in 'Kiedy jest sesja zimowa?').
+        """
+        words = re.findall(r'\w+', query)
+        return cls.calendar_keywords(
+            ' '.join(w for w in words if not re.search(CALENDAR_INTENT_PATTERN, w, re.IGNORECASE))
+        )
+
+    def retrieve_calendar_events(self, query: str, date: str | None) -> list[CalendarEvent]:
+        """
+        Fetch the calendar events best matching a question about the academic calendar.
+
+        Only strong matches count: an event has to contain every topic keyword of the query
+        (see calendar_topic_keywords), or at least CALENDAR_MIN_MATCHED_KEYWORDS of its
+        keywords. A question matching events only weakly (e.g. 'Kiedy jest egzamin z fizyki?'
+        and a 'Zimowa sesja egzaminacyjna' event) is left to RAG.
+
+        :param query: User's question; must match CALENDAR_INTENT_PATTERN.
+        :param date: Date extracted from the question (YYYY_MM_DD), restricts the events to
+            those spanning it.
+        :return: Strongly matching events with the most matched keywords (events on the date
+            if the query has no topic keywords), empty for other questions.
+        """
+        if not re.search(CALENDAR_INTENT_PATTERN, query, re.IGNORECASE):
+            return []
+        on_date = datetime.strptime(date, '%Y_%m_%d').date() if date else None
+        keywords = self.calendar_keywords(query)
+        topic_keywords = self.calendar_topic_keywords(query)
+        limit = CALENDAR_CONTEXT_EVENTS
+        events = self.chunk_db.search_calendar_events(on_date, keywords, limit=limit)
+        if not events and on_date and not topic_keywords:
+            return self.chunk_db.search_calendar_events(on_date, limit=limit)
+        if not events:
+            return []
+
+        def is_strong(event: CalendarEvent, score: int) -> bool:
+            text = event.event.lower()
+            return score >= CALENDAR_MIN_MATCHED_KEYWORDS or all(k in text for k in topic_keywords)
+
+        scores = [sum(keyword in event.event.lower() for keyword in keywords) for event in events]
+        return [
+            event
+            for event, score in zip(events, scores, strict=True)
+            if score == scores[0] and is_strong(event, score)
+        ]
+
+    @staticmethod
+    def format_calendar_dates(event: CalendarEvent) -> tuple[str, str]:
+        return event.start_date.strftime('%d.%m.%Y'), event.end_date.strftime('%d.%m.%Y')
+
+    def answer_from_calendar(self, events: list[CalendarEvent]) -> str:
+        """Format calendar events as the answer, without calling the LLM."""
+        headers = ['Wydarzenie', 'Od', 'Do', 'Strona']
+        rows = [[event.event, *self.format_calendar_dates(event), event.page] for event in events]
+        table = tabulate(rows, headers=headers, tablefmt='fancy_grid')
+        sources = sorted({event.source for event in events})
+        return f'Terminy z kalendarza roku akademickiego:\n{table}\nŹródła: {sources}'
+
+    def calendar_event_documents(self, events: list[CalendarEvent]) -> list[Document]:
+        """Calendar events as context documents of the RAG prompt, one short row each."""
+        documents = []
+        for event in events:
+            start, end = self.format_calendar_dates(event)
+            dates = start if start == end else f'{start} - {end}'
+            documents.append(
+                Document(
+                    page_content=f'{event.event}: {dates}',
+                    metadata={
+                        'title': Path(urlparse(event.source).path).name,
+                        'source_url': '',
+                        'file_url': event.source,
+                    },
+                )
+            )
+        return documents
+
     def chat(self, query: str):
         """
-        Determines whether to use the timetable database or RAG for answering the query.
+        Determines whether to use the timetable database, the calendar events or RAG for
+        answering the query.
 
         :param query: User's question
         :return: Response from LLM (based on RAG or database)
         """
+        self.last_timings = {}
         # Try extracting timetable-related details (group & date)
-        group_code, date = self.extract_query_details(query)
+        with self.timed('query_extraction'):
+            group_code, date = self.extract_query_details(query)
 
         # If both group and date are extracted, use timetable-based retrieval
         if group_code and date:
-            response = self.retrieve_timetable(date, group_code)
+            with self.timed('timetable'):
+                response = self.retrieve_timetable(date, group_code)
             if response:
+                self.last_route = 'timetable'
                 return response
 
-        # Otherwise, use RAG-based retrieval
-        results = self.retrieve_context(query)
-        context = (
-            '\n\n---\n\n'.join([doc.page_content for doc in results])
-            if results
-            else 'No relevant documents found.'
-        )
+        # Calendar questions: a few matching events are the answer, more are the only context
+        with self.timed('calendar'):
+            events = self.retrieve_calendar_events(query, date)
+        if 0 < len(events) <= CALENDAR_ANSWER_MAX_EVENTS:
+            self.last_route = 'calendar'
+            return self.answer_from_calendar(events)
+        if events:
+            self.last_route = 'calendar_context'
+            results = self.calendar_event_documents(events)
+        else:
+            # Otherwise, use RAG-based retrieval
+            self.last_route = 'rag'
+            with self.timed('retrieval'):
+                results = self.retrieve_context(
+                    query, top_k=RAG_TOP_K, filters=self.extract_query_filters(query)
+                )
 
-        # Construct conversation history
-        history = self.memory.load_memory_variables({})['chat_history']
+        with self.timed('prompt'):
+            # Construct conversation history
+            history = self.memory.load_memory_variables({})['chat_history']
 
-        # Construct prompt
-        prompt = self.system_prompt.format(context=context)
-        messages: list[BaseMessage] = [SystemMessage(content=prompt)]
-        messages.extend(history)  # Include chat history
-        messages.append(HumanMessage(content=query))  # Add user query
+            # Construct prompt, packing history and the most relevant context into the budget
+            messages, results, self.last_prompt_report = self.prompt_builder.build(
+                self.system_prompt, history, query, results
+            )
 
-        log_debug('-' * 80)
-        log_debug(f'Messages: {messages}')
+        # Checked once, so a sampled request logs both its prompt and its response
+        debug = is_debug_enabled()
+        if debug:
+            log_debug('%s\nMessages: %s', '-' * 80, messages)
 
         # Generate response
-        response = self.llm.invoke(messages)
+        with self.timed('generation'):
+            response = self.llm.invoke(messages)
 
         # Store conversation history
         self.memory.save_context({'input': query}, {'output': str(response.content)})
+        # Every page or file a retrieved chunk was found on (see Retriever.add_sources)
         sources = [
             f"""
-            {doc.metadata.get('title', 'No Title')} - {doc.metadata.get('source_url', 'No URL')} 
-            - {doc.metadata.get('file_url', 'No URL')}
+            {source.get('title', 'No Title')} - {source.get('source_url', 'No URL')} 
+            - {source.get('file_url', 'No URL')}
             """
             for doc in results
+            for source in doc.metadata.get('sources') or [doc.metadata]
         ]
 
         formatted_response = f'{response.content}\nŹródła: {sources}'
 
-        log_debug(f'Response: {formatted_response}')
+        if debug:
+            log_debug('Response: %s', formatted_response)
 
         return formatted_response
@@ -0,0 +1,201 @@
+from langchain_core.documents import Document
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+from .constants import (
+    LLM_CONTEXT_WINDOW,
+    LLM_RESPONSE_TOKENS,
+    LLM_TOKENIZER_NAME,
+    MIN_CONTEXT_SPAN_TOKENS,
+    PROMPT_CONTEXT_TOKENS,
+    PROMPT_HISTORY_TOKENS,
+)
+from .utils import log_info, log_warning
+
+CONTEXT_SEPARATOR = '\n\n---\n\n'
+NO_CONTEXT = 'No relevant documents found.'
+# Tokens the chat template adds around every message (role header and end-of-turn markers)
+MESSAGE_OVERHEAD_TOKENS = 5
+# Chunks overlap by 20 tokens; searching a little further also covers re-tokenized borders
+MAX_OVERLAP_CHARS = 400
+MIN_OVERLAP_CHARS = 16
+
+
+def overlap_length(left: str, right: str) -> int:
+    """
+    Length of the longest suffix of `left` that is also a prefix of `right`.
+    """
+    longest = min(len(left), len(right), MAX_OVERLAP_CHARS)
+    for size in range(longest, MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+class PromptBuilder:
+    def __init__(
+        self,
+        tokenizer_name: str = LLM_TOKENIZER_NAME,
+        context_window: int = LLM_CONTEXT_WINDOW,
+        response_tokens: int = LLM_RESPONSE_TOKENS,
+        history_tokens: int = PROMPT_HISTORY_TOKENS,
+        context_tokens: int = PROMPT_CONTEXT_TOKENS,
+    ):
+        """
+        Builds RAG prompts that fit the model's context window.
+
+        System prompt, chat history and retrieved context are budgeted separately and
+        counted with the target model's tokenizer. If that tokenizer cannot be loaded,
+        tokens are estimated from the text length.
+
+        :param tokenizer_name: Hugging Face tokenizer of the chat model.
+        :param context_window: Maximum number of tokens the model accepts.
+        :param response_tokens: Tokens reserved for the generated answer.
+        :param history_tokens: Budget for previous conversation turns.
+        :param context_tokens: Budget for retrieved documents.
+        """
+        self.context_window = context_window
+        self.response_tokens = response_tokens
+        self.history_tokens = history_tokens
+        self.context_tokens = context_tokens
+        from transformers import AutoTokenizer  # pylint: disable=import-outside-toplevel
+
+        try:
+            self.tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+        except OSError as e:
+            log_warning(f'Cannot load tokenizer {tokenizer_name} ({e}), estimating tokens.')
+            self.tokenizer = None
+
+    def count_tokens(self, text: str) -> int:
+        if self.tokenizer is None:
+            return len(text) // 4 + 1
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut text down to at most max_tokens tokens."""
+        if self.tokenizer is None:
+            return text[: max_tokens * 4]
+        encoding = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+        offsets = encoding['offset_mapping']
+        if len(offsets) <= max_tokens:
+            return text
+        return text[: offsets[max_tokens - 1][1]]
+
+    def select_history(self, history: list[BaseMessage]) -> tuple[list[BaseMessage], int]:
+        """
+        Keep the most recent messages that fit in the history budget.
+
+        :return: Tuple of (kept messages in chronological order, their token count).
+        """
+        kept: list[BaseMessage] = []
+        used = 0
+        for message in reversed(history):
+            tokens = self.count_tokens(str(message.content)) + MESSAGE_OVERHEAD_TOKENS
+            if used + tokens > self.history_tokens:
+                break
+            kept.append(message)
+            used += tokens
+        kept.reverse()
+        return kept, used
+
+    def pack_context(self, documents: list[Document], budget: int):
+        """
+        Pack documents, most relevant first, into the context budget.
+
+        Duplicates and documents already contained in packed text are dropped, overlap with
+        neighbouring chunks of the same source is trimmed, and the last document that does
+        not fit is truncated if at least MIN_CONTEXT_SPAN_TOKENS of it still fit.
+
+        :return: Tuple of (list of (document, packed text), tokens used, stats dict).
+        """
+        packed: list[tuple[Document, str]] = []
+        used = 0
+        stats = {'dropped_documents': 0, 'trimmed_overlaps': 0, 'truncated_documents': 0}
+        separator_tokens = self.count_tokens(CONTEXT_SEPARATOR)
+
+        for document in documents:
+            text = document.page_content.strip()
+            source = (document.metadata.get('source_url'), document.metadata.get('file_url'))
+            if not text or any(text in packed_text for _, packed_text in packed):
+                stats['dropped_documents'] += 1
+                continue
+
+            for packed_document, packed_text in packed:
+                packed_source = (
+                    packed_document.metadata.get('source_url'),
+                    packed_document.metadata.get('file_url'),
+                )
+                if packed_source != source:
+                    continue
+                head = overlap_length(packed_text, text)
+                tail = overlap_length(text, packed_text)
+                if head or tail:
+                    stats['trimmed_overlaps'] += 1
+                    text = text[head : len(text) - tail].strip()
+            if not text:
+                stats['dropped_documents'] += 1
+                continue
+
+            remaining = budget - used - (separator_tokens if packed else 0)
+            tokens = self.count_tokens(text)
+            if tokens > remaining:
+                if remaining < MIN_CONTEXT_SPAN_TOKENS:
+                    stats['dropped_documents'] += 1
+                    continue
+                text = self.truncate(text, remaining)
+                tokens = self.count_tokens(text)
+                stats['truncated_documents'] += 1
+
+            packed.append((document, text))
+            used += tokens + (separator_tokens if len(packed) > 1 else 0)
+
+        return packed, used, stats
+
+    def build(
+        self,
+        system_prompt: str,
+        history: list[BaseMessage],
+        query: str,
+        documents: list[Document],
+    ) -> tuple[list[BaseMessage], list[Document], dict]:
+        """
+        Build the message list for a RAG query within the token budget.
+
+        :param system_prompt: System prompt template with a `{context}` placeholder.
+        :param history: Previous conversation messages, oldest first.
+        :param query: User's question.
+        :param documents: Retrieved documents ordered by relevance.
+        :return: Tuple of (messages, documents used in the context, prompt size report).
+        """
+        system_tokens = self.count_tokens(system_prompt.format(context=''))
+        system_tokens += MESSAGE_OVERHEAD_TOKENS
+        query_tokens = self.count_tokens(query) + MESSAGE_OVERHEAD_TOKENS
+        kept_history, history_tokens = self.select_history(history)
+
+        available = (
+            self.context_window
+            - self.response_tokens
+            - system_tokens
+            - history_tokens
+            - query_tokens
+        )
+        packed, context_tokens, stats = self.pack_context(
+            documents, max(0, min(self.context_tokens, available))
+        )
+        context = CONTEXT_SEPARATOR.join(text for _, text in packed) if packed else NO_CONTEXT
+
+        messages: list[BaseMessage] = [SystemMessage(content=system_prompt.format(context=context))]
+        messages.extend(kept_history)
+        messages.append(HumanMessage(content=query))
+
+        report = {
+            'system_tokens': system_tokens,
+            'history_tokens': history_tokens,
+            'context_tokens': context_tokens,
+            'query_tokens': query_tokens,
+            'total_tokens': system_tokens + history_tokens + context_tokens + query_tokens,
+            'history_messages_dropped': len(history) - len(kept_history),
+            'documents_packed': len(packed),
+            **stats,
+        }
+        log_info(f'Prompt size: {report}')
+        return messages, [document for document, _ in packed], report
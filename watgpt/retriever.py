@@ -0,0 +1,144 @@
+import re
+
+from langchain_core.documents import Document
+
+from .constants import HYBRID_CANDIDATES_FACTOR, RETRIEVAL_MODE, RETRIEVAL_MODES, RRF_K
+from .db import NumpyVectorDB, SqlDB, VectorDB
+from .db.vector_db import chunk_to_document
+from .utils import log_debug
+
+# Tokens that embeddings match poorly: course/group codes (WCY24IV1N2), paragraph
+# numbers (§ 12), rooms (308/100, sala 124)
+IDENTIFIER_PATTERN = re.compile(
+    r'\b(?=[A-Za-z]*\d)(?=\d*[A-Za-z])[A-Za-z\d]{4,}\b'
+    r'|§\s*\d+'
+    r'|\b\d+/\d+\b'
+    r'|\b(?:sala|sali|pok\.?|pokój|s\.)\s*\d+',
+    re.IGNORECASE,
+)
+
+
+def find_identifiers(query: str) -> list[str]:
+    """Return identifier-like tokens found in the query."""
+    return [match.group() for match in IDENTIFIER_PATTERN.finditer(query)]
+
+
+def contains_identifier(document: Document, identifiers: list[str]) -> bool:
+    """Return True if the document's title or content contains one of the identifiers."""
+    text = f'{document.metadata.get("title", "")} {document.page_content}'.lower()
+    return any(identifier.lower() in text for identifier in identifiers)
+
+
+def reciprocal_rank_fusion(rankings: list[list[Document]], k: int = RRF_K) -> list[Document]:
+    """
+    Fuse ranked document lists by summing 1 / (k + rank) per chunk_id.
+    """
+    scores: dict[int, float] = {}
+    documents: dict[int, Document] = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking, start=1):
+            chunk_id = int(document.metadata['chunk_id'])
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+            documents.setdefault(chunk_id, document)
+    return [
+        documents[chunk_id] for chunk_id in sorted(scores, key=scores.__getitem__, reverse=True)
+    ]
+
+
+class Retriever:
+    def __init__(self, vector_db: VectorDB | NumpyVectorDB, chunk_db: SqlDB):
+        """
+        Retrieves chunks with dense (vector), lexical (SQLite FTS5 / BM25) or hybrid search.
+        """
+        self.vector_db = vector_db
+        self.chunk_db = chunk_db
+
+    def vector_filters(self, filters: dict | None) -> dict:
+        """
+        Vector store filters: page, file and title filters are resolved to chunk_ids through
+        chunk_sources, since the index only holds each chunk's first URLs and title, so
+        copies of a chunk found on the filtered page match too.
+        """
+        filters = dict(filters or {})
+        source_filters = {
+            key: value
+            for key in ('source_url', 'file_url', 'title')
+            if (value := filters.pop(key, None))
+        }
+        if source_filters:
+            filters['chunk_ids'] = self.chunk_db.fetch_chunk_ids_by_source(**source_filters)
+        return filters
+
+    def vector_search(self, query: str, top_k: int = 3, filters: dict | None = None):
+        """Dense similarity search in the vector store."""
+        return self.vector_db.query(query, top_k=top_k, **self.vector_filters(filters))
+
+    def lexical_search(self, query: str, top_k: int = 3, filters: dict | None = None):
+        """BM25 full-text search over chunk titles and contents."""
+        results = self.chunk_db.search_chunks(query, top_k=top_k, **(filters or {}))
+        return [chunk_to_document(chunk) for chunk, _ in results]
+
+    def add_sources(self, documents: list[Document]) -> list[Document]:
+        """
+        Store every page or file a document's chunk was found on (see chunk_sources) in its
+        'sources' metadata, as dicts with title, source_url and file_url, for citing.
+        """
+        chunk_ids = [int(document.metadata['chunk_id']) for document in documents]
+        sources = self.chunk_db.fetch_chunk_sources(chunk_ids)
+        for document, chunk_id in zip(documents, chunk_ids, strict=True):
+            document.metadata['sources'] = [
+                {
+                    'title': source.title or '',
+                    'source_url': source.source_url or '',
+                    'file_url': source.file_url or '',
+                }
+                for source in sources[chunk_id]
+            ]
+        return documents
+
+    def hybrid_search(self, query: str, top_k: int = 3, filters: dict | None = None):
+        """Fuse lexical and vector candidates with reciprocal rank fusion."""
+        num_candidates = top_k * HYBRID_CANDIDATES_FACTOR
+        fused = reciprocal_rank_fusion(
+            [
+                self.lexical_search(query, top_k=num_candidates, filters=filters),
+                self.vector_search(query, top_k=num_candidates, filters=filters),
+            ]
+        )
+        return fused[:top_k]
+
+    def retrieve(
+        self, query: str, top_k: int = 3, filters: dict | None = None, mode: str = RETRIEVAL_MODE
+    ):
+        """
+        Retrieve top-k documents with the given mode.
+
+        'auto' answers identifier-like queries from the lexical index alone (no embedding
+        or vector search) when its best match contains the identifier, and uses hybrid
+        search otherwise.
+
+        :param query: User query string.
+        :param top_k: Number of documents to return.
+        :param filters: Metadata filters (source_url, file_url, title, date_from, date_to).
+        :param mode: One of RETRIEVAL_MODES.
+        :return: List of Document objects (LangChain), with their sources (see add_sources).
+        """
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f'Unknown retrieval mode {mode!r}, expected one of {RETRIEVAL_MODES}')
+
+        if mode == 'auto':
+            identifiers = find_identifiers(query)
+            if identifiers:
+                results = self.lexical_search(query, top_k=top_k, filters=filters)
+                if results and contains_identifier(results[0], identifiers):
+                    log_debug('Query with identifiers %s answered from FTS index.', identifiers)
+                    return self.add_sources(results)
+            mode = 'hybrid'
+
+        if mode == 'lexical':
+            results = self.lexical_search(query, top_k=top_k, filters=filters)
+        elif mode == 'hybrid':
+            results = self.hybrid_search(query, top_k=top_k, filters=filters)
+        else:
+            results = self.vector_search(query, top_k=top_k, filters=filters)
+        return self.add_sources(results)
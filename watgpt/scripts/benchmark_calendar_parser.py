@@ -0,0 +1,125 @@
+"""Benchmark the calendar PDF parser with different numbers of worker processes.
+
+Parses the bundled calendar PDF (CALENDAR_PDF_FP, skipped if missing) and a synthetic calendar
+of --synthetic_pages pages. For each worker count the report lists the best time over
+--repeats runs, pages/sec and whether the rows match the single-process result. Worker counts
+are capped at the number of CPUs.
+
+```bash
+python -m watgpt.scripts.benchmark_calendar_parser --synthetic_pages 1000 --workers 1 2 4
+```
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import fitz
+
+from ..constants import CALENDAR_PAGES_PER_WORKER, CALENDAR_PDF_FP
+from ..utils import log_info, log_warning
+from ..watscraper.watscraper.read_calendar_pdf import extract_header_and_rows
+
+ROWS_PER_PAGE = 40
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark the calendar PDF parser.')
+    parser.add_argument('--pdf', type=Path, default=CALENDAR_PDF_FP, help='Calendar PDF.')
+    parser.add_argument('--synthetic_pages', type=int, default=1000, help='Synthetic PDF pages.')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument(
+        '--pages_per_worker',
+        type=int,
+        default=CALENDAR_PAGES_PER_WORKER,
+        help='Minimum pages per worker process.',
+    )
+    parser.add_argument('--repeats', type=int, default=3, help='Runs per worker count.')
+    parser.add_argument('--output', type=Path, default=None, help='Optional JSON report path.')
+    return parser.parse_args()
+
+
+def write_synthetic_calendar(path: Path, num_pages: int):
+    """Write a calendar-like PDF: a large title, numbered events with date ranges."""
+    doc = fitz.open()
+    event = 0
+    for page_number in range(num_pages):
+        page = doc.new_page()
+        y = 60
+        if page_number == 0:
+            page.insert_text((50, y), 'Organizacja zajęć w roku akademickim', fontsize=14)
+            y += 30
+        for row in range(ROWS_PER_PAGE):
+            if row % 5 == 4:
+                # A continuation line starting with a lowercase letter
+                page.insert_text((50, y), 'oraz zajęcia dodatkowe', fontsize=9)
+            else:
+                event += 1
+                day = event % 28 + 1
+                page.insert_text((50, y), f'Wydarzenie {event}', fontsize=9)
+                page.insert_text((150, y), f'{day:02d}.10.2024 r.', fontsize=9)
+                page.insert_text((300, y), f'{day:02d}.11.2024 r.', fontsize=9)
+            y += 18
+    doc.save(str(path))
+    doc.close()
+
+
+def benchmark_pdf(pdf_path: Path, workers: list[int], pages_per_worker: int, repeats: int) -> dict:
+    with fitz.open(pdf_path) as doc:
+        num_pages = doc.page_count
+    report: dict = {'pdf': str(pdf_path), 'pages': num_pages}
+    reference = None
+    for num_workers in workers:
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = extract_header_and_rows(pdf_path, num_workers, pages_per_worker)
+            timings.append(time.perf_counter() - start)
+        reference = reference or result
+        best = min(timings)
+        report[f'workers_{num_workers}'] = {
+            'seconds': best,
+            'pages_per_sec': num_pages / best if best else 0.0,
+            'rows': len(result[1]),
+            'same_rows_as_first': result == reference,
+        }
+        log_info(f'{pdf_path.name}, {num_workers} workers: {report[f"workers_{num_workers}"]}')
+    return report
+
+
+def main(
+    pdf: Path,
+    synthetic_pages: int,
+    workers: list[int],
+    pages_per_worker: int,
+    repeats: int,
+    output: Path | None,
+):
+    report = {}
+    if pdf.exists():
+        report['bundled'] = benchmark_pdf(pdf, workers, pages_per_worker, repeats)
+    else:
+        log_warning(f'{pdf} not found, benchmarking the synthetic calendar only.')
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        synthetic = Path(tmp_dir) / 'synthetic_calendar.pdf'
+        write_synthetic_calendar(synthetic, synthetic_pages)
+        report['synthetic'] = benchmark_pdf(synthetic, workers, pages_per_worker, repeats)
+
+    if output:
+        output.write_text(json.dumps(report, indent=2), encoding='utf-8')
+        log_info(f'Report written to {output}')
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    main(
+        args.pdf,
+        args.synthetic_pages,
+        args.workers,
+        args.pages_per_worker,
+        args.repeats,
+        args.output,
+    )
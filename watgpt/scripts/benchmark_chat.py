@@ -0,0 +1,325 @@
+"""Benchmark LLMEngine end to end on fixture databases with the offline fake chat model.
+
+Builds a fixture chunks.db (documents, group timetables and academic calendar events) and
+vector index in a temporary directory, then answers timetable, calendar and RAG questions
+with LLMEngine and FakeChatModel (see fake_llm.py), so no API key or network is needed. With
+--fake_embeddings, deterministic hash embeddings replace the embedding model as well.
+
+The report lists, per route the engine took (timetable, calendar, calendar_context, rag) and
+overall, the latency percentiles, queries/sec and the latency of every stage (query
+extraction, timetable and calendar lookup, retrieval, prompt building, generation), together
+with the configuration and git commit, so reports of two commits can be compared.
+
+```bash
+python -m watgpt.scripts.benchmark_chat --fake_embeddings --token_latency 0 --output chat.json
+python -m watgpt.scripts.benchmark_chat --backend chroma --streaming --num_queries 50
+```
+"""
+
+import argparse
+import json
+import random
+import subprocess
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from pathlib import Path
+
+from ..constants import (
+    DEFAULT_BLOCK_HOURS,
+    EMBEDDINGS_MODEL_NAME,
+    FAKE_LLM_FIRST_TOKEN_LATENCY,
+    FAKE_LLM_RESPONSE_TOKENS,
+    FAKE_LLM_TOKEN_LATENCY,
+    PROJECT_ROOT,
+    VECTOR_DB_BACKENDS,
+)
+from ..db.sql_db import SqlDB
+from ..utils import log_info, summarize_latencies
+from .create_vector_db import build_vector_db
+
+WORDS = (
+    'zajęcia semestr student wydział egzamin ocena przedmiot godzina sala termin rok '
+    'studia plan grupa wykład ćwiczenia laboratorium projekt regulamin dziekan stypendium '
+    'legitymacja praktyki dyplom promotor zaliczenie punkty ECTS opłata akademik biblioteka'
+).split()
+TOPICS = (
+    'Regulamin studiów',
+    'Stypendia socjalne',
+    'Praktyki studenckie',
+    'Biblioteka wydziału',
+    'Opłaty za studia',
+    'Praca dyplomowa',
+    'Akademik',
+    'Legitymacja studencka',
+)
+CALENDAR_EVENTS = (
+    ('Inauguracja roku akademickiego', date(2024, 10, 1), date(2024, 10, 1)),
+    ('Zimowa przerwa świąteczna', date(2024, 12, 23), date(2025, 1, 6)),
+    ('Zimowa sesja egzaminacyjna', date(2025, 1, 27), date(2025, 2, 9)),
+    ('Przerwa semestralna', date(2025, 2, 10), date(2025, 2, 23)),
+    ('Wiosenna przerwa świąteczna', date(2025, 4, 17), date(2025, 4, 22)),
+    ('Letnia sesja egzaminacyjna', date(2025, 6, 16), date(2025, 6, 29)),
+    ('Wakacje letnie', date(2025, 7, 1), date(2025, 9, 30)),
+    ('Dzień rektorski', date(2025, 5, 2), date(2025, 5, 2)),
+)
+COURSES = ('MATAN', 'FIZYKA', 'PROGRAM', 'SIECI', 'BAZY', 'ALGORYT', 'ANGIELSKI')
+# Calendar questions about a whole period match several events, which become the RAG context
+CALENDAR_QUESTIONS = (
+    'Kiedy jest {event}?',
+    'W jakim terminie jest {event}?',
+    'Kiedy są przerwy świąteczne w kalendarzu?',
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark LLMEngine with the fake chat model.')
+    parser.add_argument('--num_queries', type=int, default=30, help='Queries per query set.')
+    parser.add_argument('--num_documents', type=int, default=200, help='Fixture documents.')
+    parser.add_argument('--chunks_per_document', type=int, default=5)
+    parser.add_argument('--num_groups', type=int, default=20, help='Fixture student groups.')
+    parser.add_argument('--days', type=int, default=30, help='Days of fixture timetables.')
+    parser.add_argument('--backend', type=str, choices=VECTOR_DB_BACKENDS, default='numpy')
+    parser.add_argument(
+        '--fake_embeddings',
+        action='store_true',
+        help='Use deterministic hash embeddings instead of the embedding model.',
+    )
+    parser.add_argument('--first_token_latency', type=float, default=FAKE_LLM_FIRST_TOKEN_LATENCY)
+    parser.add_argument('--token_latency', type=float, default=FAKE_LLM_TOKEN_LATENCY)
+    parser.add_argument('--response_tokens', type=int, default=FAKE_LLM_RESPONSE_TOKENS)
+    parser.add_argument('--streaming', action='store_true', help='Stream the fake answers.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for fixtures and queries.')
+    parser.add_argument('--output', type=Path, default=None, help='Optional JSON report path.')
+    return parser.parse_args()
+
+
+def sentence(rng: random.Random) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))) + '.'
+
+
+def group_codes(num_groups: int) -> list[str]:
+    return [f'WCY24IX{group // 10 + 1}S{group % 10}' for group in range(num_groups)]
+
+
+def fill_fixture_database(
+    sql_db: SqlDB,
+    num_documents: int,
+    chunks_per_document: int,
+    num_groups: int,
+    days: int,
+    rng: random.Random,
+) -> dict:
+    """
+    Write fixture documents, timetables and calendar events.
+
+    :return: Numbers of fixture rows by kind.
+    """
+    sql_db.fill_block_hours()
+    documents = []
+    for number in range(num_documents):
+        topic = TOPICS[number % len(TOPICS)]
+        documents.append(
+            {
+                'source_url': f'https://www.wcy.wat.edu.pl/fixture/{number}',
+                'file_url': None,
+                'title': f'{topic} {number}',
+                'chunks': [
+                    f'{topic}. ' + ' '.join(sentence(rng) for _ in range(6))
+                    for _ in range(chunks_per_document)
+                ],
+            }
+        )
+    first_day = date(2025, 3, 3)
+    lessons = [
+        {
+            'group_code': group_code,
+            'course_code': rng.choice(COURSES),
+            'teacher_name': f'dr Prowadzący {rng.randint(1, 40)}',
+            'lesson_date': (first_day + timedelta(days=day)).isoformat(),
+            'block_id': block_id,
+            'room': str(rng.randint(100, 320)),
+            'building': str(rng.randint(60, 100)),
+            'info': None,
+        }
+        for group_code in group_codes(num_groups)
+        for day in range(days)
+        for block_id, _, _ in DEFAULT_BLOCK_HOURS[:4]
+    ]
+    events = [
+        {'event': event, 'start_date': start, 'end_date': end, 'page': 1}
+        for event, start, end in CALENDAR_EVENTS
+    ]
+    sql_db.write_batch(
+        documents=documents,
+        lessons=lessons,
+        calendars=[{'source': 'kalendarz.pdf', 'events': events}],
+    )
+    return {
+        'documents': num_documents,
+        'chunks': num_documents * chunks_per_document,
+        'lessons': len(lessons),
+        'calendar_events': len(events),
+    }
+
+
+def build_queries(sql_db: SqlDB, num_queries: int, num_groups: int, days: int, rng):
+    """Timetable, calendar and RAG (passage) questions, num_queries of each, shuffled."""
+    first_day = date(2025, 3, 3)
+    groups = group_codes(num_groups)
+    timetable = [
+        f'Jakie zajęcia ma grupa {rng.choice(groups)} w dniu '
+        f'{first_day + timedelta(days=rng.randrange(days))}?'
+        for _ in range(num_queries)
+    ]
+    calendar = [
+        rng.choice(CALENDAR_QUESTIONS).format(event=rng.choice(CALENDAR_EVENTS)[0].lower())
+        for _ in range(num_queries)
+    ]
+    rag = []
+    chunks = sql_db.fetch_all_chunks()
+    for chunk in rng.sample(chunks, min(num_queries, len(chunks))):
+        words = chunk.content.split()
+        start = rng.randrange(0, max(1, len(words) - 8))
+        rag.append(f'Co mówią dokumenty o: {" ".join(words[start : start + 8])}?')
+    queries = timetable + calendar + rag
+    rng.shuffle(queries)
+    return queries
+
+
+def open_fixture_vector_db(backend: str, directory: Path, fake_embeddings: bool):
+    # pylint: disable=import-outside-toplevel
+    from ..db.numpy_vector_db import NumpyVectorDB
+    from ..db.vector_db import VectorDB
+
+    embedding_function = None
+    if fake_embeddings:
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+
+        embedding_function = DeterministicFakeEmbedding(size=384)
+    if backend == 'numpy':
+        return NumpyVectorDB(
+            db_dir=str(directory / 'numpy_vectors'),
+            embeddings_model_name=EMBEDDINGS_MODEL_NAME,
+            embedding_function=embedding_function,
+        )
+    return VectorDB(
+        db_file=str(directory / 'vectors.db'),
+        embeddings_model_name=EMBEDDINGS_MODEL_NAME,
+        embedding_function=embedding_function,
+    )
+
+
+def git_commit() -> str | None:
+    process = subprocess.run(
+        ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, cwd=PROJECT_ROOT, check=False
+    )
+    return process.stdout.strip() or None
+
+
+def summarize_runs(runs: list[dict]) -> dict:
+    """Latency percentiles, queries/sec and per-stage latency of a list of chat() runs."""
+    latencies = [run['seconds'] for run in runs]
+    stages = defaultdict(list)
+    for run in runs:
+        for stage, seconds in run['stages'].items():
+            stages[stage].append(seconds)
+    total = sum(latencies)
+    return {
+        'latency': summarize_latencies(latencies),
+        'queries_per_sec': len(runs) / total if total else 0.0,
+        'stages': {stage: summarize_latencies(values) for stage, values in stages.items()},
+    }
+
+
+def main(
+    num_queries: int,
+    num_documents: int,
+    chunks_per_document: int,
+    num_groups: int,
+    days: int,
+    backend: str,
+    fake_embeddings: bool,
+    fake_llm: dict,
+    seed: int,
+    output: Path | None,
+):
+    from ..llm_engine import LLMEngine  # pylint: disable=import-outside-toplevel
+
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        directory = Path(tmp_dir)
+        sql_db = SqlDB(str(directory / 'chunks.db'))
+        fixture = fill_fixture_database(
+            sql_db, num_documents, chunks_per_document, num_groups, days, rng
+        )
+        vector_db = open_fixture_vector_db(backend, directory, fake_embeddings)
+        build_vector_db(sql_db, vector_db, near_duplicate_threshold=None)
+        log_info(f'Fixture databases: {fixture}')
+
+        engine = LLMEngine(provider='fake', vector_db=vector_db, chunk_db=sql_db)
+        for name, value in fake_llm.items():
+            setattr(engine.llm, name, value)
+        queries = build_queries(sql_db, num_queries, num_groups, days, rng)
+
+        # Warm up the embedding model, tokenizer, date parser and database connections
+        engine.chat('Co mówi regulamin studiów?')
+        engine.chat(f'Jakie zajęcia ma grupa {group_codes(1)[0]} w dniu 2025-03-03?')
+
+        runs_by_route: dict[str, list[dict]] = defaultdict(list)
+        for query in queries:
+            # Every query starts a new conversation, so prompts do not grow with the run
+            engine.memory.clear()
+            start = time.perf_counter()
+            engine.chat(query)
+            seconds = time.perf_counter() - start
+            runs_by_route[engine.last_route].append(
+                {'seconds': seconds, 'stages': dict(engine.last_timings)}
+            )
+        engine.chunk_db.engine.dispose()
+
+    report: dict = {
+        'commit': git_commit(),
+        'config': {
+            'backend': backend,
+            'fake_embeddings': fake_embeddings,
+            'fake_llm': fake_llm,
+            'seed': seed,
+            'fixture': fixture,
+        },
+        'routes': {route: summarize_runs(runs) for route, runs in sorted(runs_by_route.items())},
+        'overall': summarize_runs([run for runs in runs_by_route.values() for run in runs]),
+    }
+    for route, summary in report['routes'].items():
+        latency = summary['latency']
+        log_info(
+            f'{route}: {latency["count"]} queries, p50 {latency["p50_ms"]:.1f} ms, '
+            f'p95 {latency["p95_ms"]:.1f} ms, p99 {latency["p99_ms"]:.1f} ms, '
+            f'{summary["queries_per_sec"]:.1f} queries/s'
+        )
+
+    if output:
+        output.write_text(json.dumps(report, indent=2), encoding='utf-8')
+        log_info(f'Report written to {output}')
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    main(
+        args.num_queries,
+        args.num_documents,
+        args.chunks_per_document,
+        args.num_groups,
+        args.days,
+        args.backend,
+        args.fake_embeddings,
+        {
+            'first_token_latency': args.first_token_latency,
+            'token_latency': args.token_latency,
+            'response_tokens': args.response_tokens,
+            'streaming': args.streaming,
+        },
+        args.seed,
+        args.output,
+    )
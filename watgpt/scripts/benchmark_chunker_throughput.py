@@ -0,0 +1,124 @@
+"""Micro-benchmark of TextChunker throughput in documents per second.
+
+Documents are rebuilt from chunks.db (see benchmark_chunking_quality) and chunked three ways:
+- per_item: a new TextChunker per document, as the pipelines did before the shared chunker,
+- shared: the process-wide chunker, one document at a time,
+- batch: the process-wide chunker, --batch_size documents per tokenizer call.
+
+All three use the chunk sizes of the pipelines (CHUNK_MAX_TOKENS for the sentence strategy)
+and must produce the same chunks, otherwise their throughput is not comparable.
+
+```bash
+python -m watgpt.scripts.benchmark_chunker_throughput --strategy token --max_documents 500
+```
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+from ..constants import (
+    CHUNK_MAX_TOKENS,
+    CHUNK_OVERLAP_TOKENS,
+    CHUNK_TOKENIZER_MODEL,
+    CHUNKING_STRATEGIES,
+    CHUNKING_STRATEGY,
+)
+from ..db.sql_db import SqlDB
+from ..utils import log_info
+from ..watscraper.watscraper.text_chunker import (
+    TextChunker,
+    chunk_document,
+    chunk_documents,
+    get_text_chunker,
+)
+from .benchmark_chunking_quality import rebuild_documents
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark TextChunker throughput.')
+    parser.add_argument(
+        '--strategy', type=str, choices=CHUNKING_STRATEGIES, default=CHUNKING_STRATEGY
+    )
+    parser.add_argument('--max_documents', type=int, default=500, help='Documents to chunk.')
+    parser.add_argument('--batch_size', type=int, default=64, help='Documents per batch call.')
+    parser.add_argument(
+        '--per_item_documents',
+        type=int,
+        default=20,
+        help='Documents for the per_item run, which reloads the tokenizer every time.',
+    )
+    parser.add_argument('--output', type=Path, default=None, help='Optional JSON report path.')
+    return parser.parse_args()
+
+
+def timed(fn, documents: list[str]) -> dict:
+    start = time.perf_counter()
+    num_chunks = fn(documents)
+    elapsed = time.perf_counter() - start
+    return {
+        'documents': len(documents),
+        'chunks': num_chunks,
+        'seconds': elapsed,
+        'documents_per_sec': len(documents) / elapsed if elapsed else 0.0,
+    }
+
+
+def main(
+    strategy: str,
+    max_documents: int,
+    batch_size: int,
+    per_item_documents: int,
+    output: Path | None,
+):
+    documents = rebuild_documents(SqlDB())[:max_documents]
+    log_info(f'Chunking {len(documents)} documents with the {strategy!r} strategy.')
+    tokenizer_model = CHUNK_TOKENIZER_MODEL if strategy == 'sentence' else 'gpt2'
+
+    def chunk_per_item(document: str) -> list[str]:
+        chunker = TextChunker(tokenizer_model=tokenizer_model)
+        if strategy == 'sentence':
+            return chunker.chunk_text_sentence_based(document, max_tokens=CHUNK_MAX_TOKENS)
+        return chunker.chunk_text_token_based(
+            document, max_tokens=1024, overlap_tokens=CHUNK_OVERLAP_TOKENS
+        )
+
+    def per_item(docs):
+        return sum(len(chunk_per_item(document)) for document in docs)
+
+    def shared(docs):
+        return sum(len(chunk_document(document, strategy=strategy)) for document in docs)
+
+    def batch(docs):
+        return sum(
+            len(chunks)
+            for start in range(0, len(docs), batch_size)
+            for chunks in chunk_documents(docs[start : start + batch_size], strategy=strategy)
+        )
+
+    # Load the shared tokenizer outside the timed runs
+    get_text_chunker(tokenizer_model)
+    # The runs only measure the same work if they produce the same chunks
+    per_item_docs = documents[:per_item_documents]
+    if [chunk_per_item(document) for document in per_item_docs] != chunk_documents(
+        per_item_docs, strategy=strategy
+    ):
+        raise RuntimeError('The per_item and batch chunkers produce different chunks.')
+
+    report: dict = {'strategy': strategy, 'batch_size': batch_size}
+    report['per_item'] = timed(per_item, per_item_docs)
+    report['shared'] = timed(shared, documents)
+    report['batch'] = timed(batch, documents)
+    if report['shared']['chunks'] != report['batch']['chunks']:
+        raise RuntimeError('The shared and batch chunkers produce different chunks.')
+    log_info(f'Chunker throughput: {json.dumps(report, indent=2)}')
+
+    if output:
+        output.write_text(json.dumps(report, indent=2), encoding='utf-8')
+        log_info(f'Report written to {output}')
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    main(args.strategy, args.max_documents, args.batch_size, args.per_item_documents, args.output)
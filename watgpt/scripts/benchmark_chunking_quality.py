@@ -0,0 +1,119 @@
+"""Compare chunking strategies on chunk counts, index size and retrieval hit rate.
+
+Documents are rebuilt from the chunks stored in chunks.db (chunks of the same page or file
+joined with the chunker overlap removed) and re-chunked with every strategy from
+CHUNKING_STRATEGIES. For each strategy the report lists:
+- the number of chunks and the index size (float16 embeddings plus chunk text),
+- the share of tokens beyond the embedding model's sequence limit, which the index never sees,
+- the hit rate of sentence queries: a hit is a top-k chunk from the sentence's document.
+
+```bash
+python -m watgpt.scripts.benchmark_chunking_quality --num_queries 200 --output chunking_bench.json
+```
+"""
+
+import argparse
+import json
+import random
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+from langchain_huggingface import HuggingFaceEmbeddings
+
+from ..constants import CHUNKING_STRATEGIES, EMBEDDINGS_MODEL_NAME
+from ..db.numpy_vector_db import normalize_rows
+from ..db.sql_db import SqlDB
+from ..prompt_builder import overlap_length
+from ..utils import log_info
+from ..watscraper.watscraper.text_chunker import TextChunker, chunk_document, split_into_sentences
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Compare chunking strategies.')
+    parser.add_argument('--num_queries', type=int, default=200, help='Number of queries.')
+    parser.add_argument('--top_k', type=int, default=3, help='Number of results per query.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for sampling queries.')
+    parser.add_argument('--output', type=Path, default=None, help='Optional JSON report path.')
+    return parser.parse_args()
+
+
+def rebuild_documents(sql_db: SqlDB) -> list[str]:
+    """Join the stored chunks of each page or file back into one text, dropping overlaps."""
+    grouped = defaultdict(list)
+    for chunk in sql_db.fetch_all_chunks():
+        grouped[(chunk.source_url, chunk.file_url, chunk.title)].append(chunk)
+
+    documents = []
+    for chunks in grouped.values():
+        text = ''
+        for chunk in sorted(chunks, key=lambda c: c.chunk_id):
+            text += chunk.content[overlap_length(text, chunk.content) :]
+        if text.strip():
+            documents.append(text)
+    return documents
+
+
+def main(num_queries: int, top_k: int, seed: int, output: Path | None):
+    documents = rebuild_documents(SqlDB())
+    rng = random.Random(seed)
+    candidates = [
+        (doc_id, sentence)
+        for doc_id, document in enumerate(documents)
+        for sentence in split_into_sentences(document)
+        if len(sentence.split()) >= 6
+    ]
+    queries = rng.sample(candidates, min(num_queries, len(candidates)))
+    log_info(f'{len(documents)} documents, {len(queries)} sentence queries.')
+
+    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDINGS_MODEL_NAME)
+    embedding_tokenizer = TextChunker(tokenizer_model=EMBEDDINGS_MODEL_NAME)
+    sequence_limit = embedding_tokenizer.max_sequence_tokens
+    query_vectors = normalize_rows(
+        np.asarray(embeddings.embed_documents([sentence for _, sentence in queries]), np.float32)
+    )
+
+    report: dict = {'num_documents': len(documents), 'num_queries': len(queries), 'top_k': top_k}
+    for strategy in CHUNKING_STRATEGIES:
+        chunk_texts: list[str] = []
+        chunk_docs: list[int] = []
+        for doc_id, document in enumerate(documents):
+            for chunk in chunk_document(document, strategy=strategy):
+                if chunk.strip():
+                    chunk_texts.append(chunk)
+                    chunk_docs.append(doc_id)
+
+        token_counts = [
+            len(ids)
+            for ids in embedding_tokenizer.tokenizer(chunk_texts, add_special_tokens=True)[
+                'input_ids'
+            ]
+        ]
+        unseen_tokens = sum(max(0, count - sequence_limit) for count in token_counts)
+
+        chunk_vectors = normalize_rows(
+            np.asarray(embeddings.embed_documents(chunk_texts), np.float32)
+        ).astype(np.float16)
+        top = np.argsort(-(query_vectors @ chunk_vectors.astype(np.float32).T), axis=1)[:, :top_k]
+        hits = sum(
+            doc_id in {chunk_docs[i] for i in row}
+            for (doc_id, _), row in zip(queries, top, strict=True)
+        )
+
+        report[strategy] = {
+            'num_chunks': len(chunk_texts),
+            'mean_chunk_tokens': sum(token_counts) / len(token_counts) if token_counts else 0,
+            'unseen_token_share': unseen_tokens / sum(token_counts) if token_counts else 0,
+            'index_bytes': chunk_vectors.nbytes + sum(len(t.encode()) for t in chunk_texts),
+            f'hit_rate_at_{top_k}': hits / len(queries) if queries else 0.0,
+        }
+        log_info(f'{strategy}: {json.dumps(report[strategy], indent=2)}')
+
+    if output:
+        output.write_text(json.dumps(report, indent=2), encoding='utf-8')
+        log_info(f'Report written to {output}')
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    main(args.num_queries, args.top_k, args.seed, args.output)
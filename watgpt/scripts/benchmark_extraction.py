@@ -0,0 +1,233 @@
+"""Benchmark file extraction throughput and peak memory per format.
+
+Runs the extractor registry over a corpus of files: a directory of downloaded files, or a
+fixture corpus generated locally (text, CSV, RTF, docx, xlsx, pptx, odt, ods, zip and tar.gz
+files). For each format the report lists files, MB and characters extracted, files/s, MB/s
+and the peak memory allocated while extracting one file (traced in a second pass).
+
+```bash
+python -m watgpt.scripts.benchmark_extraction --num_files 20 --rows 5000 --output extract.json
+python -m watgpt.scripts.benchmark_extraction --corpus wat_data/files
+```
+"""
+
+import argparse
+import io
+import json
+import random
+import tarfile
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from collections import defaultdict
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from ..utils import log_info
+from ..watscraper.watscraper.extract import extract_text_from_file
+
+WORDS = (
+    'zajęcia semestr student wydział egzamin ocena przedmiot godzina sala termin rok '
+    'studia plan grupa wykład ćwiczenia laboratorium projekt regulamin dziekan'
+).split()
+OOXML_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types"/>'
+)
+W_NS = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+S_NS = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+A_NS = 'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main"'
+R_NS = 'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+ODF_NS = (
+    'xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+    'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0" '
+    'xmlns:table="urn:oasis:names:tc:opendocument:xmlns:table:1.0"'
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark file extraction.')
+    parser.add_argument('--corpus', type=Path, default=None, help='Directory of files.')
+    parser.add_argument('--num_files', type=int, default=10, help='Fixture files per format.')
+    parser.add_argument('--rows', type=int, default=2000, help='Paragraphs/rows per fixture.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for fixture text.')
+    parser.add_argument('--output', type=Path, default=None, help='Optional JSON report path.')
+    return parser.parse_args()
+
+
+def sentence(rng: random.Random) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(6, 16))) + '.'
+
+
+def docx_bytes(paragraphs: list[str]) -> bytes:
+    body = ''.join(f'<w:p><w:r><w:t>{escape(p)}</w:t></w:r></w:p>' for p in paragraphs)
+    return zip_bytes(
+        {
+            '[Content_Types].xml': OOXML_CONTENT_TYPES,
+            'word/document.xml': f'<w:document {W_NS}><w:body>{body}</w:body></w:document>',
+        }
+    )
+
+
+def xlsx_bytes(rows: list[list[str]]) -> bytes:
+    strings = sorted({cell for row in rows for cell in row})
+    index = {cell: i for i, cell in enumerate(strings)}
+    sheet_rows = ''.join(
+        '<row>' + ''.join(f'<c t="s"><v>{index[cell]}</v></c>' for cell in row) + '</row>'
+        for row in rows
+    )
+    return zip_bytes(
+        {
+            '[Content_Types].xml': OOXML_CONTENT_TYPES,
+            'xl/workbook.xml': (
+                f'<workbook {S_NS} {R_NS}><sheets>'
+                '<sheet name="Arkusz1" sheetId="1" r:id="rId1"/></sheets></workbook>'
+            ),
+            'xl/_rels/workbook.xml.rels': (
+                '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/'
+                'relationships"><Relationship Id="rId1" Target="worksheets/sheet1.xml"/>'
+                '</Relationships>'
+            ),
+            'xl/sharedStrings.xml': f'<sst {S_NS}>'
+            + ''.join(f'<si><t>{escape(s)}</t></si>' for s in strings)
+            + '</sst>',
+            'xl/worksheets/sheet1.xml': f'<worksheet {S_NS}><sheetData>{sheet_rows}'
+            '</sheetData></worksheet>',
+        }
+    )
+
+
+def pptx_bytes(paragraphs: list[str], per_slide: int = 10) -> bytes:
+    parts = {
+        '[Content_Types].xml': OOXML_CONTENT_TYPES,
+        'ppt/presentation.xml': '<presentation/>',
+    }
+    for number, start in enumerate(range(0, len(paragraphs), per_slide), start=1):
+        text = ''.join(
+            f'<a:p><a:r><a:t>{escape(p)}</a:t></a:r></a:p>'
+            for p in paragraphs[start : start + per_slide]
+        )
+        parts[f'ppt/slides/slide{number}.xml'] = f'<sld {A_NS}>{text}</sld>'
+    return zip_bytes(parts)
+
+
+def odf_bytes(mime_type: str, body: str) -> bytes:
+    content = f'<office:document-content {ODF_NS}><office:body>{body}</office:body>'
+    return zip_bytes({'mimetype': mime_type, 'content.xml': content + '</office:document-content>'})
+
+
+def rtf_bytes(paragraphs: list[str]) -> bytes:
+    body = ''.join(
+        ''.join(ch if ord(ch) < 128 else f'\\u{ord(ch)}?' for ch in p) + '\\par\n'
+        for p in paragraphs
+    )
+    return ('{\\rtf1\\ansi\\ansicpg1250{\\fonttbl{\\f0 Arial;}}\\f0 ' + body + '}').encode('ascii')
+
+
+def zip_bytes(members: dict[str, str | bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def tar_gz_bytes(members: dict[str, bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def generate_fixture_corpus(directory: Path, num_files: int, rows: int, seed: int):
+    """Write num_files files of every fixture format into directory."""
+    rng = random.Random(seed)
+    for i in range(num_files):
+        paragraphs = [sentence(rng) for _ in range(rows)]
+        table = [[sentence(rng) for _ in range(4)] for _ in range(rows)]
+        csv_text = '\n'.join(';'.join(row) for row in table)
+        files = {
+            'txt': '\n'.join(paragraphs).encode('utf-8'),
+            'csv': csv_text.encode('utf-8'),
+            'rtf': rtf_bytes(paragraphs),
+            'docx': docx_bytes(paragraphs),
+            'xlsx': xlsx_bytes(table),
+            'pptx': pptx_bytes(paragraphs),
+            'odt': odf_bytes(
+                'application/vnd.oasis.opendocument.text',
+                '<office:text>'
+                + ''.join(f'<text:p>{escape(p)}</text:p>' for p in paragraphs)
+                + '</office:text>',
+            ),
+            'ods': odf_bytes(
+                'application/vnd.oasis.opendocument.spreadsheet',
+                '<office:spreadsheet><table:table table:name="Arkusz1">'
+                + ''.join(
+                    '<table:table-row>'
+                    + ''.join(
+                        f'<table:table-cell><text:p>{escape(c)}</text:p></table:table-cell>'
+                        for c in row
+                    )
+                    + '</table:table-row>'
+                    for row in table
+                )
+                + '</table:table></office:spreadsheet>',
+            ),
+        }
+        files['zip'] = zip_bytes({'dokument.docx': files['docx'], 'dane.csv': files['csv']})
+        files['gz'] = tar_gz_bytes({'opis.txt': files['txt'], 'arkusz.xlsx': files['xlsx']})
+        for extension, data in files.items():
+            name = f'fixture_{i}.tar.gz' if extension == 'gz' else f'fixture_{i}.{extension}'
+            (directory / name).write_bytes(data)
+
+
+def main(corpus: Path | None, num_files: int, rows: int, seed: int, output: Path | None):
+    with tempfile.TemporaryDirectory() as fixture_dir:
+        if corpus is None:
+            corpus = Path(fixture_dir)
+            generate_fixture_corpus(corpus, num_files, rows, seed)
+        files = sorted(path for path in corpus.rglob('*') if path.is_file())
+        log_info(f'Extracting {len(files)} files from {corpus}.')
+
+        stats: dict = defaultdict(lambda: defaultdict(float))
+        for path in files:
+            start = time.perf_counter()
+            text = extract_text_from_file(str(path))
+            elapsed = time.perf_counter() - start
+            fmt = stats[path.suffix.lower().lstrip('.') or 'none']
+            fmt['files'] += 1
+            fmt['mb'] += path.stat().st_size / 1e6
+            fmt['chars'] += len(text)
+            fmt['seconds'] += elapsed
+            fmt['empty_files'] += int(not text)
+
+        # Tracing allocations slows extraction down, so memory is measured in a second pass
+        tracemalloc.start()
+        for path in files:
+            tracemalloc.reset_peak()
+            extract_text_from_file(str(path))
+            fmt = stats[path.suffix.lower().lstrip('.') or 'none']
+            fmt['peak_mb'] = max(fmt['peak_mb'], tracemalloc.get_traced_memory()[1] / 1e6)
+        tracemalloc.stop()
+
+    report: dict = {'num_files': len(files), 'formats': {}}
+    for extension, fmt in sorted(stats.items()):
+        report['formats'][extension] = {
+            **fmt,
+            'files_per_sec': fmt['files'] / fmt['seconds'] if fmt['seconds'] else 0.0,
+            'mb_per_sec': fmt['mb'] / fmt['seconds'] if fmt['seconds'] else 0.0,
+        }
+        log_info(f'{extension}: {json.dumps(report["formats"][extension], indent=2)}')
+
+    if output:
+        output.write_text(json.dumps(report, indent=2), encoding='utf-8')
+        log_info(f'Report written to {output}')
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    main(args.corpus, args.num_files, args.rows, args.seed, args.output)
@@ -0,0 +1,228 @@
+"""Benchmark the import time of the entry points and check it for regressions.
+
+Imports each entry point in a fresh interpreter with `python -X importtime` --repeats times and
+reports the median cumulative import time of the module, the median wall-clock time of the
+interpreter (startup included) and the modules that took the longest themselves. The api entry
+point imports watgpt.api, which also creates the LLMEngine, so it measures the API cold start;
+it runs with the offline fake chat model (LLM_PROVIDER=fake), so no Groq key is needed.
+
+An entry point regresses when it loads one of its forbidden heavy modules (torch, transformers,
+Chroma, ...), which must only be imported on first use, or when its import time exceeds the
+--baseline report's by more than --tolerance. The script exits with status 1 on a regression,
+so it can run as a check in CI:
+
+```bash
+python -m watgpt.scripts.benchmark_imports --output imports.json
+python -m watgpt.scripts.benchmark_imports --baseline imports.json --tolerance 0.25
+```
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from ..constants import PROJECT_ROOT
+from ..utils import log_error, log_info, log_warning
+
+WATSCRAPER_DIR = PROJECT_ROOT / 'watgpt' / 'watscraper'
+# Modules that load model weights, native backends or the vector store
+HEAVY_MODULES = (
+    'torch',
+    'transformers',
+    'sentence_transformers',
+    'chromadb',
+    'langchain_chroma',
+    'langchain_huggingface',
+)
+# Entry point name -> (imported module, heavy modules it must not load)
+ENTRY_POINTS = {
+    'create_sql_db': ('watgpt.scripts.create_sql_db', HEAVY_MODULES),
+    'scrape': ('watgpt.scripts.scrape', HEAVY_MODULES),
+    'scraper_pipelines': ('watscraper.pipelines', HEAVY_MODULES),
+    'query_vector_db': ('watgpt.scripts.query_vector_db', HEAVY_MODULES),
+    'create_vector_db': ('watgpt.scripts.create_vector_db', HEAVY_MODULES),
+    'ingest': ('watgpt.scripts.ingest', HEAVY_MODULES),
+    'llm_rag_chat': ('watgpt.scripts.llm_rag_chat', HEAVY_MODULES),
+    'api': ('watgpt.api', ()),
+}
+# Entry point name -> environment variables set for its imports
+ENTRY_POINT_ENVIRONMENT = {'api': {'LLM_PROVIDER': 'fake'}}
+TOP_MODULES = 10
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark the import time of entry points.')
+    parser.add_argument(
+        '--entry_points',
+        type=str,
+        nargs='+',
+        choices=list(ENTRY_POINTS),
+        default=list(ENTRY_POINTS),
+        help='Entry points to import.',
+    )
+    parser.add_argument('--repeats', type=int, default=5, help='Fresh imports per entry point.')
+    parser.add_argument(
+        '--baseline', type=Path, default=None, help='Report of an earlier run to compare with.'
+    )
+    parser.add_argument(
+        '--tolerance',
+        type=float,
+        default=0.25,
+        help='Allowed relative increase of the import time over the baseline.',
+    )
+    parser.add_argument('--output', type=Path, default=None, help='Optional JSON report path.')
+    return parser.parse_args()
+
+
+def parse_importtime(stderr: str) -> dict[str, tuple[int, int]]:
+    """
+    Parse `-X importtime` output.
+
+    :return: Self and cumulative import time in microseconds by module name.
+    """
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:') :].split('|', 2)
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def import_once(
+    module: str, forbidden: tuple[str, ...], environment: dict[str, str] | None = None
+) -> dict:
+    """
+    Import a module in a fresh interpreter.
+
+    :param environment: Environment variables to set for the interpreter.
+
+    :return: Dict with seconds (cumulative import time), wall_seconds, self time in seconds
+        by module, the forbidden modules that were loaded and the error, if the import failed.
+    """
+    code = (
+        'import json, sys\n'
+        f'import {module}\n'
+        f'print(json.dumps([name for name in {list(forbidden)!r} if name in sys.modules]))'
+    )
+    env = {**os.environ, **(environment or {})}
+    env['PYTHONPATH'] = os.pathsep.join(
+        [str(PROJECT_ROOT), str(WATSCRAPER_DIR), env.get('PYTHONPATH', '')]
+    ).rstrip(os.pathsep)
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=PROJECT_ROOT,
+        check=False,
+    )
+    wall_seconds = time.perf_counter() - start
+    times = parse_importtime(process.stderr)
+    result = {
+        'seconds': times.get(module, (0, 0))[1] / 1e6,
+        'wall_seconds': wall_seconds,
+        'self_seconds': {name: self_us / 1e6 for name, (self_us, _) in times.items()},
+        'loaded_forbidden': [],
+        'error': None,
+    }
+    if process.returncode:
+        errors = [line for line in process.stderr.splitlines() if not line.startswith('import')]
+        result['error'] = errors[-1] if errors else f'exit status {process.returncode}'
+    else:
+        result['loaded_forbidden'] = json.loads(process.stdout.strip().splitlines()[-1])
+    return result
+
+
+def benchmark_entry_point(
+    module: str,
+    forbidden: tuple[str, ...],
+    repeats: int,
+    environment: dict[str, str] | None = None,
+) -> dict:
+    runs = [import_once(module, forbidden, environment) for _ in range(repeats)]
+    self_seconds: dict[str, list[float]] = {}
+    for run in runs:
+        for name, seconds in run['self_seconds'].items():
+            self_seconds.setdefault(name, []).append(seconds)
+    slowest = sorted(
+        ((name, statistics.median(values)) for name, values in self_seconds.items()),
+        key=lambda item: item[1],
+        reverse=True,
+    )[:TOP_MODULES]
+    return {
+        'module': module,
+        'seconds': statistics.median(run['seconds'] for run in runs),
+        'wall_seconds': statistics.median(run['wall_seconds'] for run in runs),
+        'slowest_modules': dict(slowest),
+        'loaded_forbidden': sorted({name for run in runs for name in run['loaded_forbidden']}),
+        'error': next((run['error'] for run in runs if run['error']), None),
+    }
+
+
+def check_regressions(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    :return: Descriptions of the entry points that failed, loaded forbidden modules or import
+        slower than the baseline allows.
+    """
+    regressions = []
+    for name, entry in report.items():
+        if entry['error']:
+            regressions.append(f'{name}: import failed ({entry["error"]})')
+        if entry['loaded_forbidden']:
+            regressions.append(f'{name}: loads {", ".join(entry["loaded_forbidden"])} at import')
+        previous = baseline.get(name)
+        if previous and not previous['error']:
+            limit = previous['seconds'] * (1 + tolerance)
+            if entry['seconds'] > limit:
+                regressions.append(
+                    f'{name}: {entry["seconds"]:.3f}s import time, baseline '
+                    f'{previous["seconds"]:.3f}s (limit {limit:.3f}s)'
+                )
+    return regressions
+
+
+def main(
+    entry_points: list[str],
+    repeats: int,
+    baseline_path: Path | None,
+    tolerance: float,
+    output: Path | None,
+) -> list[str]:
+    report = {}
+    for name in entry_points:
+        module, forbidden = ENTRY_POINTS[name]
+        report[name] = benchmark_entry_point(
+            module, forbidden, repeats, ENTRY_POINT_ENVIRONMENT.get(name)
+        )
+        entry = report[name]
+        log_info(
+            f'{name}: {entry["seconds"]:.3f}s import, {entry["wall_seconds"]:.3f}s wall, '
+            f'forbidden loaded: {entry["loaded_forbidden"] or "none"}'
+        )
+        if entry['error']:
+            log_warning(f'{name}: import failed: {entry["error"]}')
+
+    if output:
+        output.write_text(json.dumps(report, indent=2), encoding='utf-8')
+        log_info(f'Report written to {output}')
+
+    baseline = {}
+    if baseline_path:
+        baseline = json.loads(baseline_path.read_text(encoding='utf-8'))
+    regressions = check_regressions(report, baseline, tolerance)
+    for regression in regressions:
+        log_error(f'Import regression: {regression}')
+    return regressions
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if main(args.entry_points, args.repeats, args.baseline, args.tolerance, args.output):
+        raise SystemExit(1)
@@ -0,0 +1,106 @@
+"""Benchmark retrieval modes (vector, lexical, hybrid, auto) on latency and hit rate.
+
+Two query sets are sampled from chunks.db:
+- identifier queries mention a token such as a course code or room number found in a chunk;
+  a hit is any retrieved chunk containing that token,
+- passage queries are a run of words from the middle of a chunk; a hit is retrieving that chunk.
+
+```bash
+python -m watgpt.scripts.benchmark_retrieval --num_queries 100 --output retrieval_bench.json
+```
+"""
+
+import argparse
+import json
+import random
+import time
+from pathlib import Path
+
+from ..constants import RETRIEVAL_MODES, VECTOR_DB_BACKEND, VECTOR_DB_BACKENDS
+from ..db import NumpyVectorDB, SqlDB, VectorDB
+from ..retriever import IDENTIFIER_PATTERN, Retriever, contains_identifier
+from ..utils import log_info, summarize_latencies
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark retrieval modes.')
+    parser.add_argument('--num_queries', type=int, default=100, help='Queries per query set.')
+    parser.add_argument('--top_k', type=int, default=3, help='Number of results per query.')
+    parser.add_argument(
+        '--backend', type=str, choices=VECTOR_DB_BACKENDS, default=VECTOR_DB_BACKEND
+    )
+    parser.add_argument('--seed', type=int, default=0, help='Seed for sampling queries.')
+    parser.add_argument('--output', type=Path, default=None, help='Optional JSON report path.')
+    return parser.parse_args()
+
+
+def sample_queries(chunks, num_queries: int, rng: random.Random):
+    """Build (query, hit_fn) pairs for the identifier and passage query sets."""
+    identifiers = sorted(
+        {match.group() for chunk in chunks for match in IDENTIFIER_PATTERN.finditer(chunk.content)}
+    )
+    identifier_queries = [
+        (f'Co wiadomo o {identifier}?', [identifier])
+        for identifier in rng.sample(identifiers, min(num_queries, len(identifiers)))
+    ]
+
+    passage_queries = []
+    long_chunks = [chunk for chunk in chunks if len(chunk.content.split()) >= 24]
+    for chunk in rng.sample(long_chunks, min(num_queries, len(long_chunks))):
+        words = chunk.content.split()
+        start = rng.randrange(0, len(words) - 12)
+        passage_queries.append((' '.join(words[start : start + 12]), chunk.chunk_id))
+    return identifier_queries, passage_queries
+
+
+def run_mode(retriever: Retriever, mode: str, queries, is_hit, top_k: int) -> dict:
+    latencies = []
+    hits = 0
+    for query, target in queries:
+        start = time.perf_counter()
+        documents = retriever.retrieve(query, top_k=top_k, mode=mode)
+        latencies.append(time.perf_counter() - start)
+        hits += int(is_hit(documents, target))
+    return {
+        'latency': summarize_latencies(latencies),
+        'hit_rate': hits / len(queries) if queries else 0.0,
+    }
+
+
+def main(num_queries: int, top_k: int, backend: str, seed: int, output: Path | None):
+    sql_db = SqlDB()
+    vector_db = NumpyVectorDB() if backend == 'numpy' else VectorDB()
+    retriever = Retriever(vector_db, sql_db)
+
+    chunks = sql_db.fetch_all_chunks()
+    identifier_queries, passage_queries = sample_queries(chunks, num_queries, random.Random(seed))
+    log_info(
+        f'{len(identifier_queries)} identifier and {len(passage_queries)} passage queries '
+        f'over {len(chunks)} chunks.'
+    )
+
+    def identifier_hit(documents, identifiers):
+        return any(contains_identifier(document, identifiers) for document in documents)
+
+    def passage_hit(documents, chunk_id):
+        return any(int(document.metadata['chunk_id']) == chunk_id for document in documents)
+
+    # Warm up the embedding model and the database connections
+    retriever.retrieve('warm up', top_k=top_k, mode='hybrid')
+
+    report: dict = {'backend': backend, 'top_k': top_k, 'num_chunks': len(chunks)}
+    for mode in RETRIEVAL_MODES:
+        report[mode] = {
+            'identifier': run_mode(retriever, mode, identifier_queries, identifier_hit, top_k),
+            'passage': run_mode(retriever, mode, passage_queries, passage_hit, top_k),
+        }
+        log_info(f'{mode}: {json.dumps(report[mode], indent=2)}')
+
+    if output:
+        output.write_text(json.dumps(report, indent=2), encoding='utf-8')
+        log_info(f'Report written to {output}')
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    main(args.num_queries, args.top_k, args.backend, args.seed, args.output)
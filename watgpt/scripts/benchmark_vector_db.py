@@ -0,0 +1,139 @@
+"""Benchmark the numpy vector index against the Chroma backend.
+
+Both indexes have to be built from the same chunks.db first:
+```bash
+python -m watgpt.scripts.create_vector_db --backend chroma
+python -m watgpt.scripts.create_vector_db --backend numpy
+python -m watgpt.scripts.benchmark_vector_db --num_queries 200
+```
+
+Each backend runs in its own process, so its open time and resident memory are measured
+in isolation. Both processes load the same embedding model, so the difference in memory
+between backends is the cost of the index itself. Recall@k is measured against an exact
+float32 search over the chunk embeddings stored in chunks.db.
+"""
+
+import argparse
+import json
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+import numpy as np
+from langchain_huggingface import HuggingFaceEmbeddings
+
+from ..constants import (
+    EMBEDDINGS_MODEL_NAME,
+    NUMPY_VECTOR_DATABASE_DIR,
+    UNIVERSITY_DOCS_COLLECTION,
+    VECTOR_DATABASE_FILE,
+)
+from ..db.embeddings import embed_chunks, load_chunk_embeddings
+from ..db.numpy_vector_db import NumpyVectorDB, normalize_rows
+from ..db.sql_db import SqlDB
+from ..db.vector_db import VectorDB
+from ..utils import init_worker_logging, log_info, summarize_latencies
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark numpy vs Chroma vector index.')
+    parser.add_argument('--num_queries', type=int, default=100, help='Number of queries.')
+    parser.add_argument('--top_k', type=int, default=5, help='Number of results per query.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for sampling queries.')
+    parser.add_argument('--output', type=Path, default=None, help='Optional JSON report path.')
+    return parser.parse_args()
+
+
+def rss_mb() -> float:
+    """Current resident set size of this process in MB (Linux)."""
+    with open('/proc/self/status', encoding='utf-8') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def run_backend(backend: str, query_vectors: list[list[float]], top_k: int) -> dict:
+    """Open one backend, run all queries by vector and report timings and results."""
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    vector_db: VectorDB | NumpyVectorDB
+    if backend == 'numpy':
+        vector_db = NumpyVectorDB(NUMPY_VECTOR_DATABASE_DIR, EMBEDDINGS_MODEL_NAME)
+    else:
+        vector_db = VectorDB(
+            VECTOR_DATABASE_FILE, UNIVERSITY_DOCS_COLLECTION, EMBEDDINGS_MODEL_NAME
+        )
+    open_s = time.perf_counter() - start
+
+    latencies = []
+    results = []
+    for vector in query_vectors:
+        start = time.perf_counter()
+        if isinstance(vector_db, NumpyVectorDB):
+            documents = [doc for doc, _ in vector_db.query_by_vector(vector, top_k=top_k)]
+        else:
+            documents = vector_db.vector_store.similarity_search_by_vector(vector, k=top_k)
+        latencies.append(time.perf_counter() - start)
+        results.append([int(doc.metadata['chunk_id']) for doc in documents])
+
+    return {
+        'open_s': open_s,
+        'search_latency': summarize_latencies(latencies),
+        'rss_delta_mb': rss_mb() - rss_before,
+        'results': results,
+    }
+
+
+def exact_top_k(
+    chunk_ids: list[int], chunk_vectors: np.ndarray, query_vectors: np.ndarray, top_k: int
+) -> list[list[int]]:
+    scores = query_vectors @ chunk_vectors.T
+    top = np.argsort(-scores, axis=1)[:, :top_k]
+    return [[chunk_ids[i] for i in row] for row in top]
+
+
+def recall_at_k(results: list[list[int]], ground_truth: list[list[int]]) -> float:
+    hits = sum(len(set(res) & set(gt)) for res, gt in zip(results, ground_truth, strict=True))
+    total = sum(len(gt) for gt in ground_truth)
+    return hits / total if total else 0.0
+
+
+def main(num_queries: int, top_k: int, seed: int, output: Path | None):
+    sql_db = SqlDB()
+    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDINGS_MODEL_NAME)
+    embed_chunks(sql_db, embeddings, EMBEDDINGS_MODEL_NAME)
+    chunks, chunk_vectors = load_chunk_embeddings(sql_db, EMBEDDINGS_MODEL_NAME)
+    if not chunks:
+        raise RuntimeError('No chunks found, run the scraper first.')
+
+    # Queries are the opening words of randomly sampled chunks
+    rng = random.Random(seed)
+    sampled = rng.sample(chunks, min(num_queries, len(chunks)))
+    queries = [' '.join(chunk.content.split()[:12]) for chunk in sampled]
+
+    query_vectors = normalize_rows(np.asarray(embeddings.embed_documents(queries), np.float32))
+    ground_truth = exact_top_k(
+        [chunk.chunk_id for chunk in chunks], normalize_rows(chunk_vectors), query_vectors, top_k
+    )
+
+    report: dict = {'num_chunks': len(chunks), 'num_queries': len(queries), 'top_k': top_k}
+    for backend in ('chroma', 'numpy'):
+        with ProcessPoolExecutor(
+            max_workers=1, mp_context=get_context('spawn'), initializer=init_worker_logging
+        ) as pool:
+            stats = pool.submit(run_backend, backend, query_vectors.tolist(), top_k).result()
+        stats[f'recall_at_{top_k}'] = recall_at_k(stats.pop('results'), ground_truth)
+        report[backend] = stats
+        log_info(f'{backend}: {json.dumps(stats, indent=2)}')
+
+    if output:
+        output.write_text(json.dumps(report, indent=2), encoding='utf-8')
+        log_info(f'Report written to {output}')
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    main(args.num_queries, args.top_k, args.seed, args.output)
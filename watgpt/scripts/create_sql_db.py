@@ -1,20 +1,39 @@
 import os
 
-from ..constants import CHUNKS_DATABASE_FILE
+from ..constants import CALENDAR_PDF_FP, CHUNKS_DATABASE_FILE
 from ..db.sql_db import SqlDB
 from ..utils import log_info
+from ..watscraper.watscraper.read_calendar_pdf import extract_calendar
 
 
-def main():
+def fill_database(db: SqlDB):
+    """Fill the default tables: block hours and the bundled calendar's events."""
+    db.fill_block_hours()
+    log_info('Database created and block hours filled.')
+    if CALENDAR_PDF_FP.exists():
+        _, events = extract_calendar(CALENDAR_PDF_FP)
+        stored = db.replace_calendar_events(CALENDAR_PDF_FP.name, events)
+        log_info(f'Stored {stored} calendar events from {CALENDAR_PDF_FP.name}.')
+
+
+def remove_database():
+    """Remove the database with its WAL and shared-memory files, so no old WAL is replayed."""
     if os.path.exists(CHUNKS_DATABASE_FILE):
         os.remove(CHUNKS_DATABASE_FILE)
         log_info(f'Removed existing database file: {CHUNKS_DATABASE_FILE}')
     else:
         log_info('No previous database file found.')
+    for suffix in ('-wal', '-shm'):
+        path = f'{CHUNKS_DATABASE_FILE}{suffix}'
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def main():
+    remove_database()
     # Instantiating SqlDB automatically initializes the database (init_db is called in __init__)
     db = SqlDB()
-    db.fill_block_hours()
-    log_info('Database created and block hours filled.')
+    fill_database(db)
 
 
 if __name__ == '__main__':
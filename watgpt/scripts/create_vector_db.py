@@ -1,44 +1,134 @@
+import argparse
 import os
 import shutil
+import time
+
+import numpy as np
 
 from watgpt.constants import (
+    CHUNK_EMBEDDING_DTYPE,
     EMBEDDINGS_MODEL_NAME,
+    NEAR_DUPLICATE_THRESHOLD,
+    NUMPY_VECTOR_DATABASE_DIR,
     UNIVERSITY_DOCS_COLLECTION,
     VECTOR_DATABASE_FILE,
+    VECTOR_DB_BACKEND,
+    VECTOR_DB_BACKENDS,
 )
+from watgpt.db.embeddings import embed_chunks, load_chunk_embeddings
+from watgpt.db.near_duplicates import mark_near_duplicates
+from watgpt.db.numpy_vector_db import NumpyVectorDB
 from watgpt.db.sql_db import SqlDB
 from watgpt.db.vector_db import VectorDB
 from watgpt.utils import create_marker_file, delete_marker_file, log_info
 
 
-def clear_database():
-    if os.path.exists(VECTOR_DATABASE_FILE):
-        shutil.rmtree(VECTOR_DATABASE_FILE)
-
+def parse_args():
+    parser = argparse.ArgumentParser(description='Embed all chunks into the vector database.')
+    parser.add_argument(
+        '--backend',
+        type=str,
+        choices=VECTOR_DB_BACKENDS,
+        default=VECTOR_DB_BACKEND,
+        help='Vector index backend to build.',
+    )
+    parser.add_argument(
+        '--near_duplicate_threshold',
+        type=float,
+        default=NEAR_DUPLICATE_THRESHOLD,
+        help='Estimated Jaccard similarity above which chunks share one index entry.',
+    )
+    parser.add_argument(
+        '--keep_near_duplicates',
+        action='store_true',
+        help='Embed and index every chunk, clearing previous near-duplicate marks.',
+    )
+    return parser.parse_args()
 
-def main():
-    delete_marker_file('create_vector_db.done')
 
-    # 1) Initialize tables (optional if not yet done)
-    sql_db = SqlDB()
+def clear_database(backend: str = VECTOR_DB_BACKEND):
+    db_path = NUMPY_VECTOR_DATABASE_DIR if backend == 'numpy' else VECTOR_DATABASE_FILE
+    if os.path.exists(db_path):
+        shutil.rmtree(db_path)
 
-    # 2) Fetch all chunks
-    chunks_in_db = sql_db.fetch_all_chunks()
-    log_info(f'All chunks in db => total {len(chunks_in_db)} rows.')
 
-    # 3) Init vector database
-    vector_db = VectorDB(
+def open_vector_db(backend: str = VECTOR_DB_BACKEND) -> VectorDB | NumpyVectorDB:
+    if backend == 'numpy':
+        return NumpyVectorDB(
+            db_dir=NUMPY_VECTOR_DATABASE_DIR,
+            embeddings_model_name=EMBEDDINGS_MODEL_NAME,
+        )
+    return VectorDB(
         db_file=VECTOR_DATABASE_FILE,
         collection_name=UNIVERSITY_DOCS_COLLECTION,
         embeddings_model_name=EMBEDDINGS_MODEL_NAME,
     )
 
-    for chunk in chunks_in_db:
-        vector_db.add_chunk(chunk)
-    log_info('All chunks added to ChromaDB.')
+
+def build_vector_db(
+    sql_db: SqlDB,
+    vector_db: VectorDB | NumpyVectorDB,
+    near_duplicate_threshold: float | None = NEAR_DUPLICATE_THRESHOLD,
+) -> dict:
+    """
+    Mark near-duplicates, embed chunks without an up-to-date embedding and add all
+    embedded chunks to the vector index.
+
+    :return: Report with the numbers of near-duplicates, embedded and indexed chunks and the
+        embedding time.
+    """
+    # 1) Keep one representative per cluster of near-duplicate chunks
+    if near_duplicate_threshold is None:
+        sql_db.set_near_duplicates({})
+        near_duplicates = {'near_duplicates': 0, 'near_duplicate_content_bytes': 0}
+    else:
+        near_duplicates = mark_near_duplicates(sql_db, threshold=near_duplicate_threshold)
+
+    # 2) Encode only chunks with a missing or stale embedding in chunks.db
+    start = time.perf_counter()
+    num_embedded = embed_chunks(sql_db, vector_db.embedding_function, EMBEDDINGS_MODEL_NAME)
+    embedding_seconds = time.perf_counter() - start
+
+    # 3) Build the index straight from the stored embeddings
+    chunks, embeddings = load_chunk_embeddings(sql_db, EMBEDDINGS_MODEL_NAME)
+    log_info(f'Embedded chunks in db => total {len(chunks)} rows.')
+    vector_db.add_embeddings(chunks, embeddings)
+    log_info(f'All chunks added to {type(vector_db).__name__}.')
+
+    # Savings are estimated from this run's per-chunk embedding time and the index row size
+    skipped = near_duplicates['near_duplicates']
+    if skipped:
+        vector_bytes = embeddings.shape[1] * np.dtype(CHUNK_EMBEDDING_DTYPE).itemsize
+        seconds_per_chunk = embedding_seconds / num_embedded if num_embedded else None
+        log_info(
+            f'Near-duplicates left out of the index: {skipped} chunks, '
+            f'~{skipped * vector_bytes + near_duplicates["near_duplicate_content_bytes"]} '
+            'index bytes saved'
+            + (
+                f', ~{skipped * seconds_per_chunk:.1f}s of embedding saved.'
+                if seconds_per_chunk
+                else '.'
+            )
+        )
+    return {
+        'near_duplicates': skipped,
+        'embedded_chunks': num_embedded,
+        'indexed_chunks': len(chunks),
+        'embedding_seconds': embedding_seconds,
+    }
+
+
+def main(
+    backend: str = VECTOR_DB_BACKEND,
+    near_duplicate_threshold: float | None = NEAR_DUPLICATE_THRESHOLD,
+):
+    delete_marker_file('create_vector_db.done')
+    build_vector_db(SqlDB(), open_vector_db(backend), near_duplicate_threshold)
     create_marker_file('create_vector_db.done')
 
 
 if __name__ == '__main__':
-    clear_database()
-    main()
+    args = parse_args()
+    clear_database(args.backend)
+    threshold = None if args.keep_near_duplicates else args.near_duplicate_threshold
+    main(args.backend, near_duplicate_threshold=threshold)
@@ -0,0 +1,240 @@
+"""Run the ingestion stages create_sql_db, scrape and create_vector_db in one process.
+
+The stages run back to back, the spiders concurrently on one reactor, without marker files
+and healthcheck polling between containers; create_sql_db, rechunking and create_vector_db
+share one SqlDB connection, while the crawl writes through its own DB writer. chunks.db is
+kept (the schema is created in place), so the fetch manifest and extraction cache keys of
+earlier crawls stay valid; --fresh deletes it first. Every completed
+stage is recorded in a checkpoint (INGEST_CHECKPOINT_FILE) together with the run's options;
+a run started after a failure with the same options resumes at the first stage that did not
+complete. A run with different options, or after all stages completed, starts over;
+--restart always does. The marker files of the separate scripts are still created, so
+services waiting on them keep working.
+
+```bash
+python -m watgpt.scripts.ingest --backend numpy --output ingest.json
+```
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from ..constants import (
+    INGEST_CHECKPOINT_FILE,
+    NEAR_DUPLICATE_THRESHOLD,
+    TARGET_GROUPS,
+    VECTOR_DB_BACKEND,
+    VECTOR_DB_BACKENDS,
+)
+from ..db.sql_db import SqlDB
+from ..utils import create_marker_file, delete_marker_file, log_error, log_info, log_warning
+from .create_sql_db import fill_database, remove_database
+from .create_vector_db import build_vector_db, clear_database, open_vector_db
+from .scrape import rechunk_from_cache, run_spiders
+
+STAGES = ('create_sql_db', 'scrape', 'create_vector_db')
+MARKER_FILES = {'scrape': 'scrape.done', 'create_vector_db': 'create_vector_db.done'}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Run all ingestion stages in one process.')
+    parser.add_argument(
+        '--spider_name',
+        type=str,
+        choices=['timetable', 'all_files', 'both'],
+        default='both',
+        help='Spiders run by the scrape stage.',
+    )
+    parser.add_argument(
+        '--target_groups',
+        type=str,
+        default=TARGET_GROUPS,
+        help='Comma-separated group codes for the timetable spider (all groups if empty).',
+    )
+    parser.add_argument(
+        '--rechunk_only',
+        action='store_true',
+        help='Rebuild chunks from the extraction cache instead of crawling.',
+    )
+    parser.add_argument(
+        '--fresh',
+        action='store_true',
+        help='Delete chunks.db before creating it, so everything is crawled and parsed again.',
+    )
+    parser.add_argument(
+        '--backend',
+        type=str,
+        choices=VECTOR_DB_BACKENDS,
+        default=VECTOR_DB_BACKEND,
+        help='Vector index backend to build.',
+    )
+    parser.add_argument(
+        '--near_duplicate_threshold',
+        type=float,
+        default=NEAR_DUPLICATE_THRESHOLD,
+        help='Estimated Jaccard similarity above which chunks share one index entry.',
+    )
+    parser.add_argument(
+        '--keep_near_duplicates',
+        action='store_true',
+        help='Embed and index every chunk, clearing previous near-duplicate marks.',
+    )
+    parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint.')
+    parser.add_argument(
+        '--checkpoint', type=Path, default=Path(INGEST_CHECKPOINT_FILE), help='Checkpoint file.'
+    )
+    parser.add_argument('--output', type=Path, default=None, help='Optional JSON report path.')
+    args = parser.parse_args()
+    if args.fresh and args.rechunk_only:
+        parser.error('--rechunk_only rebuilds the chunks of the documents --fresh would delete')
+    return args
+
+
+class IngestionResources:
+    """Databases shared by the stages, opened on first use."""
+
+    def __init__(self, backend: str = VECTOR_DB_BACKEND):
+        self.backend = backend
+        self._sql_db: SqlDB | None = None
+
+    @property
+    def sql_db(self) -> SqlDB:
+        if self._sql_db is None:
+            self._sql_db = SqlDB()
+        return self._sql_db
+
+    def reset_sql_db(self):
+        """Drop the connection, e.g. before chunks.db is recreated."""
+        if self._sql_db is not None:
+            self._sql_db.engine.dispose()
+        self._sql_db = None
+
+
+def load_checkpoint(path: Path) -> dict:
+    try:
+        return json.loads(path.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {}
+
+
+def save_checkpoint(path: Path, checkpoint: dict):
+    """Write the checkpoint under a temporary name and rename it, so it is never partial."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        'w', dir=path.parent, suffix='.tmp', delete=False, encoding='utf-8'
+    ) as tmp:
+        json.dump(checkpoint, tmp, indent=2)
+    os.replace(tmp.name, path)
+
+
+def run_create_sql_db(resources: IngestionResources, options: dict) -> dict:
+    """Create missing tables in place, or recreate chunks.db from scratch with fresh."""
+    if options['fresh']:
+        resources.reset_sql_db()
+        remove_database()
+    fill_database(resources.sql_db)
+    return {'fresh': options['fresh']}
+
+
+def run_scrape(resources: IngestionResources, options: dict) -> dict:
+    if options['rechunk_only']:
+        return rechunk_from_cache(resources.sql_db)
+    spiders = run_spiders(options['spider_name'], options['target_groups'])
+    unfinished = [name for name, spider in spiders.items() if spider['finish_reason'] != 'finished']
+    if unfinished:
+        raise RuntimeError(f'Spiders {unfinished} did not finish: {spiders}')
+    return spiders
+
+
+def run_create_vector_db(resources: IngestionResources, options: dict) -> dict:
+    clear_database(options['backend'])
+    return build_vector_db(
+        resources.sql_db, open_vector_db(options['backend']), options['near_duplicate_threshold']
+    )
+
+
+STAGE_FUNCTIONS = {
+    'create_sql_db': run_create_sql_db,
+    'scrape': run_scrape,
+    'create_vector_db': run_create_vector_db,
+}
+
+
+def main(options: dict, checkpoint_path: Path, restart: bool = False) -> dict:
+    """
+    Run the stages not completed by the checkpointed run with the same options.
+
+    :param options: spider_name, target_groups, rechunk_only, fresh, backend and
+        near_duplicate_threshold.
+    :return: Report with each stage's status ('skipped', 'completed' or 'failed'), time and
+        result, and the total time.
+    """
+    checkpoint = load_checkpoint(checkpoint_path)
+    completed = checkpoint.get('completed', {})
+    if restart or checkpoint.get('options') != options or set(completed) >= set(STAGES):
+        if completed and not restart and checkpoint.get('options') != options:
+            log_warning('Ingestion options changed since the last run, starting over.')
+        completed = {}
+    elif completed:
+        log_info(f'Resuming ingestion after stages {list(completed)}.')
+    checkpoint = {'options': options, 'completed': completed}
+    save_checkpoint(checkpoint_path, checkpoint)
+
+    resources = IngestionResources(options['backend'])
+    report: dict = {'options': options, 'resumed': bool(completed), 'stages': {}}
+    start = time.perf_counter()
+    for stage in STAGES:
+        if stage in completed:
+            report['stages'][stage] = {'status': 'skipped', **completed[stage]}
+            continue
+        if stage in MARKER_FILES:
+            delete_marker_file(MARKER_FILES[stage])
+        log_info(f'Ingestion stage {stage} started.')
+        stage_start = time.perf_counter()
+        try:
+            result = STAGE_FUNCTIONS[stage](resources, options)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            report['stages'][stage] = {
+                'status': 'failed',
+                'seconds': time.perf_counter() - stage_start,
+                'error': str(e),
+            }
+            log_error(f'Ingestion stage {stage} failed, rerun to resume from it: {e}')
+            break
+        seconds = time.perf_counter() - stage_start
+        completed[stage] = {'seconds': seconds, 'result': result}
+        save_checkpoint(checkpoint_path, checkpoint)
+        if stage in MARKER_FILES:
+            create_marker_file(MARKER_FILES[stage])
+        report['stages'][stage] = {'status': 'completed', 'seconds': seconds, 'result': result}
+        log_info(f'Ingestion stage {stage} completed in {seconds:.1f}s.')
+    report['seconds'] = time.perf_counter() - start
+    return report
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    ingestion_report = main(
+        {
+            'spider_name': args.spider_name,
+            'target_groups': args.target_groups,
+            'rechunk_only': args.rechunk_only,
+            'fresh': args.fresh,
+            'backend': args.backend,
+            'near_duplicate_threshold': (
+                None if args.keep_near_duplicates else args.near_duplicate_threshold
+            ),
+        },
+        args.checkpoint,
+        restart=args.restart,
+    )
+    log_info(f'Ingestion report: {json.dumps(ingestion_report, indent=2)}')
+    if args.output:
+        args.output.write_text(json.dumps(ingestion_report, indent=2), encoding='utf-8')
+        log_info(f'Report written to {args.output}')
+    if any(stage['status'] == 'failed' for stage in ingestion_report['stages'].values()):
+        raise SystemExit(1)
@@ -10,7 +10,7 @@ def parse_args():
         '--provider',
         type=str,
         default=LLM_PROVIDER,
-        help='LLM provider (openai, groq, ollama)',
+        help='LLM provider (openai, groq, ollama, fake)',
     )
     parser.add_argument(
         '--model',
@@ -0,0 +1,410 @@
+"""Load test the API: replay a query mix against /chat and find where latency degrades.
+
+Sends queries to POST /chat with an async HTTP client in steps of rising load, each lasting
+--duration seconds. With --concurrency, every step keeps that many requests in flight
+(closed loop: each user sends its next question when the answer arrives). With --rate, the
+requests of a step arrive at that many per second at exponentially distributed intervals
+(open loop), and latency is measured from the scheduled arrival, so queueing in the client
+counts too. The queries are a mix of timetable questions (--groups, dates and "dzisiaj" or
+"jutro"), FAQ questions and repeats of a few hot questions; --corpus replays a file of
+queries (one per line) in order instead.
+
+For every step the report holds the request count, throughput (successful answers/sec),
+latency percentiles of successful answers overall and per query kind, and the error and 429
+rates. A step is saturated when its p95 latency exceeds --degradation times the p95 of the
+first step (or --max_p95_ms), or its error and 429 rate exceeds --max_error_rate; the report's
+saturation curve names the highest load before that. --serve_fake starts the API itself
+with LLM_PROVIDER=fake, so the run needs no API key (set the FAKE_LLM_* variables to tune it):
+
+```bash
+python -m watgpt.scripts.load_test_api --serve_fake --concurrency 1 2 4 8 16 32 --output load.json
+python -m watgpt.scripts.load_test_api --url http://localhost:8000 --rate 1 2 5 10 20
+```
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from pathlib import Path
+
+import httpx
+
+from ..constants import PROJECT_ROOT, TARGET_GROUPS
+from ..utils import log_info, log_warning, summarize_latencies
+from .benchmark_chat import git_commit
+
+FAQ_QUERIES = (
+    'Kiedy jest zimowa sesja egzaminacyjna?',
+    'Kiedy zaczyna się letnia sesja egzaminacyjna?',
+    'Jak złożyć wniosek o stypendium socjalne?',
+    'Ile wynosi opłata za powtarzanie przedmiotu?',
+    'Jakie są zasady zaliczania praktyk studenckich?',
+    'Kiedy są przerwy świąteczne w kalendarzu akademickim?',
+    'Jak uzyskać duplikat legitymacji studenckiej?',
+    'Co grozi za nieobecność na zajęciach?',
+    'Jakie dokumenty są potrzebne do obrony pracy dyplomowej?',
+    'Jak wybrać promotora pracy dyplomowej?',
+    'Kiedy jest termin zamknięcia protokołów w USOS?',
+    'Jak przenieść się na inny kierunek studiów?',
+    'Jak uzyskać urlop dziekański?',
+    'Gdzie znajduje się biblioteka wydziału?',
+    'Jak złożyć podanie o miejsce w akademiku?',
+)
+QUERY_KINDS = ('timetable', 'faq', 'repeated')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Load test the /chat endpoint of the API.')
+    parser.add_argument('--url', type=str, default='http://localhost:8000', help='API address.')
+    load = parser.add_mutually_exclusive_group(required=True)
+    load.add_argument('--concurrency', type=int, nargs='+', help='Requests in flight in each step.')
+    load.add_argument('--rate', type=float, nargs='+', help='Requests per second in each step.')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds per step.')
+    parser.add_argument(
+        '--warmup_requests', type=int, default=3, help='Requests sent before the first step.'
+    )
+    parser.add_argument('--timeout', type=float, default=60.0, help='Request timeout in seconds.')
+    parser.add_argument(
+        '--max_in_flight',
+        type=int,
+        default=256,
+        help='Connection limit of the client in --rate mode.',
+    )
+    parser.add_argument(
+        '--groups',
+        type=str,
+        default=TARGET_GROUPS,
+        help='Comma-separated group codes asked about in timetable questions.',
+    )
+    parser.add_argument('--timetable_share', type=float, default=0.4)
+    parser.add_argument('--repeated_share', type=float, default=0.2)
+    parser.add_argument(
+        '--hot_queries', type=int, default=5, help='Number of repeated (hot) questions.'
+    )
+    parser.add_argument(
+        '--corpus', type=Path, default=None, help='File of queries to replay, one per line.'
+    )
+    parser.add_argument('--degradation', type=float, default=2.0)
+    parser.add_argument('--max_p95_ms', type=float, default=None)
+    parser.add_argument('--max_error_rate', type=float, default=0.01)
+    parser.add_argument(
+        '--stop_at_saturation', action='store_true', help='Skip the steps after saturation.'
+    )
+    parser.add_argument(
+        '--serve_fake',
+        action='store_true',
+        help='Start the API on --port with LLM_PROVIDER=fake for the run.',
+    )
+    parser.add_argument('--port', type=int, default=8765, help='Port of the --serve_fake API.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the query mix.')
+    parser.add_argument('--output', type=Path, default=None, help='Optional JSON report path.')
+    return parser.parse_args()
+
+
+class QueryMix:
+    """
+    Endless source of (kind, query) pairs.
+
+    Timetable questions ask about a random group on a date of the coming two weeks, today or
+    tomorrow; FAQ questions are drawn from FAQ_QUERIES; repeated questions are drawn from a
+    fixed hot set of both, so caches in front of the model see repeats. A replayed corpus
+    yields its queries in order, as kind 'replay'.
+    """
+
+    def __init__(
+        self,
+        groups: list[str],
+        timetable_share: float,
+        repeated_share: float,
+        hot_queries: int,
+        corpus: list[str] | None = None,
+        seed: int = 0,
+    ):
+        self.rng = random.Random(seed)
+        self.groups = groups
+        self.corpus = corpus
+        self.position = 0
+        self.weights = (timetable_share, 1.0 - timetable_share - repeated_share, repeated_share)
+        if min(self.weights) < 0:
+            raise ValueError('timetable_share and repeated_share must add up to at most 1')
+        hot_timetable = hot_queries // 2 if groups else 0
+        self.hot = [self.timetable_query() for _ in range(hot_timetable)] + self.rng.sample(
+            FAQ_QUERIES, min(hot_queries - hot_timetable, len(FAQ_QUERIES))
+        )
+
+    def timetable_query(self) -> str:
+        day = self.rng.choice(
+            ['dzisiaj', 'jutro']
+            + [(date.today() + timedelta(days=days)).isoformat() for days in range(14)]
+        )
+        when = day if day in ('dzisiaj', 'jutro') else f'w dniu {day}'
+        return f'Jakie zajęcia ma grupa {self.rng.choice(self.groups)} {when}?'
+
+    def next(self) -> tuple[str, str]:
+        if self.corpus:
+            query = self.corpus[self.position % len(self.corpus)]
+            self.position += 1
+            return 'replay', query
+        kind = self.rng.choices(QUERY_KINDS, weights=self.weights)[0]
+        if kind == 'timetable' and self.groups:
+            return kind, self.timetable_query()
+        if kind == 'repeated' and self.hot:
+            return kind, self.rng.choice(self.hot)
+        return 'faq', self.rng.choice(FAQ_QUERIES)
+
+
+async def send_query(client: httpx.AsyncClient, query: str, scheduled: float) -> dict:
+    """
+    Post a query to /chat.
+
+    :param scheduled: perf_counter() time the request was due; latency is measured from it.
+    :return: Dict with status (HTTP status code, or the exception name if the request failed)
+        and seconds.
+    """
+    try:
+        response = await client.post('/chat', json={'query': query})
+        status: int | str = response.status_code
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    return {'status': status, 'seconds': time.perf_counter() - scheduled}
+
+
+async def run_closed_loop(client, queries: QueryMix, concurrency: int, duration: float):
+    """Requests of concurrency users sending their next query when the answer arrives."""
+    results: list[dict] = []
+    deadline = time.perf_counter() + duration
+
+    async def user():
+        while time.perf_counter() < deadline:
+            kind, query = queries.next()
+            result = await send_query(client, query, time.perf_counter())
+            results.append({'kind': kind, **result})
+
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return results
+
+
+async def run_open_loop(client, queries: QueryMix, rate: float, duration: float):
+    """Requests arriving at rate per second (Poisson arrivals) regardless of the answers."""
+    results: list[dict] = []
+
+    async def request(kind: str, query: str, scheduled: float):
+        results.append({'kind': kind, **await send_query(client, query, scheduled)})
+
+    tasks = []
+    start = time.perf_counter()
+    scheduled = start
+    while True:
+        scheduled += queries.rng.expovariate(rate)
+        if scheduled - start >= duration:
+            break
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+        tasks.append(asyncio.create_task(request(*queries.next(), scheduled)))
+    await asyncio.gather(*tasks)
+    return results
+
+
+def summarize_step(results: list[dict], seconds: float) -> dict:
+    """
+    :return: Requests, throughput, latency of successful answers overall and by query kind,
+        error and 429 rates and counts by status.
+    """
+    statuses = Counter(str(result['status']) for result in results)
+    ok = [result for result in results if result['status'] == 200]
+    by_kind = defaultdict(list)
+    for result in ok:
+        by_kind[result['kind']].append(result['seconds'])
+    requests = len(results)
+    return {
+        'requests': requests,
+        'seconds': seconds,
+        'throughput': len(ok) / seconds if seconds else 0.0,
+        'latency': summarize_latencies([result['seconds'] for result in ok]),
+        'latency_by_kind': {kind: summarize_latencies(values) for kind, values in by_kind.items()},
+        'error_rate': (requests - len(ok) - statuses['429']) / requests if requests else 0.0,
+        'rate_429': statuses['429'] / requests if requests else 0.0,
+        'statuses': dict(statuses),
+    }
+
+
+def is_saturated(step: dict, first_p95_ms: float, options: dict) -> bool:
+    p95_ms = step['latency']['p95_ms']
+    limit_ms = first_p95_ms * options['degradation']
+    if options['max_p95_ms'] is not None:
+        limit_ms = min(limit_ms, options['max_p95_ms'])
+    failed_rate = step['error_rate'] + step['rate_429']
+    return (
+        not step['latency']['count'] or p95_ms > limit_ms or failed_rate > options['max_error_rate']
+    )
+
+
+async def run_load_test(url: str, mode: str, levels: list, queries: QueryMix, options: dict):
+    limits = httpx.Limits(max_connections=options['max_in_flight'])
+    async with httpx.AsyncClient(base_url=url, timeout=options['timeout'], limits=limits) as client:
+        for _ in range(options['warmup_requests']):
+            await send_query(client, queries.next()[1], time.perf_counter())
+
+        steps = []
+        first_p95_ms = None
+        for level in levels:
+            start = time.perf_counter()
+            if mode == 'concurrency':
+                results = await run_closed_loop(client, queries, level, options['duration'])
+            else:
+                results = await run_open_loop(client, queries, level, options['duration'])
+            step = {mode: level, **summarize_step(results, time.perf_counter() - start)}
+            if first_p95_ms is None:
+                first_p95_ms = step['latency']['p95_ms']
+            step['saturated'] = is_saturated(step, first_p95_ms, options)
+            steps.append(step)
+            log_info(
+                f'{mode} {level}: {step["requests"]} requests, '
+                f'{step["throughput"]:.1f} answers/s, p50 {step["latency"]["p50_ms"]:.0f} ms, '
+                f'p95 {step["latency"]["p95_ms"]:.0f} ms, p99 {step["latency"]["p99_ms"]:.0f} ms, '
+                f'errors {step["error_rate"]:.1%}, 429 {step["rate_429"]:.1%}'
+            )
+            if step['saturated'] and options['stop_at_saturation']:
+                break
+        return steps
+
+
+def saturation_curve(mode: str, steps: list[dict]) -> dict:
+    """
+    :return: The curve of throughput and latency percentiles per load level, the highest level
+        before the first saturated step and that step's level.
+    """
+    saturated_at = next((step[mode] for step in steps if step['saturated']), None)
+    sustained = [step[mode] for step in steps if saturated_at is None or step[mode] < saturated_at]
+    return {
+        'curve': [
+            {
+                mode: step[mode],
+                'throughput': step['throughput'],
+                'p50_ms': step['latency']['p50_ms'],
+                'p95_ms': step['latency']['p95_ms'],
+                'p99_ms': step['latency']['p99_ms'],
+                'error_rate': step['error_rate'],
+                'rate_429': step['rate_429'],
+            }
+            for step in steps
+        ],
+        'max_sustained': max(sustained, default=None),
+        'saturated_at': saturated_at,
+    }
+
+
+def start_fake_api(port: int, timeout: float = 300.0) -> subprocess.Popen:
+    """Start uvicorn with LLM_PROVIDER=fake and wait until /health answers."""
+    env = {**os.environ, 'LLM_PROVIDER': 'fake'}
+    server = subprocess.Popen(  # pylint: disable=consider-using-with
+        [
+            sys.executable,
+            '-m',
+            'uvicorn',
+            'watgpt.api:app',
+            '--port',
+            str(port),
+            '--log-level',
+            'warning',
+        ],
+        cwd=PROJECT_ROOT,
+        env=env,
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'The API exited with status {server.returncode}')
+        try:
+            if httpx.get(f'http://127.0.0.1:{port}/health', timeout=1.0).status_code == 200:
+                return server
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError(f'The API did not answer /health within {timeout:.0f}s')
+
+
+def main(url: str, mode: str, levels: list, queries: QueryMix, options: dict, output: Path | None):
+    server = None
+    if options['serve_fake']:
+        server = start_fake_api(options['port'])
+        url = f'http://127.0.0.1:{options["port"]}'
+        log_info(f'Started the API with the fake chat model at {url}')
+    try:
+        steps = asyncio.run(run_load_test(url, mode, levels, queries, options))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    report = {
+        'commit': git_commit(),
+        'url': url,
+        'mode': mode,
+        'options': options,
+        'steps': steps,
+        'saturation': saturation_curve(mode, steps),
+    }
+    saturation = report['saturation']
+    if saturation['saturated_at'] is None:
+        log_info(f'Not saturated up to {mode} {levels[-1]}.')
+    else:
+        log_warning(
+            f'Saturated at {mode} {saturation["saturated_at"]}, '
+            f'highest sustained: {saturation["max_sustained"]}.'
+        )
+
+    if output:
+        output.write_text(json.dumps(report, indent=2), encoding='utf-8')
+        log_info(f'Report written to {output}')
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    corpus_queries = None
+    if args.corpus:
+        corpus_queries = [
+            line.strip()
+            for line in args.corpus.read_text(encoding='utf-8').splitlines()
+            if line.strip()
+        ]
+    main(
+        args.url,
+        'concurrency' if args.concurrency else 'rate',
+        args.concurrency or args.rate,
+        QueryMix(
+            [group for group in args.groups.split(',') if group],
+            args.timetable_share,
+            args.repeated_share,
+            args.hot_queries,
+            corpus_queries,
+            args.seed,
+        ),
+        {
+            'duration': args.duration,
+            'warmup_requests': args.warmup_requests,
+            'timeout': args.timeout,
+            'max_in_flight': args.max_in_flight,
+            'degradation': args.degradation,
+            'max_p95_ms': args.max_p95_ms,
+            'max_error_rate': args.max_error_rate,
+            'stop_at_saturation': args.stop_at_saturation,
+            'serve_fake': args.serve_fake,
+            'port': args.port,
+            'seed': args.seed,
+            'query_mix': {
+                'timetable_share': args.timetable_share,
+                'repeated_share': args.repeated_share,
+                'hot_queries': args.hot_queries,
+                'corpus': str(args.corpus) if args.corpus else None,
+            },
+        },
+        args.output,
+    )
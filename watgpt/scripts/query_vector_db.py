@@ -2,10 +2,13 @@ import argparse
 
 from ..constants import (
     EMBEDDINGS_MODEL_NAME,
+    NUMPY_VECTOR_DATABASE_DIR,
     UNIVERSITY_DOCS_COLLECTION,
     VECTOR_DATABASE_FILE,
+    VECTOR_DB_BACKEND,
+    VECTOR_DB_BACKENDS,
 )
-from ..db import VectorDB
+from ..db import NumpyVectorDB, VectorDB
 from ..utils import log_info
 
 
@@ -17,12 +20,25 @@ def parse_args():
         required=True,
         help='Query string to search in the database.',
     )
+    parser.add_argument(
+        '--backend',
+        type=str,
+        choices=VECTOR_DB_BACKENDS,
+        default=VECTOR_DB_BACKEND,
+        help='Vector index backend to query.',
+    )
     return parser.parse_args()
 
 
-def main(query):
+def main(query, backend: str = VECTOR_DB_BACKEND):
     # Init vector database
-    vector_db = VectorDB(VECTOR_DATABASE_FILE, UNIVERSITY_DOCS_COLLECTION, EMBEDDINGS_MODEL_NAME)
+    vector_db: VectorDB | NumpyVectorDB
+    if backend == 'numpy':
+        vector_db = NumpyVectorDB(NUMPY_VECTOR_DATABASE_DIR, EMBEDDINGS_MODEL_NAME)
+    else:
+        vector_db = VectorDB(
+            VECTOR_DATABASE_FILE, UNIVERSITY_DOCS_COLLECTION, EMBEDDINGS_MODEL_NAME
+        )
 
     # Query the database
     results = vector_db.query(query)
@@ -33,4 +49,4 @@ def main(query):
 
 if __name__ == '__main__':
     args = parse_args()
-    main(args.query)
+    main(args.query, args.backend)
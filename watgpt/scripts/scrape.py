@@ -1,25 +1,28 @@
 import argparse
 import os
-import stat
-import subprocess
+import sys
 from pathlib import Path
 
-from watgpt.constants import TARGET_GROUPS
-from watgpt.utils import create_marker_file, delete_marker_file, log_info
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.project import get_project_settings
 
+from watgpt.constants import TARGET_GROUPS
+from watgpt.db.sql_db import SqlDB
+from watgpt.utils import create_marker_file, delete_marker_file, log_info, log_warning
+from watgpt.watscraper.watscraper.extract import read_cached_text
+from watgpt.watscraper.watscraper.text_chunker import chunk_documents
 
-def ensure_executable(script_path: Path) -> None:
-    """Ensure that the given script has executable permissions."""
-    if not os.access(script_path, os.X_OK):
-        st = os.stat(script_path)
-        os.chmod(script_path, st.st_mode | stat.S_IEXEC)
+# Directory of scrapy.cfg; the project's modules are imported as `watscraper.*`
+WATSCRAPER_DIR = Path(__file__).resolve().parent.parent / 'watscraper'
+SPIDER_NAMES = ('timetable', 'all_files')
 
 
 def parse_args():
     parser = argparse.ArgumentParser(
         description="""
-        Run one or both spiders: 'timetable' - for scraping timetable data 
+        Run one or both spiders: 'timetable' - for scraping timetable data
         and/or 'all_files' - for scraping data from WAT websites and files.
+        Both spiders run concurrently in this process.
         """
     )
     parser.add_argument(
@@ -32,44 +35,114 @@ def parse_args():
             "'all_files', or 'both'. Defaults to 'both' if not specified."
         ),
     )
+    parser.add_argument(
+        '--target_groups',
+        type=str,
+        default=TARGET_GROUPS,
+        help='Comma-separated group codes for the timetable spider (all groups if empty).',
+    )
+    parser.add_argument(
+        '--rechunk_only',
+        action='store_true',
+        help=(
+            'Rebuild the chunks of every crawled page and file from the extraction cache '
+            '(e.g. after changing chunk settings), without downloading or parsing anything.'
+        ),
+    )
     return parser.parse_args()
 
 
-def main(spider_name: str):
-    # Remove any existing marker file
-    delete_marker_file('scrape.done')
+def rechunk_from_cache(sql_db: SqlDB, batch_size: int = 64) -> dict:
+    """
+    Chunk the cached texts of all documents in document_texts again and replace their chunks.
 
-    # Resolve path to run_scrapy.sh
-    script_path = (Path(__file__).parent / 'run_scrapy.sh').resolve()
-    ensure_executable(script_path)
+    :return: Report with the number of documents, rechunked documents, documents without a
+        cached text and chunks written.
+    """
+    documents = sql_db.fetch_document_texts()
+    report = {'documents': len(documents), 'rechunked': 0, 'missing_texts': 0, 'chunks': 0}
+    for start in range(0, len(documents), batch_size):
+        batch, texts = [], []
+        for document in documents[start : start + batch_size]:
+            text = read_cached_text(document.text_hash, document.extractor_version)
+            if text is None:
+                log_warning(f'No cached text for {document.url}, crawl it again to rechunk it.')
+                report['missing_texts'] += 1
+                continue
+            batch.append(document)
+            texts.append(text)
+        chunk_lists = chunk_documents(texts)
+        sql_db.write_batch(
+            documents=[
+                {
+                    'source_url': document.source_url,
+                    'file_url': document.file_url,
+                    'title': document.title,
+                    'chunks': chunks,
+                }
+                for document, chunks in zip(batch, chunk_lists, strict=True)
+            ]
+        )
+        report['rechunked'] += len(batch)
+        report['chunks'] += sum(len(chunks) for chunks in chunk_lists)
+        log_info(f'Rechunked {min(start + batch_size, len(documents))}/{len(documents)} documents.')
+    return report
 
-    if not script_path.exists():
-        raise FileNotFoundError(f'Cannot find the script: {script_path}')
 
-    if spider_name.lower() == 'timetable':
-        log_info(
-            f"Running spider '{spider_name}' with target groups '{TARGET_GROUPS}' via {script_path}"
-        )
-        with subprocess.Popen([str(script_path), 'both', TARGET_GROUPS]) as process:
-            process.wait()
-    elif spider_name.lower() == 'all_files':
-        log_info(f"Running spider '{spider_name}' via {script_path}")
-        with subprocess.Popen([str(script_path), 'both', TARGET_GROUPS]) as process:
-            process.wait()
+def crawler_process() -> CrawlerProcess:
+    """
+    CrawlerProcess with the watscraper project settings, as `scrapy crawl` would load them.
+    """
+    if str(WATSCRAPER_DIR) not in sys.path:
+        sys.path.insert(0, str(WATSCRAPER_DIR))
+    os.environ.setdefault('SCRAPY_SETTINGS_MODULE', 'watscraper.settings')
+    return CrawlerProcess(get_project_settings())
+
+
+def run_spiders(spider_name: str, target_groups: str = TARGET_GROUPS) -> dict[str, dict]:
+    """
+    Run the selected spiders concurrently on one reactor in this process. The crawlers share
+    one DB writer thread, with its own SQLite connection, and the tokenizer loaded by the
+    pipelines.
+
+    :param spider_name: 'timetable', 'all_files' or 'both'.
+    :param target_groups: Comma-separated group codes for the timetable spider (all if empty).
+    :return: Wall-clock seconds, scraped items and finish reason of every spider.
+    """
+    names = SPIDER_NAMES if spider_name == 'both' else (spider_name,)
+    process = crawler_process()
+    crawlers = {}
+    for name in names:
+        kwargs = {'target_groups': target_groups} if name == 'timetable' else {}
+        log_info(f"Scheduling spider '{name}'" + (f' with {kwargs}' if kwargs else ''))
+        crawlers[name] = process.create_crawler(name)
+        process.crawl(crawlers[name], **kwargs)
+    process.start()
+
+    report = {}
+    for name, crawler in crawlers.items():
+        stats = crawler.stats.get_stats()
+        report[name] = {
+            'seconds': stats.get('elapsed_time_seconds'),
+            'items': stats.get('item_scraped_count', 0),
+            'finish_reason': stats.get('finish_reason'),
+        }
+        log_info(f"Spider '{name}': {report[name]}")
+    return report
+
+
+def main(spider_name: str, rechunk_only: bool = False, target_groups: str = TARGET_GROUPS):
+    # Remove any existing marker file
+    delete_marker_file('scrape.done')
+
+    if rechunk_only:
+        log_info(f'Rechunked documents from the extraction cache: {rechunk_from_cache(SqlDB())}')
     else:
-        # If no spider specified, pass a keyword "both" and the target groups for timetable.
-        log_info(
-            f"""
-            No spider specified -> running both 'timetable' and 'all_files' 
-            spiders with target groups '{TARGET_GROUPS}'.
-            """
-        )
-        with subprocess.Popen([str(script_path), 'both', TARGET_GROUPS]) as process:
-            process.wait()
+        run_spiders(spider_name, target_groups)
 
     create_marker_file('scrape.done')
 
 
 if __name__ == '__main__':
     args = parse_args()
-    main(args.spider_name)
+    main(args.spider_name, rechunk_only=args.rechunk_only, target_groups=args.target_groups)
@@ -1,36 +1,119 @@
+import atexit
 import logging
+import math
+import multiprocessing
+import queue
+import random
 import shutil
-from datetime import datetime
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from multiprocessing.util import Finalize
 from pathlib import Path
 
 import coloredlogs
-import dateparser
 import yaml
 
-from .constants import LLM_RAG_SYSTEM_PROMPT, PROMPTS_FILE
+from .constants import (
+    DATABASE_DIR,
+    DEBUG_SAMPLE_RATE,
+    LLM_RAG_SYSTEM_PROMPT,
+    LOG_LEVEL,
+    PROMPTS_FILE,
+)
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 LOGS_DIR = PROJECT_ROOT / 'logs'
 LOGS_DIR.mkdir(parents=True, exist_ok=True)
 LOG_FILE = LOGS_DIR / 'debug.log'
 
+
+IMMUTABLE_LOG_ARG_TYPES = (str, bytes, int, float, complex, bool, type(None), datetime, Path)
+
+
+def has_immutable_args(args) -> bool:
+    """
+    Whether the %-style arguments of a record cannot change before the listener formats it.
+    """
+    if isinstance(args, tuple):
+        return all(has_immutable_args(arg) for arg in args)
+    return isinstance(args, IMMUTABLE_LOG_ARG_TYPES)
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    Queue handler that leaves formatting to the listener thread.
+
+    QueueHandler formats every record before queueing it, so it can be pickled; records
+    stay in this process here, so the message and its %-style arguments are merged (and the
+    stream and file written) by the listener instead of the logging thread. Records whose
+    arguments are mutable (lists, dicts, other objects) are merged here, so the message shows
+    their value at the time of the call.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.args and not has_immutable_args(record.args):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-file_handler = logging.FileHandler(str(LOG_FILE), mode='w', encoding='utf-8')
+logger.setLevel(LOG_LEVEL)
+# Worker processes (e.g. the extraction pool) append instead of truncating the main log; spawned
+# workers may import this module with the main module, before parent_process() is set, but
+# after they are named
+file_handler = logging.FileHandler(
+    str(LOG_FILE),
+    mode='w' if multiprocessing.current_process().name == 'MainProcess' else 'a',
+    encoding='utf-8',
+)
 file_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
 file_handler.setLevel(logging.DEBUG)
 handler = logging.StreamHandler()
 handler.setFormatter(coloredlogs.ColoredFormatter('%(asctime)s %(levelname)s %(message)s'))
 handler.setLevel(logging.INFO)
-logger.addHandler(handler)
-logger.addHandler(file_handler)
+# Records are written by a background thread, so logging never waits for the disk or terminal
+log_queue: queue.SimpleQueue = queue.SimpleQueue()
+logger.addHandler(LazyQueueHandler(log_queue))
+log_listener = QueueListener(log_queue, handler, file_handler, respect_handler_level=True)
+log_listener.start()
+
+
+def stop_log_listener():
+    """Write the queued records and stop the listener thread; later calls do nothing."""
+    if log_listener._thread is not None:  # pylint: disable=protected-access
+        log_listener.stop()
+
+
+def init_worker_logging():
+    """
+    Initializer of spawned worker processes, e.g. ProcessPoolExecutor(initializer=...):
+    writes the queued records when the worker exits. multiprocessing runs its finalizers in
+    every worker before it exits, whereas atexit handlers depend on how the worker ends.
+    """
+    Finalize(None, stop_log_listener, exitpriority=0)
+
+
+# Write the queued records before the interpreter exits
+atexit.register(stop_log_listener)
 
 
 def log_debug(*args, **kwargs):
-    """Log an debug message."""
+    """Log an debug message; pass arguments %-style, so unused messages are not formatted."""
     logger.debug(*args, **kwargs)
 
 
+def is_debug_enabled() -> bool:
+    """
+    Check before building an expensive debug message. With DEBUG_SAMPLE_RATE below 1 only that
+    fraction of checks pass, so a sampled request or page logs all its guarded messages and the
+    others skip building them.
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return False
+    return DEBUG_SAMPLE_RATE >= 1 or random.random() < DEBUG_SAMPLE_RATE
+
+
 def log_info(*args, **kwargs):
     """Log an info message."""
     logger.info(*args, **kwargs)
@@ -73,6 +156,8 @@ def convert_natural_date_to_iso(raw_date: str) -> str | None:
     """
     if not raw_date:
         return None
+    # Its language data takes a while to load and only chat queries need it
+    import dateparser  # pylint: disable=import-outside-toplevel
 
     today = datetime.today()
     parsed_date = dateparser.parse(raw_date, settings={'RELATIVE_BASE': today})
@@ -80,15 +165,52 @@ def convert_natural_date_to_iso(raw_date: str) -> str | None:
     return parsed_date.strftime('%Y_%m_%d') if parsed_date else None
 
 
+def to_utc(value: datetime | str) -> datetime:
+    """
+    Convert a chunk date or date filter (datetime or its string form) to a naive UTC datetime.
+
+    Naive values are taken as UTC, the time zone of the chunk dates SQLite stores with
+    CURRENT_TIMESTAMP; aware values are converted. The lexical and vector backends compare
+    dates in this form, so they filter a date range the same way.
+    """
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(str(value))
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Return the q-th percentile (0-100) of values using the nearest-rank method."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize_latencies(latencies: list[float]) -> dict[str, float]:
+    """
+    Summarize latencies given in seconds as mean and p50/p95/p99 in milliseconds.
+    """
+    return {
+        'count': len(latencies),
+        'mean_ms': 1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+        'p50_ms': 1000 * percentile(latencies, 50),
+        'p95_ms': 1000 * percentile(latencies, 95),
+        'p99_ms': 1000 * percentile(latencies, 99),
+    }
+
+
 def delete_marker_file(filename: str):
-    marker_path = Path('databases') / 'healthcheck' / filename
+    marker_path = DATABASE_DIR / 'healthcheck' / filename
     if marker_path.exists():
         marker_path.unlink()
         log_info(f'Removed old marker file: {marker_path}')
 
 
 def create_marker_file(filename: str):
-    marker_path = Path('databases') / 'healthcheck' / filename
+    marker_path = DATABASE_DIR / 'healthcheck' / filename
     marker_path.parent.mkdir(parents=True, exist_ok=True)
     marker_path.write_text('Script finished his work successfully')
     log_info(f'Marker file created at {marker_path}')
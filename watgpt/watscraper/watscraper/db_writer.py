@@ -0,0 +1,412 @@
+import queue
+import threading
+import time
+import weakref
+from collections import deque
+
+from twisted.internet.defer import Deferred, succeed
+from twisted.internet.threads import deferToThread
+
+from watgpt.db.sql_db import SqlDB
+from watgpt.utils import log_info, log_warning
+
+from .telemetry import IngestionTelemetry, call_in_reactor
+
+ROW_KINDS = ('groups', 'lessons', 'chunks', 'documents', 'manifest', 'timetables', 'calendars')
+# Seconds to wait before retrying a failed batch, one entry per retry (e.g. database is locked)
+RETRY_DELAYS = (0.5, 2.0)
+# Put on the queue by close() to make the writer thread flush and exit
+_STOP = object()
+
+
+def row_names(batch: dict[str, list], limit: int = 5) -> list[str]:
+    """URLs (or group codes) of the rows of a failed write, for the log."""
+    names = []
+    for kind, rows in batch.items():
+        for row in rows:
+            if isinstance(row, dict):
+                keys = ('file_url', 'source_url', 'url', 'group_code', 'source')
+                row = next((row[key] for key in keys if row.get(key)), kind)
+            names.append(str(row))
+    return names[:limit] + ([f'{len(names) - limit} more'] if len(names) > limit else [])
+
+
+class CrawlerWriter:
+    """
+    A crawler's handle on the shared DBWriter (see DBWriter.for_crawler). Rows queued through
+    the handle are accounted in its own stats and telemetry (rows written, batches, rows/sec,
+    retries, failed rows, full-queue waits and the db_write stage), so every crawler reports
+    its own rows, whichever crawler created the writer.
+    """
+
+    def __init__(
+        self,
+        writer: 'DBWriter',
+        stats=None,
+        telemetry: IngestionTelemetry | None = None,
+        crawler=None,
+    ):
+        self.writer = writer
+        self.stats = stats
+        self.telemetry = telemetry
+        self.crawler = crawler
+        # Written by the writer thread only
+        self.rows_written = 0
+        self.write_seconds = 0.0
+
+    @property
+    def sql_db(self) -> SqlDB:
+        return self.writer.sql_db
+
+    @property
+    def indexer(self):
+        return self.writer.indexer
+
+    def open(self):
+        self.writer.open()
+
+    def close(self) -> Deferred:
+        return self.writer.close()
+
+    def attach_indexer(self, indexer):
+        self.writer.attach_indexer(indexer)
+
+    def put(self, kind: str, row) -> Deferred:
+        """Queue a row for writing (see DBWriter.put)."""
+        return self.put_unit({kind: [row]})
+
+    def put_unit(self, rows: dict[str, list]) -> Deferred:
+        """Queue rows written in the same transaction (see DBWriter.put_unit)."""
+        return self.writer.enqueue(rows, self)
+
+    def record_write(self, seconds: float, rows: int):
+        """
+        Account rows of this handle written by a batch, with their share of its time (writer
+        thread; the stats are updated in the reactor thread).
+        """
+        self.rows_written += rows
+        self.write_seconds += seconds
+        rows_per_sec = self.rows_written / self.write_seconds if self.write_seconds else None
+        call_in_reactor(self._publish_write, seconds, rows, rows_per_sec)
+
+    def _publish_write(self, seconds: float, rows: int, rows_per_sec: float | None):
+        if self.telemetry is not None:
+            self.telemetry.record('db_write', seconds, rows)
+        if self.stats is not None:
+            self.stats.inc_value('db_writer/rows_written', rows)
+            self.stats.inc_value('db_writer/batches')
+            if rows_per_sec is not None:
+                self.stats.set_value('db_writer/rows_per_sec', rows_per_sec)
+
+    def inc_stat(self, key: str, count: int = 1):
+        """Increment a stat of this handle; thread-safe (see call_in_reactor)."""
+        if self.stats is not None:
+            call_in_reactor(self.stats.inc_value, key, count)
+
+
+class DBWriter:
+    """
+    Single writer thread that stores rows produced by the crawler pipelines.
+
+    Pipelines enqueue rows with put(), or rows that must be committed together (a document's
+    chunks and its manifest entry) with put_unit(); the thread collects up to batch_size rows
+    (or what arrived within flush_interval seconds) and writes them in one transaction with
+    SqlDB.write_batch. A failed batch is retried after RETRY_DELAYS, then split in halves
+    down to single units, so one bad row only loses its own unit.
+
+    The queue is bounded. put() never blocks the reactor: while the queue is full, it returns
+    a Deferred firing once the rows are queued, and pipelines return it from process_item, so
+    Scrapy stops feeding them items until the database catches up.
+
+    One writer is shared by all pipelines of a crawler, and by all crawlers running at the
+    same time in one process; each crawler queues its rows through its own CrawlerWriter
+    handle (see for_crawler), which accounts them in its stats. Every pipeline calls open() in
+    open_spider and close() in close_spider; the last close() flushes the queue and stops the
+    thread.
+
+    With an attached StreamingIndexer (see StreamingIndexPipeline), every batch that stored
+    chunks is reported to the indexer, which embeds them while the crawl goes on. When the
+    indexer falls behind, it pauses the engines of the writer's crawlers (see throttle)
+    instead of blocking the writer thread.
+
+    The time of every written batch is recorded in the db_write stage of the telemetry, divided
+    over the batch's rows. Rows queued with put() and put_unit() on the writer itself are
+    accounted in the stats and telemetry it was created with.
+    """
+
+    _writers: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+    # Writer of the crawlers currently running in this process
+    _running: 'DBWriter | None' = None
+
+    def __init__(
+        self,
+        sql_db: SqlDB,
+        stats=None,
+        batch_size: int = 500,
+        max_queue_size: int = 10000,
+        flush_interval: float = 1.0,
+        telemetry: IngestionTelemetry | None = None,
+    ):
+        self.sql_db = sql_db
+        self.stats = stats
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        # Units (with their Deferreds) waiting for space in the queue, only used by the reactor
+        self.waiting: deque[tuple[object, Deferred]] = deque()
+        self.users = 0
+        self.closed = False
+        self.rows_written = 0
+        self.write_seconds = 0.0
+        self.indexer = None
+        self.telemetry = telemetry
+        # Handles of rows queued on the writer itself and of every crawler using it
+        self.default_client = CrawlerWriter(self, stats, telemetry)
+        self.clients: list[CrawlerWriter] = [self.default_client]
+        # Reasons the crawlers' engines are paused for (reactor only)
+        self.throttled_by: set[str] = set()
+        self.thread = threading.Thread(target=self._run, name='DBWriter', daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def for_crawler(cls, crawler) -> CrawlerWriter:
+        """
+        Return the crawler's handle on the shared writer. Crawlers started while another
+        crawler's writer is open (spiders run concurrently by scripts/scrape.py) join that
+        writer, so all rows go through one SQLite connection; otherwise a writer is created
+        from the crawler settings. The rows of each crawler are reported in its own stats and
+        telemetry; the queue depth and crawl pauses in those of every crawler.
+        """
+        if crawler not in cls._writers:
+            if cls._running is None or cls._running.closed:
+                settings = crawler.settings
+                cls._running = cls(
+                    SqlDB(),
+                    batch_size=settings.getint('DB_WRITER_BATCH_SIZE', 500),
+                    max_queue_size=settings.getint('DB_WRITER_QUEUE_SIZE', 10000),
+                    flush_interval=settings.getfloat('DB_WRITER_FLUSH_INTERVAL', 1.0),
+                )
+            client = CrawlerWriter(
+                cls._running, crawler.stats, IngestionTelemetry.for_crawler(crawler), crawler
+            )
+            cls._running.clients.append(client)
+            cls._writers[crawler] = client
+        return cls._writers[crawler]
+
+    def open(self):
+        self.users += 1
+
+    def attach_indexer(self, indexer):
+        """
+        Report stored chunks to a StreamingIndexer, which is closed with the writer and
+        throttles the crawl while it is behind.
+        """
+        self.indexer = indexer
+        indexer.throttle = lambda paused: self.throttle('streaming_index', paused)
+
+    def throttle(self, reason: str, paused: bool):
+        """
+        Pause or resume the engines of the writer's crawlers; thread-safe. The crawl stays
+        paused while any reason holds. Paused engines schedule no new requests, so downloads
+        and items stop until unpaused (picked up on the engine's next heartbeat).
+
+        :param reason: What asks for the pause, e.g. 'streaming_index'.
+        :param paused: Whether that reason now holds.
+        """
+        from twisted.internet import reactor  # pylint: disable=import-outside-toplevel
+
+        reactor.callFromThread(self._throttle, reason, paused)
+
+    def _throttle(self, reason: str, paused: bool):
+        was_paused = bool(self.throttled_by)
+        if paused:
+            self.throttled_by.add(reason)
+        else:
+            self.throttled_by.discard(reason)
+        if bool(self.throttled_by) == was_paused:
+            return
+        if paused:
+            self._inc_writer_stat('db_writer/crawl_pauses')
+        for client in self.clients:
+            crawler = client.crawler
+            if crawler is None or crawler.engine is None or not crawler.crawling:
+                continue
+            if self.throttled_by:
+                crawler.engine.pause()
+            else:
+                crawler.engine.unpause()
+
+    def close(self) -> Deferred:
+        """
+        Release the writer; the last user flushes all queued rows and stops the thread.
+
+        :return: Deferred firing once the rows are written.
+        """
+        self.users -= 1
+        if self.users > 0:
+            return succeed(None)
+        self.closed = True
+        return self._enqueue(_STOP, self.default_client).addCallback(
+            lambda _: deferToThread(self.thread.join)
+        )
+
+    def put(self, kind: str, row) -> Deferred:
+        """
+        Queue a row for writing.
+
+        :param kind: One of ROW_KINDS, the SqlDB.write_batch argument the row belongs to.
+        :param row: Group code, or a lesson / chunk / document / manifest / timetable /
+            calendar dict (see SqlDB.write_batch).
+        :return: Deferred firing once the row is queued, at once unless the queue is full.
+        """
+        return self.default_client.put(kind, row)
+
+    def put_unit(self, rows: dict[str, list]) -> Deferred:
+        """
+        Queue rows that are always written in the same transaction, e.g. a document and its
+        manifest entry, so a failed write never stores only some of them.
+
+        :param rows: Rows by kind (see put).
+        :return: Deferred firing once the rows are queued, at once unless the queue is full.
+        """
+        return self.default_client.put_unit(rows)
+
+    def enqueue(self, rows: dict[str, list], client: CrawlerWriter) -> Deferred:
+        """Queue a unit of rows accounted to a client (see CrawlerWriter.put_unit)."""
+        return self._enqueue(rows, client)
+
+    def _enqueue(self, rows, client: CrawlerWriter) -> Deferred:
+        entry = (rows, client)
+        # Units queue up behind earlier waiting ones, so rows are written in put() order
+        if not self.waiting:
+            try:
+                self.queue.put_nowait(entry)
+                return succeed(None)
+            except queue.Full:
+                pass
+        deferred: Deferred = Deferred()
+        self.waiting.append((entry, deferred))
+        client.inc_stat('db_writer/full_queue_waits')
+        return deferred
+
+    def _admit_waiting(self):
+        """Move waiting units into the queue as long as it has space (reactor thread)."""
+        while self.waiting:
+            entry, deferred = self.waiting[0]
+            try:
+                self.queue.put_nowait(entry)
+            except queue.Full:
+                return
+            self.waiting.popleft()
+            deferred.callback(None)
+
+    def _collect(self) -> tuple[list[tuple[dict[str, list], CrawlerWriter]], bool]:
+        """
+        Wait for rows and collect one batch.
+
+        :return: Tuple of (units of rows by kind with their clients, whether close() was
+            requested).
+        """
+        units: list[tuple[dict[str, list], CrawlerWriter]] = []
+        entry = self.queue.get()
+        deadline = time.monotonic() + self.flush_interval
+        size = 0
+        while entry[0] is not _STOP:
+            units.append(entry)
+            size += sum(len(rows) for rows in entry[0].values())
+            if size >= self.batch_size:
+                return units, False
+            try:
+                entry = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                return units, False
+        return units, True
+
+    def _write_units(
+        self, units: list[tuple[dict[str, list], CrawlerWriter]], retry_delays=RETRY_DELAYS
+    ) -> list[tuple[dict[str, list], CrawlerWriter]]:
+        """
+        Write units in one transaction, retrying after retry_delays; if that keeps failing,
+        write each half on its own, down to single units, which are dropped if they fail.
+
+        :return: The units written.
+        """
+        batch: dict[str, list] = {kind: [] for kind in ROW_KINDS}
+        for rows_by_kind, _ in units:
+            for kind, rows in rows_by_kind.items():
+                batch[kind].extend(rows)
+        clients = {id(client): client for _, client in units}.values()
+        for delay in (*retry_delays, None):
+            try:
+                self.sql_db.write_batch(**batch)
+                return units
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                error = e
+            if delay is not None:
+                for client in clients:
+                    client.inc_stat('db_writer/retries')
+                time.sleep(delay)
+        if len(units) > 1:
+            middle = len(units) // 2
+            return self._write_units(units[:middle], ()) + self._write_units(units[middle:], ())
+        size = sum(len(rows) for rows in batch.values())
+        log_warning(f'Failed to write {size} rows ({", ".join(row_names(batch))}): {error}')
+        units[0][1].inc_stat('db_writer/failed_rows', size)
+        return []
+
+    def _write(self, units: list[tuple[dict[str, list], CrawlerWriter]]):
+        if not units:
+            return
+        start = time.perf_counter()
+        written = self._write_units(units)
+        if not written:
+            return
+        seconds = time.perf_counter() - start
+        # Rows written per client; the batch time is divided over all its rows
+        client_rows: dict[int, tuple[CrawlerWriter, int]] = {}
+        for rows_by_kind, client in written:
+            _, count = client_rows.get(id(client), (client, 0))
+            client_rows[id(client)] = (client, count + sum(map(len, rows_by_kind.values())))
+        size = sum(count for _, count in client_rows.values())
+        self.write_seconds += seconds
+        self.rows_written += size
+        for client, count in client_rows.values():
+            client.record_write(seconds * count / size, count)
+        num_chunks = sum(
+            len(rows.get('chunks', [])) + sum(len(d['chunks']) for d in rows.get('documents', []))
+            for rows, _ in written
+        )
+        if self.indexer is not None and num_chunks:
+            self.indexer.notify(num_chunks)
+
+    def _inc_writer_stat(self, key: str, count: int = 1):
+        """Increment a stat of the writer as a whole in the stats of every client."""
+        for client in self.clients:
+            client.inc_stat(key, count)
+
+    def _set_queue_depth(self):
+        # Clients are added and stats updated in the reactor thread
+        call_in_reactor(self._publish_queue_depth, self.queue.qsize())
+
+    def _publish_queue_depth(self, depth: int):
+        for client in self.clients:
+            if client.stats is not None:
+                client.stats.set_value('db_writer/queue_depth', depth)
+                client.stats.max_value('db_writer/max_queue_depth', depth)
+
+    def _run(self):
+        from twisted.internet import reactor  # pylint: disable=import-outside-toplevel
+
+        stopping = False
+        while not stopping:
+            # Backlog waiting for the writer each time it becomes free
+            self._set_queue_depth()
+            units, stopping = self._collect()
+            # The batch freed space in the queue; scheduled after every batch, as the reactor
+            # may be adding a waiting unit right now
+            reactor.callFromThread(self._admit_waiting)
+            self._write(units)
+        self._set_queue_depth()
+        log_info(f'DB writer stored {self.rows_written} rows in {self.write_seconds:.2f}s')
+        if self.indexer is not None:
+            self.indexer.close()
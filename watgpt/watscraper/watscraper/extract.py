@@ -1,11 +1,25 @@
+import gzip
+import hashlib
+import os
 import re
+import tempfile
+import time
+from collections.abc import Iterator
 from pathlib import Path
+from typing import BinaryIO
 
-import pymupdf4llm
+import fitz
 
-from watgpt.utils import log_info
+from watgpt.constants import EXTRACTION_CACHE_DIR
+from watgpt.utils import log_debug
+from watgpt.watscraper.watscraper.text_chunker import chunk_document
 
-from .read_calendar_pdf import extract_calendar_text
+from .extractors import PDF, ExtractionContext, extract_text, register_extractor
+from .read_calendar_pdf import extract_calendar, extract_calendar_text
+
+# Bump when an extractor's output changes, so cached texts of files are extracted again
+EXTRACTOR_VERSION = 2
+HASH_BLOCK_BYTES = 1024 * 1024
 
 
 def normalize_newlines(text: str) -> str:
@@ -15,43 +29,180 @@ def normalize_newlines(text: str) -> str:
     return re.sub(r'\n+', '\n', text)
 
 
-def markdown_pdf_reader(pdf_path: str) -> str:
+def is_calendar_pdf(pdf_path: str | Path) -> bool:
+    """Whether the file name indicates an academic calendar PDF."""
+    return 'organizacja_zajec_w_roku_akademickim' in Path(pdf_path).name.lower()
+
+
+def markdown_pdf_pages(doc: fitz.Document, context: ExtractionContext) -> Iterator[str]:
     """
-    Converts the given PDF to Markdown text using pymupdf4llm.
-    You can adjust parameters (e.g. write_images, dpi) if needed.
+    Convert an opened PDF to Markdown page by page, checking the context's time limit before
+    every page. Heading levels are computed once from the font sizes of the whole document.
     """
-    try:
-        # For a basic conversion of all pages:
-        md_text = pymupdf4llm.to_markdown(pdf_path)
-        return normalize_newlines(md_text)
-    except OSError as e:
-        log_info(f'Error processing {pdf_path} with pymupdf4llm: {e}')
-        return ''
+    import pymupdf4llm  # pylint: disable=import-outside-toplevel
 
+    headers = pymupdf4llm.IdentifyHeaders(doc)
+    for page in range(doc.page_count):
+        context.check_time()
+        md_text = pymupdf4llm.to_markdown(doc, pages=[page], hdr_info=headers, show_progress=False)
+        yield normalize_newlines(md_text).strip('\n')
 
-def extract_text_from_pdf(pdf_path: str) -> str:
+
+@register_extractor(PDF)
+def extract_pdf(stream: BinaryIO, name: str, context: ExtractionContext):
     """
-    Use the custom calendar extractor if the filename indicates a calendar;
-    otherwise, convert the PDF to Markdown.
+    Calendar PDFs on disk go through extract_calendar_text as one block; other PDFs are
+    converted page by page. PDFs inside archives are opened from memory.
     """
-    path_obj = Path(pdf_path)
-    filename_lower = path_obj.name.lower()
-    if 'organizacja_zajec_w_roku_akademickim' in filename_lower:
-        return extract_calendar_text(str(path_obj))
-    return markdown_pdf_reader(str(path_obj))
+    # Only the downloaded file itself is read from disk (see ExtractionContext.path), never
+    # an archive member, whatever its name
+    if context.path is not None and name == str(context.path):
+        if is_calendar_pdf(name):
+            yield extract_calendar_text(name)
+            return
+        doc = fitz.open(name)
+    else:
+        doc = fitz.open(stream=context.read(stream), filetype='pdf')
+    with doc:
+        yield from markdown_pdf_pages(doc, context)
 
 
-def extract_text_from_file(filepath: str) -> str:
+def extract_text_from_file(filepath: str, context: ExtractionContext | None = None) -> str:
     """
-    Extract text from a file based on its extension.
-    Currently supports PDF files.
+    Extract text from a file with the extractor registered for its type (see extractors.py):
+    PDF, Office Open XML and OpenDocument files, RTF, CSV, plain text and zip/tar/gzip
+    archives. Unsupported files give ''.
+
+    :param context: Extraction limits; afterwards it tells whether the text is complete.
     """
     path_obj = Path(filepath)
 
     if not path_obj.exists():
         return ''
+    return extract_text(path_obj, context)
+
+
+def file_sha256(filepath: str | Path) -> str:
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        while block := f.read(HASH_BLOCK_BYTES):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def text_sha256(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def cached_text_path(
+    digest: str, extractor_version: int | None, cache_dir: str = EXTRACTION_CACHE_DIR
+) -> Path:
+    """
+    Cache file of a text: files are keyed by their SHA-256 and EXTRACTOR_VERSION, page texts
+    (extractor_version None) by their SHA-256 only.
+    """
+    name = digest if extractor_version is None else f'{digest}-v{extractor_version}'
+    return Path(cache_dir) / digest[:2] / f'{name}.txt.gz'
+
+
+def read_cached_text(
+    digest: str, extractor_version: int | None, cache_dir: str = EXTRACTION_CACHE_DIR
+) -> str | None:
+    path = cached_text_path(digest, extractor_version, cache_dir)
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return f.read()
+    except (OSError, EOFError):
+        return None
 
-    ext_lower = path_obj.suffix.lower()
-    if ext_lower == '.pdf':
-        return extract_text_from_pdf(str(path_obj))
-    return ''
+
+def write_cached_text(
+    digest: str, extractor_version: int | None, text: str, cache_dir: str = EXTRACTION_CACHE_DIR
+):
+    """
+    Store a text in the cache; the file is written under a temporary name and renamed, so
+    extraction workers writing the same entry never leave a partial file behind.
+    """
+    path = cached_text_path(digest, extractor_version, cache_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with (
+        tempfile.NamedTemporaryFile(dir=path.parent, suffix='.tmp', delete=False) as tmp,
+        gzip.GzipFile(fileobj=tmp, mode='wb', mtime=0) as f,
+    ):
+        f.write(text.encode('utf-8'))
+    os.replace(tmp.name, path)
+
+
+def extract_text_cached(filepath: str) -> tuple[str, str, bool]:
+    """
+    Extract text from a file, reusing the text cached for identical file contents. Only
+    complete, non-empty texts are cached: a text cut at a limit or by a malformed part, and
+    the '' of unsupported or failed files, are extracted again next time.
+
+    :return: Tuple of (file SHA-256, extracted text, whether the text is complete).
+    """
+    digest = file_sha256(filepath)
+    text = read_cached_text(digest, EXTRACTOR_VERSION)
+    if text is not None:
+        log_debug('Extracted text of %s found in cache', filepath)
+        return digest, text, True
+    context = ExtractionContext()
+    text = extract_text_from_file(filepath, context)
+    if text and context.complete:
+        write_cached_text(digest, EXTRACTOR_VERSION, text)
+    else:
+        log_debug('Not caching the incomplete or empty text of %s', filepath)
+    return digest, text, context.complete
+
+
+def extract_and_chunk(filepath: str) -> tuple[str, list[str], dict]:
+    """
+    Extract text from a file (through the extraction cache) and chunk it (see
+    CHUNKING_STRATEGY). Runs in the extraction process pool of CustomFilesPipeline.
+
+    :return: Tuple of (file SHA-256, chunks, telemetry): telemetry holds the file's bytes,
+        the extraction_seconds (including the cache lookup) and chunking_seconds, and whether
+        the text is complete.
+    """
+    start = time.perf_counter()
+    digest, text, complete = extract_text_cached(filepath)
+    extracted = time.perf_counter()
+    chunks = chunk_document(text)
+    return (
+        digest,
+        chunks,
+        {
+            'bytes': os.path.getsize(filepath),
+            'extraction_seconds': extracted - start,
+            'chunking_seconds': time.perf_counter() - extracted,
+            'complete': complete,
+        },
+    )
+
+
+def extract_calendar_and_chunk(filepath: str) -> tuple[str, list[str], dict, list[dict]]:
+    """
+    Parse a calendar PDF once for both its chunks and its events (see extract_calendar);
+    runs in the extraction process pool of CustomFilesPipeline instead of extract_and_chunk.
+    The text is written to the extraction cache, as extract_and_chunk would.
+
+    :return: Tuple of (file SHA-256, chunks, telemetry, event dicts), see extract_and_chunk.
+    """
+    start = time.perf_counter()
+    digest = file_sha256(filepath)
+    text, events = extract_calendar(filepath)
+    if text:
+        write_cached_text(digest, EXTRACTOR_VERSION, text)
+    extracted = time.perf_counter()
+    chunks = chunk_document(text)
+    return (
+        digest,
+        chunks,
+        {
+            'bytes': os.path.getsize(filepath),
+            'extraction_seconds': extracted - start,
+            'chunking_seconds': time.perf_counter() - extracted,
+            'complete': True,
+        },
+        events,
+    )
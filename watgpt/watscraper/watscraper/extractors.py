@@ -0,0 +1,611 @@
+import csv
+import gzip
+import io
+import re
+import tarfile
+import time
+import zipfile
+import zlib
+from collections.abc import Callable, Collection, Iterator
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO
+from xml.etree import ElementTree
+from xml.etree.ElementTree import iterparse
+
+from watgpt.constants import (
+    ARCHIVE_MAX_DEPTH,
+    ARCHIVE_MAX_MEMBERS,
+    EXTRACTION_MAX_FILE_BYTES,
+    EXTRACTION_MAX_SECONDS,
+    EXTRACTION_MAX_TEXT_CHARS,
+)
+from watgpt.utils import log_debug, log_warning
+
+PDF = 'application/pdf'
+DOCX = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+PPTX = 'application/vnd.openxmlformats-officedocument.presentationml.presentation'
+ODT = 'application/vnd.oasis.opendocument.text'
+ODS = 'application/vnd.oasis.opendocument.spreadsheet'
+ODP = 'application/vnd.oasis.opendocument.presentation'
+RTF = 'application/rtf'
+CSV = 'text/csv'
+TXT = 'text/plain'
+ZIP = 'application/zip'
+TAR = 'application/x-tar'
+GZIP = 'application/gzip'
+EXTENSION_MIME_TYPES = {
+    'pdf': PDF,
+    'doc': 'application/msword',
+    'docx': DOCX,
+    'odt': ODT,
+    'rtf': RTF,
+    'txt': TXT,
+    'xls': 'application/vnd.ms-excel',
+    'xlsx': XLSX,
+    'ods': ODS,
+    'csv': CSV,
+    'ppt': 'application/vnd.ms-powerpoint',
+    'pptx': PPTX,
+    'odp': ODP,
+    'zip': ZIP,
+    'rar': 'application/vnd.rar',
+    '7z': 'application/x-7z-compressed',
+    'tar': TAR,
+    'gz': GZIP,
+}
+# Leading bytes of binary formats; these formats are recognized by content only
+MAGIC_SIGNATURES = (
+    (b'%PDF-', PDF),
+    (b'PK\x03\x04', ZIP),
+    (b'\x1f\x8b', GZIP),
+    (b'{\\rtf', RTF),
+    (b'7z\xbc\xaf\x27\x1c', 'application/x-7z-compressed'),
+    (b'Rar!\x1a\x07', 'application/vnd.rar'),
+    # OLE2 compound file of legacy Office formats, told apart by the extension below
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', None),
+)
+# Formats without a signature, taken from the extension when the content looks like text
+TEXT_MIME_TYPES = (TXT, CSV)
+# Parts that identify the document type inside an Office Open XML package
+OOXML_PARTS = (
+    ('word/document.xml', DOCX),
+    ('xl/workbook.xml', XLSX),
+    ('ppt/presentation.xml', PPTX),
+)
+SNIFF_BYTES = 4096
+READ_BLOCK_BYTES = 1024 * 1024
+CSV_SNIFF_CHARS = 16384
+
+W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+S = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+A = '{http://schemas.openxmlformats.org/drawingml/2006/main}'
+R = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+PACKAGE_REL = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+ODF_TEXT = '{urn:oasis:names:tc:opendocument:xmlns:text:1.0}'
+ODF_TABLE = '{urn:oasis:names:tc:opendocument:xmlns:table:1.0}'
+# Word heading styles: 'Heading1' in English, 'Nagwek1' in Polish templates
+DOCX_HEADING_STYLE = re.compile(r'(?:heading|nag\w*wek)\s*(\d)', re.IGNORECASE)
+PPTX_SLIDE_PART = re.compile(r'ppt/slides/slide(\d+)\.xml')
+RTF_TOKEN = re.compile(
+    r"\\'([0-9a-f]{2})|\\u(-?\d+)\??|\\([a-z]+)(-?\d+)? ?|\\([^a-z])|([{}])|([^\\{}\r\n]+)",
+    re.IGNORECASE,
+)
+RTF_IGNORED_DESTINATIONS = {
+    'fonttbl',
+    'colortbl',
+    'stylesheet',
+    'info',
+    'pict',
+    'header',
+    'footer',
+    'fldinst',
+    'listtable',
+    'listoverridetable',
+    'rsidtbl',
+    'themedata',
+    'colorschememapping',
+    'latentstyles',
+    'datastore',
+}
+# Errors of malformed files and archive members: ElementTree.ParseError is a SyntaxError,
+# csv.Error, zlib.error and BadZipFile are plain Exceptions, missing parts and shared strings
+# raise KeyError/IndexError and PyMuPDF raises RuntimeError subclasses
+EXTRACTION_ERRORS = (
+    OSError,
+    EOFError,
+    ValueError,
+    KeyError,
+    IndexError,
+    SyntaxError,
+    RuntimeError,
+    csv.Error,
+    zlib.error,
+    zipfile.BadZipFile,
+    tarfile.TarError,
+)
+RTF_BREAKS = {'par': '\n', 'line': '\n', 'row': '\n', 'sect': '\n', 'tab': '\t', 'cell': ' | '}
+
+Extractor = Callable[[BinaryIO, str, 'ExtractionContext'], Iterator[str]]
+EXTRACTORS: dict[str, Extractor] = {}
+
+
+class ExtractionLimitError(Exception):
+    """Extraction of a file ran into one of the ExtractionContext limits."""
+
+
+class FileTooLargeError(ExtractionLimitError):
+    """A file or archive member is larger than max_file_bytes."""
+
+
+class ExtractionContext:
+    def __init__(
+        self,
+        max_file_bytes: int = EXTRACTION_MAX_FILE_BYTES,
+        max_text_chars: int = EXTRACTION_MAX_TEXT_CHARS,
+        max_seconds: float = EXTRACTION_MAX_SECONDS,
+        max_archive_members: int = ARCHIVE_MAX_MEMBERS,
+        max_archive_depth: int = ARCHIVE_MAX_DEPTH,
+    ):
+        """
+        Limits shared by the extraction of one downloaded file, including archive members.
+        Whatever the extraction leaves out is recorded in `skipped`, so callers can tell a
+        complete text from one cut at a limit or by a malformed file or member.
+
+        :param max_file_bytes: Files and archive members above this size are skipped.
+        :param max_text_chars: Extraction stops once this much text was produced.
+        :param max_seconds: Extraction stops after this time, checked between text blocks
+            (paragraphs, rows, PDF pages and archive members).
+        :param max_archive_members: Members extracted per archive.
+        :param max_archive_depth: Levels of archives nested in archives that are opened.
+        """
+        self.max_file_bytes = max_file_bytes
+        self.max_text_chars = max_text_chars
+        self.max_seconds = max_seconds
+        self.max_archive_members = max_archive_members
+        self.max_archive_depth = max_archive_depth
+        self.deadline = time.monotonic() + max_seconds
+        self.depth = 0
+        self.skipped: list[str] = []
+        # The downloaded file being extracted, set by extract_text; extractors that can read
+        # from disk do so only for this name, archive members are always read from the stream
+        self.path: Path | None = None
+
+    @property
+    def complete(self) -> bool:
+        """Whether no limit was reached and no file or archive member was skipped."""
+        return not self.skipped
+
+    def skip(self, message: str):
+        """Log and record a limit reached or a part of the file left out of the text."""
+        log_warning(message)
+        self.skipped.append(message)
+
+    def check_time(self):
+        if time.monotonic() > self.deadline:
+            raise ExtractionLimitError(f'time limit of {self.max_seconds}s reached')
+
+    def read(self, stream: BinaryIO) -> bytes:
+        """Read a whole stream of unknown size, up to max_file_bytes."""
+        # Reading in blocks avoids allocating max_file_bytes up front
+        data = bytearray()
+        while block := stream.read(READ_BLOCK_BYTES):
+            data += block
+            if len(data) > self.max_file_bytes:
+                raise FileTooLargeError(f'more than {self.max_file_bytes} bytes')
+        return bytes(data)
+
+
+def register_extractor(*mime_types: str):
+    """
+    Register a generator function (stream, name, context) -> text blocks for MIME types.
+    """
+
+    def register(extractor: Extractor) -> Extractor:
+        for mime_type in mime_types:
+            EXTRACTORS[mime_type] = extractor
+        return extractor
+
+    return register
+
+
+def sniff_mime_type(stream: BinaryIO, name: str) -> str | None:
+    """
+    Detect the type of a seekable stream from its leading bytes; the extension is only used
+    for legacy Office files and text formats.
+    """
+    header = stream.read(SNIFF_BYTES)
+    stream.seek(0)
+    extension = PurePosixPath(name).suffix.lower().lstrip('.')
+    for signature, mime_type in MAGIC_SIGNATURES:
+        if header.startswith(signature):
+            if mime_type == ZIP:
+                return zip_container_type(stream)
+            return mime_type or EXTENSION_MIME_TYPES.get(extension)
+    if header[257:262] == b'ustar':
+        return TAR
+    mime_type = EXTENSION_MIME_TYPES.get(extension)
+    if mime_type in TEXT_MIME_TYPES and b'\x00' not in header:
+        return mime_type
+    return None
+
+
+def zip_container_type(stream: BinaryIO) -> str:
+    """Tell Office Open XML and OpenDocument files apart from plain zip archives."""
+    try:
+        with zipfile.ZipFile(stream) as archive:
+            names = set(archive.namelist())
+            if 'mimetype' in names:
+                mime_type = archive.read('mimetype').decode('ascii', 'replace').strip()
+                if mime_type in (ODT, ODS, ODP):
+                    return mime_type
+            for part, mime_type in OOXML_PARTS:
+                if part in names:
+                    return mime_type
+            return ZIP
+    except zipfile.BadZipFile:
+        return ZIP
+    finally:
+        stream.seek(0)
+
+
+def extract_stream(stream: BinaryIO, name: str, context: ExtractionContext) -> Iterator[str]:
+    """
+    Yield text blocks of a seekable stream with the extractor registered for its type.
+    """
+    mime_type = sniff_mime_type(stream, name)
+    extractor = EXTRACTORS.get(mime_type) if mime_type else None
+    if extractor is None:
+        log_debug('No extractor for %s (%s)', name, mime_type or 'unknown type')
+        return
+    log_debug('Extracting %s as %s', name, mime_type)
+    yield from extractor(stream, name, context)
+
+
+def extract_text(filepath: str | Path, context: ExtractionContext | None = None) -> str:
+    """
+    Extract the text of a downloaded file within the context's size, text and time limits.
+
+    :return: Extracted text, cut at the limit that was reached or at the error of a malformed
+        file (see ExtractionContext.complete); '' for unsupported files.
+    """
+    context = context or ExtractionContext()
+    path = Path(filepath)
+    if path.stat().st_size > context.max_file_bytes:
+        context.skip(f'Skipping {path.name}, larger than {context.max_file_bytes} bytes')
+        return ''
+
+    context.path = path
+    blocks: list[str] = []
+    chars = 0
+    with path.open('rb') as stream:
+        try:
+            for block in extract_stream(stream, str(path), context):
+                if not block:
+                    continue
+                if chars + len(block) > context.max_text_chars:
+                    blocks.append(block[: context.max_text_chars - chars])
+                    raise ExtractionLimitError(f'text limit of {context.max_text_chars} reached')
+                blocks.append(block)
+                chars += len(block) + 1
+                context.check_time()
+        except ExtractionLimitError as e:
+            context.skip(f'Stopped extracting {path.name}: {e}')
+        except EXTRACTION_ERRORS as e:
+            # A malformed file keeps the text extracted before the error
+            context.skip(f'Error extracting {path.name}: {e!r}')
+    return '\n'.join(blocks)
+
+
+def text_reader(stream: BinaryIO) -> io.TextIOWrapper:
+    """Decode a text file as UTF-8 if its beginning is valid UTF-8, else as Windows-1250."""
+    header = stream.read(SNIFF_BYTES)
+    stream.seek(0)
+    try:
+        header.decode('utf-8')
+        encoding = 'utf-8-sig'
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut at the end of the header is still valid UTF-8
+        encoding = 'utf-8-sig' if e.start >= len(header) - 3 else 'cp1250'
+    return io.TextIOWrapper(stream, encoding=encoding, errors='replace', newline='')
+
+
+@register_extractor(TXT)
+def extract_plain_text(stream: BinaryIO, _name: str, _context: ExtractionContext):
+    reader = text_reader(stream)
+    try:
+        for line in reader:
+            yield line.rstrip('\r\n')
+    finally:
+        reader.detach()
+
+
+@register_extractor(CSV)
+def extract_csv(stream: BinaryIO, _name: str, _context: ExtractionContext):
+    """Rows of a CSV file (comma, semicolon or tab separated) as ' | '-joined cells."""
+    reader = text_reader(stream)
+    try:
+        sample = reader.read(CSV_SNIFF_CHARS)
+        reader.seek(0)
+        try:
+            dialect: type[csv.Dialect] | csv.Dialect = csv.Sniffer().sniff(sample, ',;\t|')
+        except csv.Error:
+            dialect = csv.excel
+        for row in csv.reader(reader, dialect):
+            cells = [cell.strip() for cell in row if cell.strip()]
+            if cells:
+                yield ' | '.join(cells)
+    finally:
+        reader.detach()
+
+
+@register_extractor(RTF)
+def extract_rtf(stream: BinaryIO, _name: str, context: ExtractionContext):
+    """
+    Paragraphs of an RTF document, skipping font, style and picture groups. Only the current
+    paragraph is decoded at a time.
+    """
+    rtf = context.read(stream).decode('latin-1')
+    codepage = re.search(r'\\ansicpg(\d+)', rtf)
+    encoding = f'cp{codepage.group(1)}' if codepage else 'cp1252'
+    parts: list[str] = []
+    ignore_stack: list[bool] = []
+    ignore = False
+    for match in RTF_TOKEN.finditer(rtf):
+        hex_byte, unicode_char, word, _, symbol, brace, text = match.groups()
+        if brace == '{':
+            ignore_stack.append(ignore)
+        elif brace == '}':
+            ignore = ignore_stack.pop() if ignore_stack else False
+        elif symbol == '*' or word in RTF_IGNORED_DESTINATIONS:
+            ignore = True
+        elif ignore:
+            continue
+        elif word and RTF_BREAKS.get(word) == '\n':
+            yield ''.join(parts).strip()
+            parts = []
+        elif word:
+            parts.append(RTF_BREAKS.get(word, ''))
+        elif hex_byte:
+            parts.append(bytes([int(hex_byte, 16)]).decode(encoding, 'replace'))
+        elif unicode_char:
+            parts.append(chr(int(unicode_char) % 65536))
+        elif symbol:
+            parts.append(' ' if symbol == '~' else symbol if symbol in '\\{}' else '')
+        elif text:
+            parts.append(text)
+    yield ''.join(parts).strip()
+
+
+def iterparse_parts(
+    source: BinaryIO, tags: Collection[str], bounds: Collection[str] = ()
+) -> Iterator[tuple[str, ElementTree.Element]]:
+    """
+    Parse an XML part incrementally, yielding ('end', element) for every element with one of
+    `tags` once its subtree is parsed, and ('start', element) and ('end', element) for
+    elements with one of `bounds` (e.g. tables whose name and nesting are needed).
+
+    Parsed elements are removed from their parent unless inside an element of `tags` still
+    being parsed, so memory does not grow with the size of the part.
+    """
+    open_elements: list[ElementTree.Element] = []
+    open_parts = 0
+    for event, element in iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            open_elements.append(element)
+            if element.tag in tags:
+                open_parts += 1
+            elif element.tag in bounds:
+                yield event, element
+            continue
+        open_elements.pop()
+        if element.tag in tags:
+            open_parts -= 1
+            yield event, element
+        elif element.tag in bounds:
+            yield event, element
+        if not open_parts and open_elements:
+            open_elements[-1].remove(element)
+
+
+@register_extractor(DOCX)
+def extract_docx(stream: BinaryIO, _name: str, _context: ExtractionContext):
+    """Paragraphs of a Word document; heading styles become markdown headings."""
+    with zipfile.ZipFile(stream) as archive, archive.open('word/document.xml') as document:
+        for _, element in iterparse_parts(document, {f'{W}p'}):
+            text = ''.join(t.text or '' for t in element.iter(f'{W}t'))
+            style = element.find(f'{W}pPr/{W}pStyle')
+            heading = (
+                DOCX_HEADING_STYLE.match(style.get(f'{W}val', '')) if style is not None else None
+            )
+            element.clear()
+            if text.strip():
+                yield f'{"#" * int(heading.group(1))} {text}' if heading else text
+
+
+def xlsx_sheets(archive: zipfile.ZipFile) -> list[tuple[str, str]]:
+    """(sheet name, part name) of the worksheets in workbook order."""
+    workbook = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+    relationships = ElementTree.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+    targets = {
+        rel.get('Id'): rel.get('Target', '')
+        for rel in relationships.iter(f'{PACKAGE_REL}Relationship')
+    }
+    sheets = []
+    for sheet in workbook.iter(f'{S}sheet'):
+        target = targets.get(sheet.get(f'{R}id'), '')
+        part = target.lstrip('/') if target.startswith('/') else f'xl/{target}'
+        sheets.append((sheet.get('name', ''), part))
+    return sheets
+
+
+def xlsx_cell_text(cell: ElementTree.Element, shared_strings: list[str]) -> str:
+    cell_type = cell.get('t')
+    if cell_type == 'inlineStr':
+        return ''.join(t.text or '' for t in cell.iter(f'{S}t')).strip()
+    value = cell.find(f'{S}v')
+    if value is None or value.text is None:
+        return ''
+    if cell_type == 's':
+        return shared_strings[int(value.text)].strip()
+    return value.text.strip()
+
+
+@register_extractor(XLSX)
+def extract_xlsx(stream: BinaryIO, _name: str, context: ExtractionContext):
+    """
+    Rows of every worksheet as ' | '-joined cells. Sheets are parsed row by row; only the
+    shared string table is held in memory.
+    """
+    with zipfile.ZipFile(stream) as archive:
+        shared_strings: list[str] = []
+        if 'xl/sharedStrings.xml' in archive.namelist():
+            with archive.open('xl/sharedStrings.xml') as strings:
+                for _, element in iterparse_parts(strings, {f'{S}si'}):
+                    shared_strings.append(''.join(t.text or '' for t in element.iter(f'{S}t')))
+                    element.clear()
+        for sheet_name, part in xlsx_sheets(archive):
+            context.check_time()
+            yield f'## {sheet_name}'
+            with archive.open(part) as sheet:
+                for _, element in iterparse_parts(sheet, {f'{S}row'}):
+                    cells = [xlsx_cell_text(cell, shared_strings) for cell in element.iter(f'{S}c')]
+                    element.clear()
+                    if any(cells):
+                        yield ' | '.join(cell for cell in cells if cell)
+
+
+@register_extractor(PPTX)
+def extract_pptx(stream: BinaryIO, _name: str, _context: ExtractionContext):
+    """Text paragraphs of every slide, in slide order."""
+    with zipfile.ZipFile(stream) as archive:
+        slides = sorted(
+            (int(match.group(1)), name)
+            for name in archive.namelist()
+            if (match := PPTX_SLIDE_PART.fullmatch(name))
+        )
+        for number, part in slides:
+            yield f'## Slide {number}'
+            with archive.open(part) as slide:
+                for _, element in iterparse_parts(slide, {f'{A}p'}):
+                    text = ''.join(t.text or '' for t in element.iter(f'{A}t'))
+                    element.clear()
+                    if text.strip():
+                        yield text
+
+
+@register_extractor(ODT, ODS, ODP)
+def extract_odf(stream: BinaryIO, _name: str, _context: ExtractionContext):
+    """
+    Paragraphs and table rows of an OpenDocument text, spreadsheet or presentation, parsed
+    from content.xml element by element.
+    """
+    with zipfile.ZipFile(stream) as archive, archive.open('content.xml') as content:
+        table_depth = 0
+        parts = iterparse_parts(
+            content,
+            {f'{ODF_TABLE}table-row', f'{ODF_TEXT}p', f'{ODF_TEXT}h'},
+            bounds={f'{ODF_TABLE}table'},
+        )
+        for event, element in parts:
+            if element.tag == f'{ODF_TABLE}table':
+                if event == 'start':
+                    table_depth += 1
+                    yield f'## {element.get(f"{ODF_TABLE}name", "")}'
+                else:
+                    table_depth -= 1
+                    element.clear()
+            elif event != 'end':
+                continue
+            elif element.tag == f'{ODF_TABLE}table-row':
+                # Repeated cells and rows (table:number-*-repeated) are kept once
+                cells = [
+                    ' '.join(''.join(p.itertext()) for p in cell.iter(f'{ODF_TEXT}p')).strip()
+                    for cell in element
+                ]
+                element.clear()
+                if any(cells):
+                    yield ' | '.join(cell for cell in cells if cell)
+            elif not table_depth and element.tag in (f'{ODF_TEXT}p', f'{ODF_TEXT}h'):
+                text = ''.join(element.itertext())
+                level = element.get(f'{ODF_TEXT}outline-level')
+                element.clear()
+                if text.strip():
+                    yield f'{"#" * int(level)} {text}' if level else text
+
+
+def extract_members(
+    name: str,
+    members: Iterator[tuple[str, int, Callable[[], BinaryIO]]],
+    context: ExtractionContext,
+) -> Iterator[str]:
+    """
+    Extract archive members one at a time, straight from the archive stream.
+
+    :param members: (member name, uncompressed size, function opening a seekable stream).
+    """
+    if context.depth >= context.max_archive_depth:
+        context.skip(f'Skipping {name}, archives nested deeper than {context.max_archive_depth}')
+        return
+    context.depth += 1
+    try:
+        for count, (member_name, size, open_member) in enumerate(members):
+            if count >= context.max_archive_members:
+                context.skip(f'Stopped at {count} members of {name}')
+                break
+            context.check_time()
+            if size > context.max_file_bytes:
+                context.skip(f'Skipping {name}/{member_name}, {size} bytes')
+                continue
+            # A malformed member is skipped; the other members are still extracted
+            try:
+                with open_member() as member:
+                    yield from extract_stream(member, f'{name}/{member_name}', context)
+            except FileTooLargeError as e:
+                context.skip(f'Skipping {name}/{member_name}, {e}')
+            except EXTRACTION_ERRORS as e:
+                context.skip(f'Error extracting {name}/{member_name}: {e!r}')
+    finally:
+        context.depth -= 1
+
+
+@register_extractor(ZIP)
+def extract_zip(stream: BinaryIO, name: str, context: ExtractionContext):
+    with zipfile.ZipFile(stream) as archive:
+        members = (
+            (info.filename, info.file_size, lambda info=info: archive.open(info))
+            for info in archive.infolist()
+            # Encrypted members cannot be read without a password
+            if not info.is_dir() and not info.flag_bits & 0x1
+        )
+        yield from extract_members(name, members, context)
+
+
+@register_extractor(TAR)
+def extract_tar(stream: BinaryIO, name: str, context: ExtractionContext):
+    """Members of a (possibly compressed) tar archive, read sequentially in stream mode."""
+    with tarfile.open(fileobj=stream, mode='r|*') as archive:
+        members = (
+            (
+                member.name,
+                member.size,
+                # Stream-mode members cannot seek; the size check above bounds this buffer
+                lambda member=member: io.BytesIO(archive.extractfile(member).read()),  # type: ignore[union-attr]
+            )
+            for member in archive
+            if member.isfile()
+        )
+        yield from extract_members(name, members, context)
+
+
+@register_extractor(GZIP)
+def extract_gzip(stream: BinaryIO, name: str, context: ExtractionContext):
+    """A .tar.gz archive or a single gzip-compressed file, decompressed on the fly."""
+    with gzip.GzipFile(fileobj=stream) as unpacked:
+        is_tar = unpacked.read(SNIFF_BYTES)[257:262] == b'ustar'
+        unpacked.seek(0)
+        if is_tar:
+            yield from extract_tar(unpacked, name, context)  # type: ignore[arg-type]
+        else:
+            inner_name = name[:-3] if name.lower().endswith('.gz') else name
+            yield from extract_stream(unpacked, inner_name, context)  # type: ignore[arg-type]
@@ -0,0 +1,182 @@
+import threading
+import time
+import weakref
+from collections.abc import Callable
+
+from watgpt.constants import EMBEDDINGS_MODEL_NAME, VECTOR_DB_BACKEND
+from watgpt.db.embeddings import embed_chunk_batch
+from watgpt.db.numpy_vector_db import NumpyVectorDB
+from watgpt.db.sql_db import SqlDB
+from watgpt.db.vector_db import VectorDB
+from watgpt.scripts.create_vector_db import open_vector_db
+from watgpt.utils import log_info, log_warning
+
+from .telemetry import call_in_reactor
+
+
+class StreamingIndexer:
+    """
+    Thread that embeds chunks and upserts them into the vector store while the crawl runs.
+
+    The crawler's DBWriter calls notify() after each batch that stored chunks; the thread
+    then fetches chunks without an up-to-date embedding from chunks.db in batches of
+    batch_size, stores their embeddings next to the chunk rows (as create_vector_db does)
+    and adds them to the vector store. Chunks are read back from the database, so chunk ids
+    and deduplicated contents are the ones the writer committed.
+
+    When max_pending written chunks wait for embedding, the indexer calls throttle(True)
+    (set by DBWriter.attach_indexer to pause the crawlers' engines); once fewer than half of
+    them wait, throttle(False) resumes the crawl. notify() never blocks the writer thread.
+
+    close() embeds the remaining chunks and removes chunks deleted from chunks.db during
+    the crawl from the vector store (Chroma only; the append-only numpy index keeps them
+    until it is rebuilt with create_vector_db).
+    """
+
+    _indexers: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def __init__(
+        self,
+        sql_db: SqlDB,
+        vector_db: VectorDB | NumpyVectorDB,
+        model_name: str = EMBEDDINGS_MODEL_NAME,
+        stats=None,
+        batch_size: int = 64,
+        max_pending: int = 2048,
+    ):
+        self.sql_db = sql_db
+        self.vector_db = vector_db
+        self.model_name = model_name
+        self.stats = stats
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.condition = threading.Condition()
+        # Chunks written but not embedded yet, an upper bound (duplicates are stored once)
+        self.pending = 0
+        self.stopping = False
+        # Called with True to pause the crawl and False to resume it, from the writer and
+        # indexer threads
+        self.throttle: Callable[[bool], None] | None = None
+        self.throttling = False
+        self.chunks_indexed = 0
+        self.index_seconds = 0.0
+        self.thread = threading.Thread(target=self._run, name='StreamingIndexer', daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def for_crawler(cls, crawler) -> 'StreamingIndexer':
+        """
+        Return the crawler's shared indexer, creating it from the crawler settings.
+        """
+        if crawler not in cls._indexers:
+            settings = crawler.settings
+            cls._indexers[crawler] = cls(
+                SqlDB(),
+                open_vector_db(settings.get('STREAMING_INDEX_BACKEND', VECTOR_DB_BACKEND)),
+                stats=crawler.stats,
+                batch_size=settings.getint('STREAMING_INDEX_BATCH_SIZE', 64),
+                max_pending=settings.getint('STREAMING_INDEX_MAX_PENDING', 2048),
+            )
+        return cls._indexers[crawler]
+
+    def notify(self, num_chunks: int):
+        """
+        Report chunks written to chunks.db; throttles the crawl once max_pending chunks wait
+        for the indexer.
+        """
+        with self.condition:
+            self.pending += num_chunks
+            self._set_stat('streaming_index/pending', self.pending)
+            self.condition.notify_all()
+            if self.pending >= self.max_pending and not self.stopping:
+                self._set_throttling(True)
+
+    def _set_throttling(self, throttling: bool):
+        """Pause or resume the crawl on a change (called with the condition held)."""
+        if throttling == self.throttling:
+            return
+        self.throttling = throttling
+        if throttling:
+            self._inc_stat('streaming_index/throttled')
+        if self.throttle is not None:
+            self.throttle(throttling)
+
+    def close(self):
+        """
+        Index the remaining chunks, drop deleted chunks from the vector store and stop.
+        """
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        self.thread.join()
+        try:
+            self.remove_deleted_chunks()
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            log_warning(f'Failed to remove deleted chunks from the vector store: {e}')
+        log_info(
+            f'Streaming indexer added {self.chunks_indexed} chunks in {self.index_seconds:.2f}s'
+        )
+
+    def remove_deleted_chunks(self):
+        stale = self.vector_db.indexed_chunk_ids() - self.sql_db.fetch_chunk_ids()
+        if not stale:
+            return
+        if isinstance(self.vector_db, VectorDB):
+            self.vector_db.delete_chunks(sorted(stale))
+            log_info(f'Removed {len(stale)} deleted chunks from the vector store.')
+        else:
+            log_warning(
+                f'{len(stale)} deleted chunks stay in the numpy index until it is rebuilt '
+                'with create_vector_db.'
+            )
+
+    def index_batch(self) -> int:
+        """
+        Embed and index one batch of chunks without an up-to-date embedding.
+
+        :return: Number of chunks indexed, 0 when none are left.
+        """
+        chunks = self.sql_db.fetch_chunks_to_embed(self.model_name, limit=self.batch_size)
+        if not chunks:
+            return 0
+        start = time.perf_counter()
+        vectors = embed_chunk_batch(
+            self.sql_db, self.vector_db.embedding_function, self.model_name, chunks
+        )
+        self.vector_db.add_embeddings(chunks, vectors)
+        self.index_seconds += time.perf_counter() - start
+        self.chunks_indexed += len(chunks)
+        self._inc_stat('streaming_index/chunks', len(chunks))
+        self._set_stat('streaming_index/chunks_per_sec', self.chunks_indexed / self.index_seconds)
+        return len(chunks)
+
+    # Called from the writer and indexer threads; stats are updated in the reactor thread
+    def _inc_stat(self, key: str, count: int = 1):
+        if self.stats is not None:
+            call_in_reactor(self.stats.inc_value, key, count)
+
+    def _set_stat(self, key: str, value):
+        if self.stats is not None:
+            call_in_reactor(self.stats.set_value, key, value)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.stopping:
+                    self.condition.wait()
+                stopping = self.stopping
+            try:
+                indexed = self.index_batch()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                log_warning(f'Streaming indexer failed, create_vector_db will index the rest: {e}')
+                indexed, stopping = 0, True
+            with self.condition:
+                # Nothing left to embed means the remaining pending chunks were duplicates
+                self.pending = max(0, self.pending - indexed) if indexed else 0
+                self.stopping = self.stopping or stopping
+                self._set_stat('streaming_index/pending', self.pending)
+                if self.stopping or self.pending < self.max_pending // 2:
+                    self._set_throttling(False)
+                self.condition.notify_all()
+            if stopping and not indexed:
+                return
@@ -17,6 +17,13 @@ class TimetableItem(scrapy.Item):
     group_code = scrapy.Field()
 
 
+class GroupTimetableItem(scrapy.Item):
+    """All lessons scraped for a group, used to refresh its stored timetable."""
+
+    group_code = scrapy.Field()
+    lessons = scrapy.Field()  # list of TimetableItem
+
+
 class GroupItem(scrapy.Item):
     group_code = scrapy.Field()
     group_url = scrapy.Field()
@@ -29,6 +36,8 @@ class PageContentItem(scrapy.Item):
     content = scrapy.Field()
     source_url = scrapy.Field()  # URL of the page
     page_number = scrapy.Field()  # For the chunk DB, can default to 0 or 1
+    etag = scrapy.Field()  # ETag response header, for the fetch manifest
+    last_modified = scrapy.Field()  # Last-Modified response header, for the fetch manifest
 
 
 class FileDownloadItem(scrapy.Item):
@@ -0,0 +1,92 @@
+import hashlib
+import weakref
+
+from .db_writer import CrawlerWriter, DBWriter
+
+
+def content_hash(content: str | bytes) -> str:
+    """
+    MD5 hex digest of a page's text or a file's body (the checksum FilesPipeline stores).
+    """
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    return hashlib.md5(content).hexdigest()
+
+
+class FetchManifest:
+    """
+    ETag, Last-Modified and content hash of every page and file stored by previous crawls.
+
+    The manifest is read from chunks.db once per crawler; updates are queued on the crawler's
+    DBWriter in one unit with the chunks of a document (see DBWriter.put_unit), so an entry is
+    never committed without the chunks it describes. With enabled=False
+    (INCREMENTAL_CRAWL = False) every document is treated as changed, but updates are still
+    recorded.
+    """
+
+    _manifests: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def __init__(self, entries: dict[str, dict], writer: CrawlerWriter, enabled: bool = True):
+        self.entries = entries
+        self.writer = writer
+        self.enabled = enabled
+
+    @classmethod
+    def for_crawler(cls, crawler) -> 'FetchManifest':
+        """
+        Return the crawler's shared manifest, loading it from the database on first use.
+        """
+        if crawler not in cls._manifests:
+            writer = DBWriter.for_crawler(crawler)
+            entries = {
+                url: {
+                    'etag': entry.etag,
+                    'last_modified': entry.last_modified,
+                    'content_hash': entry.content_hash,
+                }
+                for url, entry in writer.sql_db.fetch_manifest().items()
+            }
+            cls._manifests[crawler] = cls(
+                entries, writer, enabled=crawler.settings.getbool('INCREMENTAL_CRAWL', True)
+            )
+        return cls._manifests[crawler]
+
+    def conditional_headers(self, url: str) -> dict[str, str]:
+        """
+        If-None-Match / If-Modified-Since headers for a URL fetched before.
+        """
+        entry = self.entries.get(url)
+        if not self.enabled or entry is None:
+            return {}
+        headers = {}
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def stored_hash(self, url: str) -> str | None:
+        entry = self.entries.get(url)
+        return entry['content_hash'] if entry else None
+
+    def is_unchanged(self, url: str, digest: str) -> bool:
+        """
+        True if the URL's content has the same hash as in the last crawl.
+        """
+        return self.enabled and self.stored_hash(url) == digest
+
+    def record(
+        self,
+        url: str,
+        digest: str,
+        etag: str | None = None,
+        last_modified: str | None = None,
+    ) -> dict:
+        """
+        Update the URL's entry.
+
+        :return: The manifest row to queue in one unit with the document's chunks.
+        """
+        entry = {'etag': etag, 'last_modified': last_modified, 'content_hash': digest}
+        self.entries[url] = entry
+        return {'url': url, **entry}
@@ -5,132 +5,285 @@ Don't forget to add your pipeline to the ITEM_PIPELINES setting
 See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 """
 
+import multiprocessing
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from urllib.parse import urlparse
 
+from scrapy import Request
+from scrapy.exceptions import NotConfigured
+from scrapy.http.request import NO_CALLBACK
 from scrapy.pipelines.files import FilesPipeline
+from twisted.internet import defer
+from twisted.internet.defer import Deferred, DeferredList, DeferredSemaphore
+from twisted.python.failure import Failure
+
+from watgpt.utils import init_worker_logging, log_info, log_warning
+from watgpt.watscraper.watscraper.text_chunker import chunk_document
+from watscraper.items import GroupItem, GroupTimetableItem, PageContentItem, TimetableItem
+
+from .db_writer import DBWriter
+from .extract import (
+    EXTRACTOR_VERSION,
+    extract_and_chunk,
+    extract_calendar_and_chunk,
+    is_calendar_pdf,
+    text_sha256,
+    write_cached_text,
+)
+from .manifest import FetchManifest, content_hash
+from .telemetry import IngestionTelemetry
+
+
+def future_to_deferred(future: Future) -> Deferred:
+    """
+    Wrap a concurrent.futures.Future in a Deferred that fires in the reactor thread.
+    """
+    from twisted.internet import reactor  # pylint: disable=import-outside-toplevel
+
+    deferred: Deferred = Deferred(lambda _: future.cancel())
 
-from watgpt.db.sql_db import SqlDB
-from watgpt.utils import log_info
-from watgpt.watscraper.watscraper.text_chunker import TextChunker
-from watscraper.items import GroupItem, PageContentItem, TimetableItem
+    def fire(done: Future):
+        # The deferred may already have been cancelled by a timeout
+        if deferred.called:
+            return
+        if done.cancelled():
+            deferred.cancel()
+        elif done.exception() is not None:
+            deferred.errback(Failure(done.exception()))
+        else:
+            deferred.callback(done.result())
 
-from .extract import extract_text_from_file
+    future.add_done_callback(lambda done: reactor.callFromThread(fire, done))
+    return deferred
 
 
 class WatscraperPipeline:
-    def process_item(self, item, _spider):
+    def process_item(self, item, _spider=None):
         return item
 
 
-class GroupPipeline:
+class WriterPipeline:
+    """
+    Base for pipelines that store rows through the crawler's shared DBWriter.
+
+    process_item returns the Deferred of DBWriter.put, which waits while the writer's queue
+    is full, so Scrapy stops feeding the pipelines until the database catches up.
+    """
+
+    def open_spider(self, spider):
+        # pylint: disable=attribute-defined-outside-init
+        self.writer = DBWriter.for_crawler(spider.crawler)
+        self.writer.open()
+
+    def close_spider(self, _spider=None):
+        return self.writer.close()
+
+
+class GroupPipeline(WriterPipeline):
     """
     Pipeline for processing GroupItem objects.
 
     This pipeline:
-      - Opens a database connection and creates the timetable schema.
-      - Inserts group records into the database.
-      - Caches group IDs to avoid duplicate insertions.
+      - Queues group records for the shared database writer.
+      - Remembers queued groups to avoid duplicate insertions.
     """
 
     def __init__(self):
-        self.db = SqlDB()
-        self.groups_cache = {}
+        self.groups_seen = set()
 
-    def process_item(self, item, _spider):
+    def process_item(self, item, _spider=None):
         if isinstance(item, GroupItem):
             group_code = item.get('group_code')
-            if group_code and group_code not in self.groups_cache:
-                group_id = self.db.insert_group(group_code)  # new SQLAlchemy method
-                self.groups_cache[group_code] = group_id
-                log_info(f"Inserted group '{group_code}' with id {group_id}")
+            if group_code and group_code not in self.groups_seen:
+                self.groups_seen.add(group_code)
+                log_info(f"Queued group '{group_code}'")
+                return self.writer.put('groups', group_code).addCallback(lambda _: item)
         return item
 
 
-class TimetablePipeline:
-    def __init__(self):
-        self.db = SqlDB()
-        self.groups_cache = {}
+class TimetablePipeline(WriterPipeline):
+    """
+    Queues scraped lessons for the database writer: a GroupTimetableItem refreshes the
+    group's stored timetable, a TimetableItem is appended.
+    """
 
-    def process_item(self, item, _spider):
+    @staticmethod
+    def lesson_row(item) -> dict | None:
+        """
+        Convert a TimetableItem to the lesson dict of SqlDB.write_batch, None if unusable.
+        """
+        date_str = item.get('date')
+        try:
+            dt = datetime.strptime(date_str, '%Y_%m_%d')
+            formatted_date = dt.strftime('%Y-%m-%d')
+        except ValueError as e:
+            log_info(f"Error parsing date '{date_str}': {e}")
+            formatted_date = date_str  # Fallback to original string if conversion fails
+
+        group_code = item.get('group_code', 'WCY24IX3S0')
+        course_code = item.get('course_code')
+        if not course_code:
+            log_warning(f"Skipping lesson without course code for group '{group_code}'")
+            return None
+
+        # Groups, courses and teachers are resolved to ids by the writer
+        return {
+            'group_code': group_code,
+            'course_code': course_code,
+            'teacher_name': item.get('teacher_name'),
+            'lesson_date': formatted_date,
+            'block_id': item.get('block_id'),
+            'room': item.get('room'),
+            'building': item.get('building'),
+            'info': item.get('info'),
+        }
+
+    def process_item(self, item, _spider=None):
+        if isinstance(item, GroupTimetableItem):
+            lessons = []
+            for lesson in item.get('lessons', []):
+                row = self.lesson_row(lesson)
+                if row:
+                    del row['group_code']
+                    lessons.append(row)
+            timetable = {'group_code': item['group_code'], 'lessons': lessons}
+            return self.writer.put('timetables', timetable).addCallback(lambda _: item)
         if isinstance(item, TimetableItem):
-            date_str = item.get('date')
-            try:
-                dt = datetime.strptime(date_str, '%Y_%m_%d')
-                formatted_date = dt.strftime('%Y-%m-%d')
-            except ValueError as e:
-                log_info(f"Error parsing date '{date_str}': {e}")
-                formatted_date = date_str  # Fallback to original string if conversion fails
-
-            group_code = item.get('group_code', 'WCY24IX3S0')
-            if group_code not in self.groups_cache:
-                group_id = self.db.insert_group(group_code)
-                self.groups_cache[group_code] = group_id
-            else:
-                group_id = self.groups_cache[group_code]
-
-            teacher_name = item.get('teacher_name')
-            teacher_id = self.db.insert_teacher(teacher_name) if teacher_name else None
-
-            course_id = self.db.insert_course(item.get('course_code'))
-
-            lesson_id = self.db.insert_lesson(
-                group_id=group_id,
-                course_id=course_id,
-                teacher_id=teacher_id,
-                lesson_date=formatted_date,
-                block_id=item.get('block_id'),
-                room=item.get('room'),
-                building=item.get('building'),
-                info=item.get('info'),
-            )
-            log_info(f"Inserted lesson with id {lesson_id} for group '{group_code}'")
+            row = self.lesson_row(item)
+            if row:
+                return self.writer.put('lessons', row).addCallback(lambda _: item)
         return item
 
 
-class PostContentPipeline:
+class StreamingIndexPipeline(WriterPipeline):
+    """
+    Optional stage (STREAMING_INDEX = True) that embeds chunks and upserts them into the
+    vector store as the crawler's DBWriter stores them, so downloading, parsing and
+    embedding overlap (see StreamingIndexer). It handles no items itself.
+    """
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('STREAMING_INDEX', False):
+            raise NotConfigured('STREAMING_INDEX is disabled')
+        return cls()
+
+    def open_spider(self, spider):
+        # The vector store and embedding model are only loaded when the stage is enabled
+        from .indexer import StreamingIndexer  # pylint: disable=import-outside-toplevel
+
+        super().open_spider(spider)
+        # Concurrent crawlers share the writer and so its indexer
+        if self.writer.indexer is None:
+            self.writer.attach_indexer(StreamingIndexer.for_crawler(spider.crawler))
+
+
+class PostContentPipeline(WriterPipeline):
     """
     This pipeline:
-      1) Creates site_chunks table (where we store web content).
-      2) Uses a token-based splitter to chunk the text from PageContentItem.
-      3) Inserts each chunk into site_chunks.
+      1) Skips pages whose text did not change since the last crawl (see FetchManifest).
+      2) Chunks the text from PageContentItem (see CHUNKING_STRATEGY), timing it in the
+         chunking stage of IngestionTelemetry.
+      3) Queues the chunks to replace the page's previous chunks.
     """
 
-    def __init__(self):
-        self.db = SqlDB()
+    def open_spider(self, spider):
+        super().open_spider(spider)
+        # pylint: disable=attribute-defined-outside-init
+        self.manifest = FetchManifest.for_crawler(spider.crawler)
+        self.stats = spider.crawler.stats
+        self.telemetry = IngestionTelemetry.for_crawler(spider.crawler)
 
-    def process_item(self, item, _spider):
+    def process_item(self, item, _spider=None):
         if isinstance(item, PageContentItem):
             heading = item.get('heading', 'No Heading')
             full_text = item.get('content', '')
             source_url = item.get('source_url', '')
-            chunker = TextChunker(tokenizer_model='gpt2')
-            text_chunks = chunker.chunk_text_token_based(
-                full_text, max_tokens=1024, overlap_tokens=20
+            digest = content_hash(f'{heading}\n{full_text}')
+            if self.manifest.is_unchanged(source_url, digest):
+                self.stats.inc_value('manifest/unchanged_pages')
+                return item
+
+            # Cache the page text, so chunks can be rebuilt without crawling (--rechunk_only)
+            text_hash = text_sha256(full_text)
+            write_cached_text(text_hash, None, full_text)
+            start = time.perf_counter()
+            chunks = chunk_document(full_text)
+            self.telemetry.record('chunking', time.perf_counter() - start)
+            document = {
+                'source_url': source_url,
+                'file_url': None,  # no file URL for site
+                'title': heading,
+                'chunks': chunks,
+                'text_hash': text_hash,
+            }
+            manifest_row = self.manifest.record(
+                source_url, digest, item.get('etag'), item.get('last_modified')
             )
-
-            for text_chunk in text_chunks:
-                self.db.create_chunk(
-                    source_url=source_url,
-                    file_url=None,  # no file URL for site
-                    title=heading,
-                    content=text_chunk,
-                )
+            self.stats.inc_value('manifest/changed_pages')
+            queued = self.writer.put_unit({'documents': [document], 'manifest': [manifest_row]})
+            return queued.addCallback(lambda _: item)
         return item
 
 
 class CustomFilesPipeline(FilesPipeline):
     """
     1) Saves files to FILES_STORE/<dir_name>/<original_filename>
-    2) After download, parses the file -> chunks text -> stores in file_chunks table.
+    2) After download, parses the file -> chunks text -> queues chunks for the chunks table.
+
+    Parsing and chunking run in a process pool of EXTRACTION_POOL_SIZE workers, so the
+    reactor keeps downloading while files are processed. A file whose extraction takes
+    longer than EXTRACTION_TIMEOUT seconds is skipped; its worker stays busy until the
+    parser returns. The spider closes once all pending files are stored.
+
+    Files are requested with the validators from the FetchManifest; a file answered with
+    304 Not Modified, or downloaded with an unchanged checksum, is not extracted again.
+    The chunks of a changed file replace its previous chunks. Extracted texts are cached by
+    file SHA-256 (see extract.py), so a file is parsed once for the same contents. A text cut
+    at an extraction limit or by a malformed part is stored but neither cached nor recorded in
+    the manifest, so the file is extracted again by the next crawl.
+
+    Academic calendar PDFs are also parsed into rows of the calendar_events table.
+
+    The download latency, extraction and chunking time, size and chunk count of every
+    extracted file are recorded in IngestionTelemetry.
     """
 
     def open_spider(self, spider):
         # pylint: disable=attribute-defined-outside-init
-        self.db = SqlDB()
+        self.writer = DBWriter.for_crawler(spider.crawler)
+        self.writer.open()
+        settings = spider.crawler.settings
+        pool_size = settings.getint('EXTRACTION_POOL_SIZE', 4)
+        self.extraction_timeout = settings.getfloat('EXTRACTION_TIMEOUT', 300)
+        # Spawned workers do not inherit the reactor, its threads or the open databases
+        self.extraction_pool = ProcessPoolExecutor(
+            max_workers=pool_size,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker_logging,
+        )
+        # Submit at most pool_size files at a time, so timeouts do not count queueing time
+        self.extraction_slots = DeferredSemaphore(pool_size)
+        self.pending_extractions: set[Deferred] = set()
+        self.manifest = FetchManifest.for_crawler(spider.crawler)
+        self.stats = spider.crawler.stats
+        self.telemetry = IngestionTelemetry.for_crawler(spider.crawler)
+        # ETag and Last-Modified of the files downloaded in this crawl, by URL
+        self.validators: dict[str, tuple[str | None, str | None]] = {}
+        # Download latency of the files downloaded in this crawl, by URL
+        self.download_seconds: dict[str, float] = {}
+        self.files_seen: set[str] = set()
         super().open_spider(spider)
 
+    def close_spider(self, _spider=None):
+        deferred = DeferredList(list(self.pending_extractions))
+        deferred.addBoth(lambda _: self.extraction_pool.shutdown(wait=False, cancel_futures=True))
+        deferred.addBoth(lambda _: self.writer.close())
+        return deferred
+
     def file_path(self, request, response=None, info=None, *, item=None):
         # Parse the URL to get the original file name without query parameters.
         parsed = urlparse(request.url)
@@ -144,28 +297,134 @@ class CustomFilesPipeline(FilesPipeline):
                 return str(Path(dir_name) / original_filename)
         return original_filename
 
+    def get_media_requests(self, item, info):
+        return [
+            Request(url, headers=self.manifest.conditional_headers(url), callback=NO_CALLBACK)
+            for url in item.get(self.files_urls_field, [])
+        ]
+
+    def media_downloaded(self, response, request, info, *, item=None):
+        if response.status == 304:
+            self.inc_stats('uptodate')
+            return {
+                'url': request.url,
+                'path': self.file_path(request, response=response, info=info, item=item),
+                'checksum': self.manifest.stored_hash(request.url),
+                'status': 'uptodate',
+            }
+        self.validators[request.url] = (
+            response.headers.get('ETag', b'').decode() or None,
+            response.headers.get('Last-Modified', b'').decode() or None,
+        )
+        self.download_seconds[request.url] = response.meta.get('download_latency', 0.0)
+        return super().media_downloaded(response, request, info, item=item)
+
+    def extract_file(self, local_path: str, extractor=extract_and_chunk) -> Deferred:
+        """
+        Extract and chunk a downloaded file in the process pool.
+
+        :param local_path: Path of the file relative to FILES_STORE.
+        :param extractor: Function of the file path run in the pool.
+        :return: Deferred firing with the extractor's result, by default
+            (file SHA-256, list of text chunks, telemetry), see extract_and_chunk.
+        """
+        return self.extraction_slots.run(
+            self._submit_extraction, str(Path(self.store.basedir) / local_path), extractor
+        )
+
+    def _submit_extraction(self, filepath: str, extractor) -> Deferred:
+        from twisted.internet import reactor  # pylint: disable=import-outside-toplevel
+
+        deferred = future_to_deferred(self.extraction_pool.submit(extractor, filepath))
+        deferred.addTimeout(self.extraction_timeout, reactor)
+        return deferred
+
+    def track_extraction(self, deferred: Deferred, url: str):
+        """Log a failed extraction and keep the spider open until the deferred fires."""
+        deferred.addErrback(self.log_extraction_failure, url)
+        self.pending_extractions.add(deferred)
+        deferred.addBoth(lambda result, d=deferred: self.pending_extractions.discard(d) or result)
+
+    def store_chunks(
+        self,
+        extraction: tuple[str, list[str], dict],
+        source_page_url: str,
+        file_info: dict,
+        calendar_events: list[dict] | None = None,
+    ):
+        """
+        Queue the document of an extracted file with its manifest entry, and the events of a
+        calendar PDF, in one unit.
+        """
+        url = file_info['url']
+        text_hash, text_chunks, telemetry = extraction
+        self.telemetry.record('extraction', telemetry['extraction_seconds'])
+        self.telemetry.record('chunking', telemetry['chunking_seconds'])
+        self.telemetry.record_file(
+            url,
+            telemetry['bytes'],
+            len(text_chunks),
+            {
+                'download': self.download_seconds.pop(url, 0.0),
+                'extraction': telemetry['extraction_seconds'],
+                'chunking': telemetry['chunking_seconds'],
+            },
+        )
+        document = {
+            'source_url': source_page_url,
+            'file_url': url,
+            'title': Path(file_info['path']).name,
+            'chunks': text_chunks,
+            'text_hash': text_hash,
+            'extractor_version': EXTRACTOR_VERSION,
+        }
+        unit: dict[str, list] = {'documents': [document]}
+        if calendar_events is not None:
+            unit['calendars'] = [{'source': url, 'events': calendar_events}]
+        if not telemetry['complete']:
+            # Without a manifest entry, the next crawl downloads and extracts the file again
+            self.stats.inc_value('manifest/incomplete_files')
+            return self.writer.put_unit(unit)
+        validators = self.validators.get(url, (None, None))
+        unit['manifest'] = [self.manifest.record(url, file_info['checksum'], *validators)]
+        return self.writer.put_unit(unit)
+
+    def store_calendar(
+        self, extraction: tuple[str, list[str], dict, list[dict]], source_page_url: str, file_info
+    ):
+        """Store a calendar PDF's chunks and events (see extract_calendar_and_chunk)."""
+        *chunk_extraction, events = extraction
+        return self.store_chunks(tuple(chunk_extraction), source_page_url, file_info, events)
+
+    def log_extraction_failure(self, failure: Failure, url: str):
+        if failure.check(defer.TimeoutError):
+            log_warning(f'Skipping {url}, extraction took over {self.extraction_timeout}s')
+        else:
+            log_warning(f'Skipping {url}, extraction failed: {failure.getErrorMessage()}')
+
     def item_completed(self, results, item, info):
         super_item = super().item_completed(results, item, info)
 
         for success, file_info in results:
-            if success:
-                local_path = file_info['path']
-                downloaded_url = file_info['url']
-                source_page_url = item.get('origin_url', '')
-                file_text = extract_text_from_file(str(Path(self.store.basedir) / local_path))
-                # Chunk the extracted text.
-                chunker = TextChunker(tokenizer_model='gpt2')
-                text_chunks = chunker.chunk_text_token_based(
-                    file_text, max_tokens=1024, overlap_tokens=20
-                )
-                file_name = Path(local_path).name
-
-                for text_chunk in text_chunks:
-                    self.db.create_chunk(
-                        source_url=source_page_url,
-                        file_url=downloaded_url,
-                        title=file_name,
-                        content=text_chunk,
-                    )
+            # A file linked from several pages is processed once per crawl
+            if not success or file_info['url'] in self.files_seen:
+                continue
+            self.files_seen.add(file_info['url'])
+            if file_info['status'] == 'uptodate' or self.manifest.is_unchanged(
+                file_info['url'], file_info['checksum']
+            ):
+                self.stats.inc_value('manifest/unchanged_files')
+                continue
+
+            self.stats.inc_value('manifest/changed_files')
+            source_page_url = item.get('origin_url', '')
+            # A calendar PDF is parsed once for both its chunks and its events
+            if is_calendar_pdf(file_info['path']):
+                deferred = self.extract_file(file_info['path'], extract_calendar_and_chunk)
+                deferred.addCallback(self.store_calendar, source_page_url, file_info)
+            else:
+                deferred = self.extract_file(file_info['path'])
+                deferred.addCallback(self.store_chunks, source_page_url, file_info)
+            self.track_extraction(deferred, file_info['url'])
 
         return super_item
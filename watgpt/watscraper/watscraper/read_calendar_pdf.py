@@ -1,68 +1,141 @@
+import datetime
+import multiprocessing
+import os
 import re
 import string
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
 
 import fitz
 
-from watgpt.utils import log_debug, log_info
+from watgpt.constants import CALENDAR_PAGES_PER_WORKER, CALENDAR_PARSE_WORKERS
+from watgpt.utils import init_worker_logging, is_debug_enabled, log_debug, log_info
 
 # A quick regex to detect something like DD.MM.YYYY (and optionally trailing " r." or " r")
 DATE_PATTERN = re.compile(r'^\d{1,2}\.\d{1,2}\.\d{4}(\s*r\.?)?$')
+# Dates inside a row: DD.MM.YYYY, or DD.MM when the year is given by a later date of the range
+ROW_DATE_PATTERN = re.compile(r'(?<![\d.])(\d{1,2})\.(\d{1,2})(?:\.(\d{4}))?(?:\s*r\.)?(?!\.?\d)')
+# A row date together with the "od" / "do" (from / until) before it, removed from event texts
+ROW_DATE_PHRASE_PATTERN = re.compile(r'(?:\b(?:od|do)\s+)?' + ROW_DATE_PATTERN.pattern)
 
 
-def extract_header_and_rows(pdf_path: str | Path):
+def extract_header_and_rows(
+    pdf_path: str | Path,
+    workers: int = CALENDAR_PARSE_WORKERS,
+    pages_per_worker: int = CALENDAR_PAGES_PER_WORKER,
+):
     """
     Extracts:
       - The big/bold heading from the first page (if any).
       - Rows from each page using a row threshold of <12 in y-diff.
       - Merges multi-line rows by your continuation rule.
 
+    Each page's spans are read once. Long PDFs are split into contiguous page ranges parsed
+    by up to `workers` processes; ranges are concatenated in page order before merging, so
+    the result does not depend on the number of workers.
+
     Returns: (header_text, [row_dict, row_dict, ...])
     """
-    doc = fitz.open(pdf_path)
-    all_rows = []
-    header_text = 'UNDEFINED_HEADER'
-
     log_info(f'Extracting from PDF: {pdf_path}')
 
-    for page_idx, page in enumerate(doc):
-        # 1) Attempt to detect header on first page
-        if page_idx == 0:
-            possible_header = detect_header(page)
-            if possible_header:
-                header_text = possible_header
+    with fitz.open(pdf_path) as doc:
+        ranges = page_ranges(doc.page_count, workers, pages_per_worker)
+        if len(ranges) == 1:
+            results = [parse_pages(doc, 0, doc.page_count)]
+        else:
+            results = parse_page_ranges_in_parallel(str(pdf_path), ranges)
 
-        # 2) Parse the page's spans into row strings
-        page_rows = parse_page_into_rows(page)
-        all_rows.extend(page_rows)
+    header_text = results[0][0] or 'UNDEFINED_HEADER'
+    all_rows = [row for _, rows in results for row in rows]
 
-    # 3) Merge multi-line rows (where next row starts with digit/lowercase)
+    # Merge multi-line rows (where next row starts with digit/lowercase)
     merged = merge_multiline_rows(all_rows)
 
-    log_debug(f'Extracted {len(merged)} rows from {pdf_path}')
+    log_debug('Extracted %d rows from %s', len(merged), pdf_path)
 
     return header_text, merged
 
 
-def detect_header(page, min_font_size=12):
+def page_ranges(page_count: int, workers: int, pages_per_worker: int) -> list[tuple[int, int]]:
     """
-    Looks for large/bold text near the top (y0 < 150) and combines it.
+    Split pages into contiguous (start, stop) ranges, one per worker and at most one per CPU;
+    a single range if the PDF is too short for parallel parsing to pay off.
+    """
+    num_ranges = min(workers, os.cpu_count() or 1, page_count // pages_per_worker)
+    if num_ranges < 2:
+        return [(0, page_count)]
+    bounds = [page_count * i // num_ranges for i in range(num_ranges + 1)]
+    return list(zip(bounds, bounds[1:], strict=False))
+
+
+def parse_page_ranges_in_parallel(
+    pdf_path: str, ranges: list[tuple[int, int]]
+) -> list[tuple[str | None, list[dict]]]:
+    """
+    Parse every page range in its own spawned process; results follow the order of ranges.
+    """
+    log_debug('Parsing %s in page ranges %s', pdf_path, ranges)
+    starts, stops = zip(*ranges, strict=True)
+    with ProcessPoolExecutor(
+        max_workers=len(ranges),
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=init_worker_logging,
+    ) as pool:
+        return list(pool.map(parse_page_range, repeat(pdf_path), starts, stops))
+
+
+def parse_pages(doc, start: int, stop: int) -> tuple[str | None, list[dict]]:
+    """
+    Header (detected on the first page only) and rows of the pages [start, stop).
+    """
+    header = None
+    rows = []
+    for page_number in range(start, stop):
+        page = doc[page_number]
+        spans = page_spans(page)
+        if page_number == 0:
+            header = detect_header(spans)
+        rows.extend(parse_spans_into_rows(spans, page_number))
+    return header, rows
+
+
+def parse_page_range(pdf_path: str, start: int, stop: int) -> tuple[str | None, list[dict]]:
+    """Worker process entry point: parse_pages on a PDF opened in this process."""
+    with fitz.open(pdf_path) as doc:
+        return parse_pages(doc, start, stop)
+
+
+def page_spans(page) -> list[tuple[float, float, str, float, bool]]:
     """
-    blocks = page.get_text('dict')['blocks']
-    top_candidates = []
-    for b in blocks:
+    Non-empty text spans of a page as (x0, y0, text, font size, is bold), in document order,
+    from a single get_text('dict') call.
+    """
+    spans = []
+    for b in page.get_text('dict')['blocks']:
         if b.get('type', 1) == 0:  # text block
             for line in b.get('lines', []):
                 for span in line.get('spans', []):
                     text = span.get('text', '').strip()
-                    if not text:
-                        continue
-                    font_size = span.get('size', 0)
-                    is_bold = 'bold' in span.get('font', '').lower()
-                    y0 = span.get('bbox', [0, 0, 0, 0])[1]
-                    # If font >= min_font_size OR bold, and near top
-                    if (font_size >= min_font_size or is_bold) and (y0 < 150):
-                        top_candidates.append(text)
+                    if text:
+                        x0, y0 = span.get('bbox', [0, 0, 0, 0])[:2]
+                        is_bold = 'bold' in span.get('font', '').lower()
+                        spans.append((x0, y0, text, span.get('size', 0), is_bold))
+    return spans
+
+
+def detect_header(spans, min_font_size=12):
+    """
+    Looks for large/bold text near the top (y0 < 150) and combines it.
+
+    :param spans: Spans of the first page, see page_spans.
+    """
+    top_candidates = [
+        text
+        for _, y0, text, font_size, is_bold in spans
+        # If font >= min_font_size OR bold, and near top
+        if (font_size >= min_font_size or is_bold) and y0 < 150
+    ]
     if top_candidates:
         return ' '.join(top_candidates)
     return None
@@ -72,37 +145,33 @@ def parse_page_into_rows(page, row_diff_threshold=12, x_split=140):
     """
     Parse a page into row dictionaries containing page_number and row text.
     """
-    page_number = page.number
-    blocks = page.get_text('dict')['blocks']
-    spans = []
+    return parse_spans_into_rows(page_spans(page), page.number, row_diff_threshold, x_split)
 
-    for b in blocks:
-        if b.get('type', 1) == 0:
-            for line in b.get('lines', []):
-                for span in line.get('spans', []):
-                    text = span.get('text', '').strip()
-                    if text:
-                        x0 = span['bbox'][0]
-                        y0 = span['bbox'][1]
-                        spans.append((x0, y0, text))
 
+def parse_spans_into_rows(spans, page_number: int, row_diff_threshold=12, x_split=140):
+    """
+    Group a page's spans into rows and build the row dictionaries.
+    """
     # Sort spans top-to-bottom, left-to-right
-    spans.sort(key=lambda x: (x[1], x[0]))
+    positioned = sorted(
+        ((x0, y0, text) for x0, y0, text, _, _ in spans), key=lambda x: (x[1], x[0])
+    )
+    debug = is_debug_enabled()
 
-    log_debug(f'Parsing page {page_number} with {len(spans)} spans')
+    if debug:
+        log_debug('Parsing page %d with %d spans', page_number, len(positioned))
 
     rows_of_spans = []
-    current_row = []
+    current_row: list[tuple[float, float, str]] = []
     last_y = None
 
-    for x0, y0, text in spans:
+    for x0, y0, text in positioned:
         if last_y is None:
             current_row.append((x0, y0, text))
             last_y = y0
         else:
             if (y0 - last_y) >= row_diff_threshold:
                 rows_of_spans.append(current_row)
-                log_debug(f' Finalized row => {current_row}')
                 current_row = [(x0, y0, text)]
                 last_y = y0
             else:
@@ -111,7 +180,6 @@ def parse_page_into_rows(page, row_diff_threshold=12, x_split=140):
 
     if current_row:
         rows_of_spans.append(current_row)
-        log_debug(f' Finalized row => {current_row}')
 
     # Convert each list of spans into a dict with row text and page number.
     row_dicts = []
@@ -123,10 +191,12 @@ def parse_page_into_rows(page, row_diff_threshold=12, x_split=140):
                 'text': row_text,
             }
         )
-        log_debug(f' Row => {row_spans}')
-        log_debug(f"  => row_text='{row_text}'")
+        if debug:
+            log_debug(' Row => %s', row_spans)
+            log_debug("  => row_text='%s'", row_text)
 
-    log_debug(f'Parsed {len(row_dicts)} rows from page {page_number}')
+    if debug:
+        log_debug('Parsed %d rows from page %d', len(row_dicts), page_number)
 
     return row_dicts
 
@@ -180,16 +250,22 @@ def merge_multiline_rows(rows: list[dict]) -> list[dict]:
     for row in rows:
         text = row['text']
         if not merged_rows:
-            merged_rows.append(row)
+            merged_rows.append(dict(row))
         else:
             left_side = text.split('|', 1)[0].strip()
             if left_side and is_continuation([left_side]):
                 merged_rows[-1]['text'] += ' ' + text
             else:
-                merged_rows.append(row)
+                # Copies keep the input rows unchanged, so merging is repeatable
+                merged_rows.append(dict(row))
     return merged_rows
 
 
+def calendar_text(header_text: str, row_dicts: list[dict]) -> str:
+    """The header and each merged row's text as a single text block."""
+    return header_text + '\n' + '\n'.join(row['text'] for row in row_dicts)
+
+
 def extract_calendar_text(pdf_path: str | Path) -> str:
     """
     Simplified single-method extraction for calendar PDFs.
@@ -197,7 +273,82 @@ def extract_calendar_text(pdf_path: str | Path) -> str:
     Uses all the read_calendar.py methods but returns a single aggregated text
     (header plus all merged row texts) as one string.
     """
+    return calendar_text(*extract_header_and_rows(pdf_path))
+
+
+def parse_row_dates(text: str) -> list[datetime.date]:
+    """
+    Dates of a calendar row in order of appearance. A date without a year takes the year of
+    the next full date (the year before, if that would put it after that date), so
+    "23.12 - 06.01.2025 r." spans the new year. Impossible dates are skipped.
+    """
+    matches = ROW_DATE_PATTERN.findall(text)
+    dates: list[datetime.date] = []
+    next_year = None
+    next_date = None
+    # Walk backwards, so every date without a year sees the next full date
+    for day, month, year in reversed(matches):
+        try:
+            if year:
+                current = datetime.date(int(year), int(month), int(day))
+                next_year, next_date = current.year, current
+            elif next_year is not None and next_date is not None:
+                current = datetime.date(next_year, int(month), int(day))
+                if current > next_date:
+                    current = current.replace(year=next_year - 1)
+            else:
+                continue
+        except ValueError:
+            continue
+        dates.append(current)
+    return dates[::-1]
+
+
+def calendar_event_from_row(row: dict) -> dict | None:
+    """
+    Turn a merged calendar row into an event dict (event, start_date, end_date, page), or
+    None for rows without dates (headings, notes).
+
+    The event text is the row without its dates (and the od/do before them), date separators
+    and column pipes; the event spans from its earliest to its latest date.
+    """
+    dates = parse_row_dates(row['text'])
+    if not dates:
+        return None
+    parts = [ROW_DATE_PHRASE_PATTERN.sub(' ', part) for part in row['text'].split('|')]
+    parts = [re.sub(r'\s+', ' ', part).strip(' -–—,;') for part in parts]
+    event = ' '.join(part for part in parts if part)
+    if not event:
+        return None
+    return {
+        'event': event,
+        'start_date': min(dates),
+        'end_date': max(dates),
+        'page': row['page_number'] + 1,
+    }
+
+
+def calendar_events(row_dicts: list[dict]) -> list[dict]:
+    """Event dicts of the merged rows that have dates (see calendar_event_from_row)."""
+    return [event for row in row_dicts if (event := calendar_event_from_row(row))]
+
+
+def extract_calendar_events(pdf_path: str | Path) -> list[dict]:
+    """
+    Parse a calendar PDF into event dicts for the calendar_events table
+    (see calendar_event_from_row).
+    """
+    return extract_calendar(pdf_path)[1]
+
+
+def extract_calendar(pdf_path: str | Path) -> tuple[str, list[dict]]:
+    """
+    Parse a calendar PDF once into both its text (see extract_calendar_text) and its events
+    (see extract_calendar_events).
+
+    :return: Tuple of (text, event dicts).
+    """
     header_text, row_dicts = extract_header_and_rows(pdf_path)
-    # Join the header and each row's text into a single text block.
-    all_text = header_text + '\n' + '\n'.join(row['text'] for row in row_dicts)
-    return all_text
+    events = calendar_events(row_dicts)
+    log_info(f'Extracted {len(events)} calendar events from {pdf_path}')
+    return calendar_text(header_text, row_dicts), events
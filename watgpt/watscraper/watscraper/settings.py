@@ -57,9 +57,9 @@ LOG_LEVEL = 'INFO'
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-# EXTENSIONS = {
-#    "scrapy.extensions.telnet.TelnetConsole": None,
-# }
+EXTENSIONS = {
+    'watscraper.telemetry.TelemetryExtension': 500,
+}
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
@@ -68,9 +68,51 @@ ITEM_PIPELINES = {
     'watscraper.pipelines.TimetablePipeline': 300,
     'watscraper.pipelines.PostContentPipeline': 400,
     'watscraper.pipelines.CustomFilesPipeline': 500,
+    'watscraper.pipelines.StreamingIndexPipeline': 600,
 }
 DOWNLOAD_TIMEOUT = 15
 
+# Replace each group's stored lessons with its scraped timetable (inserting, updating and
+# deleting only what changed) instead of appending every scraped lesson
+TIMETABLE_REFRESH = True
+
+# Skip pages and files that did not change since the last crawl (see FetchManifest);
+# set to False to re-extract everything
+INCREMENTAL_CRAWL = True
+# Always revalidate stored files with a conditional request instead of trusting their age
+FILES_EXPIRES = 0
+
+# Downloaded files are parsed and chunked in a process pool so the crawl is not blocked
+EXTRACTION_POOL_SIZE = 4
+# Seconds after which a file's extraction is abandoned and the file skipped
+EXTRACTION_TIMEOUT = 300
+
+# Pipelines queue rows for a single writer thread that commits them in batches
+DB_WRITER_BATCH_SIZE = 500
+# Maximum queued units of rows; while the queue is full, pipelines wait (without blocking the
+# reactor) and Scrapy stops feeding them items
+DB_WRITER_QUEUE_SIZE = 10000
+# Seconds to wait for more rows before writing an incomplete batch
+DB_WRITER_FLUSH_INTERVAL = 1.0
+
+# Embed stored chunks into the vector store during the crawl instead of in create_vector_db
+STREAMING_INDEX = False
+# Vector store filled by the streaming indexer ('chroma' or 'numpy')
+STREAMING_INDEX_BACKEND = 'chroma'
+# Chunks embedded per batch
+STREAMING_INDEX_BATCH_SIZE = 64
+# Stored chunks waiting for embedding at which the crawl is paused (resumed below half of it)
+STREAMING_INDEX_MAX_PENDING = 2048
+
+# Per-item extraction, chunking and DB write time are kept in the telemetry/ stats; the
+# telemetry extension adds download latency and writes a JSON report of every crawl
+TELEMETRY_ENABLED = True
+# Reports go to INGESTION_REPORTS_DIR, next to databases/healthcheck; set another directory,
+# or an empty one to keep the stats only
+# TELEMETRY_REPORT_DIR = ''
+# Slowest files (download + extraction + chunking time) listed in the report
+TELEMETRY_SLOWEST_FILES = 10
+
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
@@ -58,6 +58,8 @@ class AllFilesSpider(CrawlSpider):
             content=content_text,
             source_url=response.url,
             page_number=0,
+            etag=response.headers.get('ETag', b'').decode() or None,
+            last_modified=response.headers.get('Last-Modified', b'').decode() or None,
         )
 
         # Identify and yield file download items
@@ -3,20 +3,25 @@ from urllib.parse import urljoin
 
 import scrapy
 
-from watscraper.items import GroupItem, TimetableItem
+from watscraper.items import GroupItem, GroupTimetableItem, TimetableItem
 
 
 class TimetableSpider(scrapy.Spider):
     name = 'timetable'
     start_urls = ['https://planzajec.wcy.wat.edu.pl/pl/rozklad']
 
-    def __init__(self, *args, target_groups=None, **kwargs):
+    def __init__(self, *args, target_groups=None, refresh=None, **kwargs):
         """
         Optionally pass a comma-separated list of group codes that you want to scrape.
         Example:
           scrapy crawl timetable -a target_groups="WCY19IL1S0,WCY19IT1S0"
+
+        refresh="1" yields each group's complete timetable as one GroupTimetableItem, so the
+        stored lessons are replaced by the scraped ones; refresh="0" yields TimetableItems that
+        are appended. Defaults to the TIMETABLE_REFRESH setting.
         """
         super().__init__(*args, **kwargs)
+        self.refresh = refresh
         if target_groups:
             # Create a set of target group codes for fast lookup.
             self.target_groups = set(target_groups.split(','))
@@ -61,6 +66,18 @@ class TimetableSpider(scrapy.Spider):
             self.logger.warning(f'No timetable found for group {group_code}.')
             return
 
+        refresh = (
+            self.settings.getbool('TIMETABLE_REFRESH', True)
+            if self.refresh is None
+            else self.refresh not in ('0', 'false', 'False')
+        )
+        lessons = self.parse_lessons(lessons_div, group_code)
+        if refresh:
+            yield GroupTimetableItem(group_code=group_code, lessons=list(lessons))
+        else:
+            yield from lessons
+
+    def parse_lessons(self, lessons_div, group_code: str):
         for lesson in lessons_div.css('div.lesson'):
             info_str = lesson.css('span.info::text').get(default='').strip()
             if info_str == '- - (Rezerwacja) - -':
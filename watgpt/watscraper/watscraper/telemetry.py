@@ -0,0 +1,210 @@
+import heapq
+import itertools
+import json
+import time
+import weakref
+from datetime import datetime
+from pathlib import Path
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+from watgpt.constants import INGESTION_REPORTS_DIR
+from watgpt.utils import log_info, log_warning
+
+STAGES = ('download', 'extraction', 'chunking', 'db_write')
+# Crawler stats copied into the run report besides the telemetry/ ones
+REPORTED_STATS = ('db_writer/', 'manifest/', 'streaming_index/', 'downloader/response_bytes')
+
+
+def call_in_reactor(function, *args):
+    """
+    Run a function in the reactor thread, at once when called from it. Scrapy stats are not
+    thread-safe, so the DB writer and streaming indexer threads hand their stats and telemetry
+    updates to the reactor, which makes all others.
+    """
+    # pylint: disable=import-outside-toplevel
+    from twisted.internet import reactor
+    from twisted.python import threadable
+
+    if threadable.isInIOThread():
+        function(*args)
+    else:
+        reactor.callFromThread(function, *args)
+
+
+class IngestionTelemetry:
+    """
+    Time spent per item in each ingestion stage of a crawl, kept in the crawler stats.
+
+    For every stage in STAGES the stats hold telemetry/<stage>/items, .../seconds and
+    .../max_item_seconds: download is the latency of every response, extraction and chunking
+    are timed in the extraction workers (chunking of pages in PostContentPipeline), db_write is
+    the time of the DBWriter batches divided over their rows. Files add telemetry/files/count,
+    .../bytes and .../chunks, and the slowest_files files with the longest download, extraction
+    and chunking time are kept for the run report (see TelemetryExtension). Like the stats,
+    it is only updated in the reactor thread (see call_in_reactor).
+
+    Stages overlap (downloads go on while files are extracted in the pool and rows written in
+    the writer thread), so the stage with the largest share of the crawl's elapsed time is
+    the one to look at first, not the sum of all stages.
+    """
+
+    _telemetries: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def __init__(self, stats, slowest_files: int = 10):
+        self.stats = stats
+        self.slowest_files = slowest_files
+        # Min-heap of (seconds, insertion order, file entry) of the slowest files
+        self.slowest: list[tuple[float, int, dict]] = []
+        self.counter = itertools.count()
+
+    @classmethod
+    def for_crawler(cls, crawler) -> 'IngestionTelemetry':
+        """
+        Return the crawler's shared telemetry, creating it from the crawler settings.
+        """
+        if crawler not in cls._telemetries:
+            cls._telemetries[crawler] = cls(
+                crawler.stats, crawler.settings.getint('TELEMETRY_SLOWEST_FILES', 10)
+            )
+        return cls._telemetries[crawler]
+
+    def record(self, stage: str, seconds: float, items: int = 1):
+        """
+        Add the time of items processed together in one stage.
+
+        :param stage: One of STAGES.
+        :param seconds: Time of all items.
+        :param items: Number of items, e.g. the rows of a DB batch.
+        """
+        self.stats.inc_value(f'telemetry/{stage}/items', items)
+        self.stats.inc_value(f'telemetry/{stage}/seconds', seconds)
+        self.stats.max_value(f'telemetry/{stage}/max_item_seconds', seconds / items)
+
+    def record_file(self, url: str, num_bytes: int, num_chunks: int, seconds: dict[str, float]):
+        """
+        Add a downloaded file's size and chunk count and keep it if it is among the slowest.
+
+        :param seconds: Download, extraction and chunking time of the file by stage.
+        """
+        entry = {
+            'url': url,
+            'bytes': num_bytes,
+            'chunks': num_chunks,
+            **{f'{stage}_seconds': value for stage, value in seconds.items()},
+        }
+        total = sum(seconds.values())
+        self.stats.inc_value('telemetry/files/count')
+        self.stats.inc_value('telemetry/files/bytes', num_bytes)
+        self.stats.inc_value('telemetry/files/chunks', num_chunks)
+        if self.slowest_files <= 0:
+            return
+        item = (total, next(self.counter), entry)
+        if len(self.slowest) < self.slowest_files:
+            heapq.heappush(self.slowest, item)
+        else:
+            heapq.heappushpop(self.slowest, item)
+
+    def report(self, elapsed_seconds: float) -> dict:
+        """
+        Summary of the recorded stages and files.
+
+        :param elapsed_seconds: Wall-clock time of the crawl.
+        :return: Dict with stages (items, seconds, seconds_per_item, max_item_seconds,
+            share_of_elapsed), files (count, bytes, chunks, bytes_per_extraction_second) and
+            slowest_files (slowest first).
+        """
+        stats = self.stats.get_stats()
+        stages = {}
+        for stage in STAGES:
+            items = stats.get(f'telemetry/{stage}/items', 0)
+            seconds = stats.get(f'telemetry/{stage}/seconds', 0.0)
+            stages[stage] = {
+                'items': items,
+                'seconds': seconds,
+                'seconds_per_item': seconds / items if items else 0.0,
+                'max_item_seconds': stats.get(f'telemetry/{stage}/max_item_seconds', 0.0),
+                'share_of_elapsed': seconds / elapsed_seconds if elapsed_seconds else 0.0,
+            }
+        num_bytes = stats.get('telemetry/files/bytes', 0)
+        extraction_seconds = stages['extraction']['seconds']
+        slowest = [entry for _, _, entry in sorted(self.slowest, reverse=True)]
+        return {
+            'stages': stages,
+            'files': {
+                'count': stats.get('telemetry/files/count', 0),
+                'bytes': num_bytes,
+                'chunks': stats.get('telemetry/files/chunks', 0),
+                'bytes_per_extraction_second': (
+                    num_bytes / extraction_seconds if extraction_seconds else 0.0
+                ),
+            },
+            'slowest_files': slowest,
+        }
+
+
+class TelemetryExtension:
+    """
+    Records the download latency of every response and writes a JSON run report to
+    TELEMETRY_REPORT_DIR (one <spider>_<start time>.json per crawl) when the spider closes.
+
+    The report holds the spider, finish reason, start time and elapsed seconds, the
+    IngestionTelemetry summary and the db_writer/, manifest/ and streaming_index/ stats, so
+    runs can be compared over time. Concurrent crawlers share one DBWriter (see
+    DBWriter.for_crawler); each crawler's rows are reported in its own stats.
+    """
+
+    def __init__(self, crawler, report_dir: str):
+        self.crawler = crawler
+        self.report_dir = report_dir
+        self.telemetry = IngestionTelemetry.for_crawler(crawler)
+        self.started_at = datetime.now()
+        self.start = time.perf_counter()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('TELEMETRY_ENABLED', True):
+            raise NotConfigured('TELEMETRY_ENABLED is disabled')
+        report_dir = crawler.settings.get('TELEMETRY_REPORT_DIR', INGESTION_REPORTS_DIR)
+        extension = cls(crawler, report_dir)
+        crawler.signals.connect(extension.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(extension.response_received, signal=signals.response_received)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        return extension
+
+    def spider_opened(self, spider):
+        self.started_at = datetime.now()
+        self.start = time.perf_counter()
+
+    def response_received(self, response, request, spider):
+        latency = request.meta.get('download_latency')
+        if latency is not None:
+            self.telemetry.record('download', latency)
+        self.crawler.stats.inc_value('telemetry/download/bytes', len(response.body))
+
+    def spider_closed(self, spider, reason):
+        elapsed = time.perf_counter() - self.start
+        self.crawler.stats.set_value('telemetry/elapsed_seconds', elapsed)
+        if not self.report_dir:
+            return
+        report = {
+            'spider': spider.name,
+            'finish_reason': reason,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'elapsed_seconds': elapsed,
+            **self.telemetry.report(elapsed),
+            'stats': {
+                key: value
+                for key, value in sorted(self.crawler.stats.get_stats().items())
+                if key.startswith(REPORTED_STATS)
+            },
+        }
+        path = Path(self.report_dir) / f'{spider.name}_{self.started_at:%Y%m%d_%H%M%S}.json'
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(report, indent=2), encoding='utf-8')
+        except OSError as e:
+            log_warning(f'Failed to write the ingestion report {path}: {e}')
+            return
+        log_info(f'Ingestion report written to {path}')
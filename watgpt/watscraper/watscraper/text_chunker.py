@@ -1,30 +1,169 @@
-from transformers import AutoTokenizer
+import json
+import re
+from functools import cache
+from pathlib import Path
+
+from watgpt.constants import (
+    CHUNK_MAX_TOKENS,
+    CHUNK_OVERLAP_TOKENS,
+    CHUNK_TOKENIZER_MODEL,
+    CHUNKING_STRATEGY,
+)
+
+# A markdown heading line starts a new section
+HEADING_PATTERN = re.compile(r'^\s{0,3}#{1,6}\s')
+# Sentence ends followed by whitespace; newlines separate list items and table rows
+SENTENCE_SPLIT_PATTERN = re.compile(r'(?<=[.!?;:])\s+|\n+')
+# Written by sentence-transformers next to the model; its max_seq_length is where the
+# embedding model truncates, often well below the tokenizer's model_max_length
+SENTENCE_TRANSFORMERS_CONFIG = 'sentence_bert_config.json'
+
+
+def split_into_sections(text: str) -> list[str]:
+    """
+    Split text into sections that start at markdown headings.
+    """
+    sections: list[list[str]] = [[]]
+    for line in text.splitlines():
+        if HEADING_PATTERN.match(line) and sections[-1]:
+            sections.append([])
+        sections[-1].append(line)
+    return ['\n'.join(lines) for lines in sections if any(line.strip() for line in lines)]
+
+
+def split_into_sentences(text: str) -> list[str]:
+    return [sentence.strip() for sentence in SENTENCE_SPLIT_PATTERN.split(text) if sentence.strip()]
+
+
+def token_windows(
+    text: str, offsets: list[tuple[int, int]], max_tokens: int, overlap_tokens: int
+) -> list[str]:
+    """
+    Slice text into windows of max_tokens tokens (overlapping by overlap_tokens) using the
+    tokenizer's character offsets, so chunks are exact substrings of the input.
+    """
+    chunks = []
+    start = 0
+    while start < len(offsets):
+        window = offsets[start : start + max_tokens]
+        chunks.append(text[window[0][0] : window[-1][1]])
+        if start + max_tokens >= len(offsets):
+            break
+        start += max(1, max_tokens - overlap_tokens)
+    return chunks
+
+
+@cache
+def sentence_transformers_max_length(model_name: str) -> int | None:
+    """
+    Return the max_seq_length of a sentence-transformers model (a local directory or a hub
+    model), None for other models or when its config cannot be read.
+    """
+    path = Path(model_name) / SENTENCE_TRANSFORMERS_CONFIG
+    if not path.is_file():
+        try:
+            from huggingface_hub import hf_hub_download  # pylint: disable=import-outside-toplevel
+
+            path = Path(hf_hub_download(model_name, SENTENCE_TRANSFORMERS_CONFIG))
+        except Exception:  # pylint: disable=broad-exception-caught
+            return None
+    try:
+        return json.loads(path.read_text(encoding='utf-8')).get('max_seq_length')
+    except (OSError, ValueError):
+        return None
 
 
 class TextChunker:
     def __init__(self, tokenizer_model: str = 'gpt2'):
+        # transformers is only imported once a chunker is needed, not by every module using
+        # chunk_document
+        from transformers import AutoTokenizer  # pylint: disable=import-outside-toplevel
+
         self.tokenizer = AutoTokenizer.from_pretrained(tokenizer_model)
+        # Keep the real sequence limit before lifting it to silence length warnings; embedding
+        # models truncate at their own, usually shorter, limit
+        self.max_sequence_tokens = self.tokenizer.model_max_length
+        max_seq_length = sentence_transformers_max_length(tokenizer_model)
+        if max_seq_length:
+            self.max_sequence_tokens = min(self.max_sequence_tokens, max_seq_length)
         self.tokenizer.model_max_length = 100000
 
+    def _offsets(self, texts: list[str]) -> list[list[tuple[int, int]]]:
+        """Tokenize all texts in one fast-tokenizer call and return their offset mappings."""
+        if not texts:
+            return []
+        encoding = self.tokenizer(texts, add_special_tokens=False, return_offsets_mapping=True)
+        return encoding['offset_mapping']
+
+    def chunk_texts_token_based(
+        self, texts: list[str], max_tokens: int = 1024, overlap_tokens: int = 20
+    ) -> list[list[str]]:
+        """
+        Chunk many documents into token windows with a single tokenizer call.
+
+        :return: One list of chunks per input text (empty for texts without tokens).
+        """
+        return [
+            token_windows(text, offsets, max_tokens, overlap_tokens)
+            for text, offsets in zip(texts, self._offsets(texts), strict=True)
+        ]
+
     def chunk_text_token_based(
         self, text: str, max_tokens: int = 1024, overlap_tokens: int = 20
     ) -> list[str]:
-        tokens = self.tokenizer.encode(text, add_special_tokens=False)
-        total_tokens = len(tokens)
-        if total_tokens == 0:
-            return ['']
+        return self.chunk_texts_token_based([text], max_tokens, overlap_tokens)[0]
 
-        chunks = []
-        start = 0
-        while start < total_tokens:
-            end = start + max_tokens
-            chunk_tokens = tokens[start:end]
-            chunk_text = self.tokenizer.decode(chunk_tokens, skip_special_tokens=True)
-            chunks.append(chunk_text)
-            start += max(1, max_tokens - overlap_tokens)
-        print(f'CHUNKS FROM Text chunker:\n{chunks}')
+    def chunk_texts_sentence_based(
+        self, texts: list[str], max_tokens: int | None = None
+    ) -> list[list[str]]:
+        """
+        Chunk many documents so that every chunk fits the tokenizer's model sequence limit.
+
+        Sentences are packed greedily up to max_tokens tokens of this tokenizer; chunks never
+        cross a markdown heading. A sentence longer than max_tokens is split into token windows.
+        The sentences of all documents are tokenized in a single call.
+
+        :param max_tokens: Target chunk length; defaults to the model's max sequence length
+            minus the special tokens the model adds.
+        :return: One list of chunks per input text.
+        """
+        if max_tokens is None:
+            max_tokens = self.max_sequence_tokens - self.tokenizer.num_special_tokens_to_add()
+
+        # (document index, section sentences) for every section of every document
+        sections = [
+            (doc_idx, split_into_sentences(section))
+            for doc_idx, text in enumerate(texts)
+            for section in split_into_sections(text)
+        ]
+        offsets = iter(self._offsets([sentence for _, ss in sections for sentence in ss]))
+
+        chunks: list[list[str]] = [[] for _ in texts]
+        for doc_idx, sentences in sections:
+            current: list[str] = []
+            current_tokens = 0
+            for sentence in sentences:
+                sentence_offsets = next(offsets)
+                length = len(sentence_offsets)
+                if length > max_tokens:
+                    if current:
+                        chunks[doc_idx].append(' '.join(current))
+                        current, current_tokens = [], 0
+                    chunks[doc_idx].extend(token_windows(sentence, sentence_offsets, max_tokens, 0))
+                    continue
+                # Joining sentences adds roughly one token per separator
+                if current and current_tokens + length + 1 > max_tokens:
+                    chunks[doc_idx].append(' '.join(current))
+                    current, current_tokens = [], 0
+                current.append(sentence)
+                current_tokens += length + (1 if current_tokens else 0)
+            if current:
+                chunks[doc_idx].append(' '.join(current))
         return chunks
 
+    def chunk_text_sentence_based(self, text: str, max_tokens: int | None = None) -> list[str]:
+        return self.chunk_texts_sentence_based([text], max_tokens)[0]
+
     def chunk_text(self, text: str, size=1024, overlap=20) -> list[str]:
         if not text:
             return []
@@ -37,3 +176,33 @@ class TextChunker:
             chunks.append(chunk)
             start += max(1, size - overlap)
         return chunks
+
+
+@cache
+def get_text_chunker(tokenizer_model: str = CHUNK_TOKENIZER_MODEL) -> TextChunker:
+    """
+    Process-wide TextChunker per tokenizer, so the tokenizer is loaded once per process.
+    """
+    return TextChunker(tokenizer_model=tokenizer_model)
+
+
+def chunk_documents(texts: list[str], strategy: str = CHUNKING_STRATEGY) -> list[list[str]]:
+    """
+    Chunk scraped pages or extracted files with the configured strategy:
+    'sentence' aligns chunks with the embedding model's sequence limit,
+    'token' keeps the fixed-size GPT-2 token windows.
+
+    :return: One list of chunks per input text.
+    """
+    if strategy == 'sentence':
+        return get_text_chunker(CHUNK_TOKENIZER_MODEL).chunk_texts_sentence_based(
+            texts, max_tokens=CHUNK_MAX_TOKENS
+        )
+    return get_text_chunker('gpt2').chunk_texts_token_based(
+        texts, max_tokens=1024, overlap_tokens=CHUNK_OVERLAP_TOKENS
+    )
+
+
+def chunk_document(text: str, strategy: str = CHUNKING_STRATEGY) -> list[str]:
+    """Chunk a single page or file, see chunk_documents."""
+    return chunk_documents([text], strategy=strategy)[0]